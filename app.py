@@ -0,0 +1,70 @@
+from contextlib import asynccontextmanager
+from typing import List
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+from uvicorn import run as app_run
+
+from src.constants import APP_HOST, APP_PORT
+from src.entity.config_entity import VehiclePredictorConfig
+from src.pipline.prediction_pipeline import VehicleDataClassifier, MicroBatchPredictor
+
+
+class VehicleDataRequest(BaseModel):
+    Gender: str
+    Age: int
+    Driving_License: int
+    Region_Code: float
+    Previously_Insured: int
+    Vehicle_Age: str
+    Vehicle_Damage: str
+    Annual_Premium: float
+    Policy_Sales_Channel: float
+    Vintage: int
+
+
+def create_app(prediction_pipeline_config: VehiclePredictorConfig = VehiclePredictorConfig()) -> FastAPI:
+    """
+    Creates the prediction service. The model is loaded once at startup and concurrent requests
+    are scored together in micro-batches.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        classifier = VehicleDataClassifier(prediction_pipeline_config=prediction_pipeline_config)
+        predictor = MicroBatchPredictor(classifier=classifier,
+                                        max_batch_size=prediction_pipeline_config.max_batch_size,
+                                        max_batch_delay_ms=prediction_pipeline_config.max_batch_delay_ms,
+                                        workers=prediction_pipeline_config.workers)
+        await predictor.start()
+        app.state.classifier = classifier
+        app.state.predictor = predictor
+        yield
+        await predictor.stop()
+        classifier.close()
+
+    app = FastAPI(title="Vehicle Insurance Prediction", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "model": str(app.state.classifier.model),
+                "model_file_path": app.state.classifier.model_file_path,
+                "model_version": app.state.classifier.model_version}
+
+    @app.post("/predict")
+    async def predict(vehicle_data: VehicleDataRequest):
+        return {"prediction": await app.state.predictor.predict(vehicle_data.model_dump())}
+
+    @app.post("/predict/batch")
+    async def predict_batch(vehicle_data: List[VehicleDataRequest]):
+        # A client side batch is already vectorized, so it skips the micro-batching queue
+        return {"predictions": await app.state.predictor.predict_batch([data.model_dump() for data in vehicle_data])}
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    app_run(app, host=APP_HOST, port=APP_PORT)
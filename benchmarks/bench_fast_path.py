@@ -0,0 +1,70 @@
+"""
+bench_fast_path.py
+
+Compares the latency of MyModel.predict with the fast path (predict_record / predict_array) on a model
+trained with the pipeline's preprocessing and RandomForest settings. Reports p50/p99 latency for one
+record given as a dict and for batches of 1, 100 and 10k records, and checks that both paths return
+identical predictions.
+
+Usage:
+------
+    python -m benchmarks.bench_fast_path --train-rows 20000 --repeats 200
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.synthetic_data import make_dataframe, train_model
+from src.constants import TARGET_COLUMN
+
+
+def _latency(func, repeats: int) -> dict:
+    func()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"p50_ms": round(float(np.percentile(timings, 50)) * 1e3, 3),
+            "p99_ms": round(float(np.percentile(timings, 99)) * 1e3, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    my_model = train_model(args.train_rows)
+    feature_engineering = dict(my_model.preprocessing_object.steps)["feature_engineering"]
+    raw = make_dataframe(10_000, seed=1, include_id=False).drop(columns=[TARGET_COLUMN])
+    engineered = feature_engineering.transform(raw).to_numpy()
+    record = raw.iloc[0].to_dict()
+
+    expected = my_model.predict(raw)
+    assert np.array_equal(my_model.predict_array(engineered), expected), "predict_array differs from predict"
+    assert all(my_model.predict_record(row) == prediction
+               for row, prediction in zip(raw.head(500).to_dict("records"), expected)), "predict_record differs from predict"
+
+    results = [{"case": "record", "path": "predict", **_latency(lambda: my_model.predict(raw.head(1)), args.repeats)},
+               {"case": "record", "path": "predict_record", **_latency(lambda: my_model.predict_record(record), args.repeats)}]
+    for batch in (1, 100, 10_000):
+        repeats = args.repeats if batch < 10_000 else max(args.repeats // 10, 5)
+        results.append({"case": f"batch_{batch}", "path": "predict",
+                        **_latency(lambda: my_model.predict(raw.head(batch)), repeats)})
+        results.append({"case": f"batch_{batch}", "path": "predict_array",
+                        **_latency(lambda: my_model.predict_array(engineered[:batch]), repeats)})
+    for result in results:
+        print(result)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+bench_feature_store.py
+
+Measures the ingestion-to-transformation I/O of the pipeline for every feature store format:
+writing the feature store, splitting and writing train/test, reading both splits back for
+validation and reading them again, column-pruned, for transformation. Reports the wall time
+of every step and the disk footprint of the written files.
+
+Usage:
+------
+    python -m benchmarks.bench_feature_store --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from benchmarks.synthetic_data import make_dataframe
+from src.constants import SCHEMA_FILE_PATH, DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO
+from src.utils.main_utils import read_yaml_file, save_dataframe, load_dataframe, apply_schema_dtypes
+
+
+def _run(file_format: str, dataframe: pd.DataFrame, schema_config: dict, directory: str) -> dict:
+    feature_store_file_path = os.path.join(directory, f"data.{file_format}")
+    train_file_path = os.path.join(directory, f"train.{file_format}")
+    test_file_path = os.path.join(directory, f"test.{file_format}")
+    drop_col = schema_config["drop_columns"]
+    required_columns = [name for column in schema_config["columns"] for name in column if name != drop_col]
+    timings = {}
+
+    start = time.perf_counter()
+    save_dataframe(feature_store_file_path, dataframe)
+    timings["feature_store_write_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    train_set, test_set = train_test_split(dataframe, test_size=DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO, random_state=42)
+    save_dataframe(train_file_path, train_set)
+    save_dataframe(test_file_path, test_set)
+    timings["split_write_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_dataframe(train_file_path)
+    load_dataframe(test_file_path)
+    timings["validation_read_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    apply_schema_dtypes(load_dataframe(train_file_path, columns=required_columns), schema_config)
+    apply_schema_dtypes(load_dataframe(test_file_path, columns=required_columns), schema_config)
+    timings["transformation_read_s"] = time.perf_counter() - start
+
+    result = {"format": file_format, **{name: round(value, 3) for name, value in timings.items()}}
+    result["total_s"] = round(sum(timings.values()), 3)
+    result["disk_mb"] = round(sum(os.path.getsize(path) for path in
+                                  (feature_store_file_path, train_file_path, test_file_path)) / 2**20, 2)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
+    dataframe = apply_schema_dtypes(make_dataframe(args.rows), schema_config)
+
+    results = []
+    for file_format in ("csv", "parquet", "feather"):
+        with tempfile.TemporaryDirectory() as directory:
+            results.append(_run(file_format, dataframe, schema_config, directory))
+        print(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
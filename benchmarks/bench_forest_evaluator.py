@@ -0,0 +1,83 @@
+"""
+bench_forest_evaluator.py
+
+Compares the forest evaluation backends on scaled feature batches of growing size:
+RandomForestClassifier.predict, the per-tree loop of MyModel's sklearn backend and the FlatForest
+level-by-level evaluator, single threaded and chunked over a thread pool. Checks that every backend
+returns exactly the probabilities of sklearn and reports the median time and the rows per second.
+The crossover batch size on the serving hardware is the value to use for MODEL_INFERENCE_FLAT_MAX_ROWS.
+
+Usage:
+------
+    python -m benchmarks.bench_forest_evaluator --batch-sizes 1 100 10000 100000 --n-jobs 4
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.synthetic_data import make_dataframe, train_model
+from src.constants import TARGET_COLUMN, MODEL_INFERENCE_CHUNK_ROWS
+from src.entity.forest_evaluator import FlatForest
+
+
+def _median_time(func, repeats: int) -> float:
+    func()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1_000, 10_000, 100_000])
+    parser.add_argument("--n-jobs", type=int, default=4)
+    parser.add_argument("--chunk-rows", type=int, default=MODEL_INFERENCE_CHUNK_ROWS)
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    my_model = train_model(args.train_rows)
+    forest = my_model.trained_model_object
+    flat_forest = FlatForest.from_forest(forest)
+    raw = make_dataframe(max(args.batch_sizes), seed=1, include_id=False).drop(columns=[TARGET_COLUMN])
+    features = np.ascontiguousarray(my_model.preprocessing_object.transform(raw), dtype=np.float32)
+
+    def tree_loop(batch):
+        proba = np.zeros((batch.shape[0], forest.n_classes_))
+        for estimator in forest.estimators_:
+            proba += estimator.tree_.predict(batch)[:, :forest.n_classes_]
+        return proba / len(forest.estimators_)
+
+    backends = {
+        "sklearn_predict_proba": forest.predict_proba,
+        "sklearn_tree_loop": tree_loop,
+        "flat": lambda batch: flat_forest.predict_proba(batch, n_jobs=1, chunk_rows=args.chunk_rows),
+        f"flat_{args.n_jobs}_threads": lambda batch: flat_forest.predict_proba(batch, n_jobs=args.n_jobs,
+                                                                              chunk_rows=args.chunk_rows),
+    }
+
+    results = []
+    for batch_size in args.batch_sizes:
+        batch = features[:batch_size]
+        expected = forest.predict_proba(batch)
+        repeats = max(3, min(200, 200_000 // batch_size))
+        for name, backend in backends.items():
+            assert np.array_equal(backend(batch), expected), f"{name} differs from sklearn"
+            seconds = _median_time(lambda: backend(batch), repeats)
+            results.append({"batch_size": batch_size, "backend": name, "median_ms": round(seconds * 1e3, 3),
+                            "rows_per_s": round(batch_size / seconds)})
+            print(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+bench_import_time.py
+
+Tracks the cold start of the package: every target module is imported in a fresh interpreter with
+`python -X importtime`, and the cumulative import time of the module is read from its report. Serving targets
+have a budget and must not import the training-only dependencies (sklearn, imblearn, pymongo, certifi, boto3
+and their own dependencies): a serving container with a packed model loads them only on first use, if at all.
+The largest third-party packages imported by every target are listed so a new heavy import shows up.
+The exit status is 1 when a serving target is over its budget or imports a training-only dependency, so the
+benchmark can run as a check.
+
+Usage:
+------
+    python -m benchmarks.bench_import_time --repeats 5 --output bench/import_time.json
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Optional
+
+# Target module -> (import path, budget in milliseconds of the cumulative import time)
+TARGETS = {
+    "src.pipline.prediction_pipeline": ("serving", 800),
+    "src.entity.packed_model": ("serving", 800),
+    "app": ("serving", 1500),
+    "src.pipline.training_pipeline": ("training", None),
+}
+TRAINING_ONLY_MODULES = ["sklearn", "scipy", "imblearn", "pymongo", "certifi", "boto3"]
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_report(target: Optional[str]) -> tuple:
+    """
+    Imports target in a fresh interpreter, returns its -X importtime lines as (cumulative us, depth, module)
+    and the top-level packages in sys.modules afterwards. Without a target, only the interpreter starts.
+    """
+    imports = f"import {target}; " if target else ""
+    code = f"import sys, json; {imports}print(json.dumps(sorted({{name.split('.')[0] for name in sys.modules}})))"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPOSITORY_DIR,
+                               capture_output=True, text=True, check=True)
+    lines = []
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            lines.append((int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+    return lines, json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(target: str, repeats: int, startup_packages: set) -> dict:
+    """
+    :param startup_packages: packages imported by the interpreter startup (site, .pth files), not counted
+    """
+    path, budget_ms = TARGETS.get(target, ("serving", None))
+    timings = []
+    for _ in range(repeats):
+        lines, packages = _import_report(target)
+        timings.append(next(cumulative for cumulative, depth, module in lines if module == target and depth == 0))
+    # Top-level packages outside src, with the cumulative time of their first import
+    excluded = startup_packages | set(sys.stdlib_module_names) | {"src", target.split(".")[0]}
+    heavy = sorted(((cumulative, module) for cumulative, depth, module in lines
+                    if "." not in module and module not in excluded),
+                   reverse=True)[:5]
+    result = {"target": target, "path": path, "import_ms": round(min(timings) / 1e3, 1),
+              "max_import_ms": round(max(timings) / 1e3, 1), "budget_ms": budget_ms,
+              "heaviest_packages": {module: round(cumulative / 1e3, 1) for cumulative, module in heavy}}
+    if path == "serving":
+        result["training_only_modules"] = [module for module in TRAINING_ONLY_MODULES
+                                            if module in packages and module not in startup_packages]
+        result["ok"] = (budget_ms is None or result["import_ms"] <= budget_ms) and not result["training_only_modules"]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS))
+    parser.add_argument("--repeats", type=int, default=3, help="The fastest of the imports is reported")
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    _, startup_packages = _import_report(None)
+    results = []
+    for target in args.targets:
+        results.append(measure(target, args.repeats, set(startup_packages)))
+        print(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+    if not all(result.get("ok", True) for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
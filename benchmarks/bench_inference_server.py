@@ -0,0 +1,87 @@
+"""
+bench_inference_server.py
+
+Load-tests the prediction service in process (httpx over the ASGI app, no network). A number of
+concurrent clients send single-record /predict requests. The service runs once with micro-batching
+and once with max_batch_size=1, which scores every request on its own. Reports throughput and
+p50/p99 latency for both.
+
+Needs httpx, a benchmark dependency: pip install -r requirements-bench.txt
+
+Usage:
+------
+    python -m benchmarks.bench_inference_server --requests 5000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from app import create_app
+from benchmarks.synthetic_data import make_dataframe, train_model
+from src.constants import TARGET_COLUMN, PREDICTION_MAX_BATCH_DELAY_MS, PREDICTION_WORKERS
+from src.entity.config_entity import VehiclePredictorConfig
+from src.utils.main_utils import save_object
+
+
+async def _load_test(config: VehiclePredictorConfig, records: list, concurrency: int) -> dict:
+    app = create_app(config)
+    latencies = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            position = iter(range(len(records)))
+
+            async def worker():
+                for index in position:
+                    start = time.perf_counter()
+                    response = await client.post("/predict", json=records[index])
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+    return {"max_batch_size": config.max_batch_size, "requests": len(records), "concurrency": concurrency,
+            "throughput_rps": round(len(records) / elapsed, 1),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1e3, 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)) * 1e3, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-batch-delay-ms", type=float, default=PREDICTION_MAX_BATCH_DELAY_MS)
+    parser.add_argument("--workers", type=int, default=PREDICTION_WORKERS)
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    records = make_dataframe(args.requests, seed=1, include_id=False).drop(columns=[TARGET_COLUMN]).to_dict("records")
+    with tempfile.TemporaryDirectory() as directory:
+        model_file_path = os.path.join(directory, "model.pkl")
+        save_object(model_file_path, train_model(args.train_rows))
+
+        results = []
+        for max_batch_size in (args.max_batch_size, 1):
+            config = VehiclePredictorConfig(model_file_path=model_file_path, max_batch_size=max_batch_size,
+                                            max_batch_delay_ms=args.max_batch_delay_ms, workers=args.workers)
+            results.append(asyncio.run(_load_test(config, records, args.concurrency)))
+            print(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
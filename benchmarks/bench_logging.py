@@ -0,0 +1,105 @@
+"""
+bench_logging.py
+
+Measures what logging costs a prediction with each configuration of src.logger: synchronous handlers, the
+queue handler with its listener thread, JSON records, and rate limiting. Every configuration runs in a
+process of its own, since the logger is configured when src.logger is imported, and reports the latency of
+one logging.info call and of MyModel.predict on one row (two logging.info calls), alternately with logging
+on and disabled so both see the same noise. The overhead is the difference of their medians. Console output
+of the workers is discarded, their log files are written to the logs directory as usual.
+
+Usage:
+------
+    python -m benchmarks.bench_logging --repeats 2000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CONFIGURATIONS = {
+    "sync": {"LOG_MODE": "sync"},
+    "sync_rate_limit": {"LOG_MODE": "sync", "LOG_RATE_LIMIT": "10"},
+    "queue": {"LOG_MODE": "queue"},
+    "queue_json": {"LOG_MODE": "queue", "LOG_FORMAT": "json"},
+    "queue_rate_limit": {"LOG_MODE": "queue", "LOG_RATE_LIMIT": "10"},
+}
+
+
+def _summary_us(timings) -> dict:
+    import numpy as np
+
+    return {"p50_us": round(float(np.percentile(timings, 50)) * 1e6, 1),
+            "p99_us": round(float(np.percentile(timings, 99)) * 1e6, 1)}
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def _worker(model_file_path: str, repeats: int) -> None:
+    from benchmarks.synthetic_data import make_dataframe
+    from src.constants import TARGET_COLUMN
+    from src.logger import logging
+    from src.utils.main_utils import load_object
+
+    my_model = load_object(model_file_path)
+    row = make_dataframe(1, seed=1, include_id=False).drop(columns=[TARGET_COLUMN])
+    my_model.predict(row)
+    log_call = [_timed(lambda: logging.info("Starting prediction process")) for _ in range(repeats)]
+    predict, predict_without_logging = [], []
+    for _ in range(repeats):
+        predict.append(_timed(lambda: my_model.predict(row)))
+        logging.disable(logging.INFO)
+        predict_without_logging.append(_timed(lambda: my_model.predict(row)))
+        logging.disable(logging.NOTSET)
+    print(json.dumps({"log_call": _summary_us(log_call), "predict": _summary_us(predict),
+                      "predict_without_logging": _summary_us(predict_without_logging)}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-rows", type=int, default=5_000)
+    parser.add_argument("--repeats", type=int, default=2_000)
+    parser.add_argument("--configurations", nargs="+", default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker, args.repeats)
+        return
+
+    from benchmarks.synthetic_data import train_model
+    from src.utils.main_utils import save_object
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        model_file_path = os.path.join(directory, "model.pkl")
+        save_object(model_file_path, train_model(args.train_rows))
+        for name in args.configurations:
+            environment = {key: value for key, value in os.environ.items() if not key.startswith("LOG_")}
+            completed = subprocess.run([sys.executable, "-m", "benchmarks.bench_logging", "--worker", model_file_path,
+                                        "--repeats", str(args.repeats)],
+                                       env={**environment, **CONFIGURATIONS[name]}, stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL, text=True, check=True)
+            measurements = json.loads(completed.stdout.strip().splitlines()[-1])
+            overhead = measurements["predict"]["p50_us"] - measurements["predict_without_logging"]["p50_us"]
+            results.append({"configuration": name, **{f"{case}_{key}": value for case, entry in measurements.items()
+                                                      for key, value in entry.items()},
+                            "logging_overhead_us": round(overhead, 1)})
+            print(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
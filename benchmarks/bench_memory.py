@@ -0,0 +1,208 @@
+"""
+bench_memory.py
+
+Compares the peak memory of data ingestion and data transformation with the dtypes of config/schema.yaml (int8
+flags, float32 features, categoricals and float32 engineered features) against the pandas default dtypes the
+data went through before the width hints: int64, float64, Python object strings and float64 features.
+
+Every case runs the DataIngestion (streaming export from MongoDB, feature store, train/test split) and the
+DataTransformation (preprocessing, SMOTEENN, saved .npy arrays) components in a fresh process, whose working
+directory holds the schema.yaml of the case. Unless --mongodb-url points at a MongoDB server holding the
+collection, the documents are generated batch by batch as the export reads them, the way a server cursor
+streams them: mongomock materializes every document of a query, which would dominate the peak.
+
+For every stage the peak of the memory allocated by Python and numpy (tracemalloc) above what was allocated
+when the stage started is reported, along with the peak RSS growth of the stage on Linux, which also counts
+the pyarrow buffers of the string columns. The sizes of the ingested dataframe and of the transformed arrays
+are the memory the data itself takes. The generated documents go through a warm-up run on a small collection
+first, so the imports and memory pools the stages set up on first use are not counted. The transformation
+peak is mostly SMOTEENN, which resamples float32 features whatever the schema dtypes.
+
+Usage:
+------
+    python -m benchmarks.bench_memory --rows 500000 --output bench/memory.json
+    python -m benchmarks.bench_memory --mongodb-url mongodb://localhost:27017 --collection Vehicle_DB-Data
+"""
+
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from src.constants import DATA_INGESTION_COLLECTION_NAME, SCHEMA_FILE_PATH
+
+MB = 2**20
+CASES = ("pandas_defaults", "schema")
+WARM_UP_COLLECTION_NAME = "warm_up"
+WARM_UP_ROWS = 5_000
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _default_dtypes_schema(schema_config: dict) -> dict:
+    """
+    Returns the schema with the dtypes pandas gives the data without width hints
+    """
+    from src.utils.main_utils import get_schema_dtypes
+
+    schema_config = copy.deepcopy(schema_config)
+    defaults = {"i": "int", "u": "int", "f": "float"}
+    schema_config["columns"] = [{name: defaults.get(getattr(dtype, "kind", None), "object")}
+                                for name, dtype in get_schema_dtypes(schema_config).items()]
+    schema_config["feature_dtype"] = "float64"
+    return schema_config
+
+
+class _StreamedCollection:
+    """
+    Collection answering find() with synthetic documents generated one batch at a time
+    """
+
+    def __init__(self, rows: int, seed: int):
+        self.rows = rows
+        self.seed = seed
+
+    def find(self, query=None, projection=None, batch_size: int = 10_000):
+        from bson import ObjectId
+
+        from benchmarks.synthetic_data import make_documents
+
+        for start in range(0, self.rows, batch_size):
+            for document in make_documents(min(batch_size, self.rows - start), seed=self.seed + start, start_id=start):
+                document["_id"] = ObjectId()
+                yield document
+
+
+def _reset_peak_rss() -> None:
+    # Resets VmHWM of the process, Linux only
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def _rss_mb(field: str):
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith(field):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def _measure(name: str, func) -> tuple:
+    _reset_peak_rss()
+    rss_before = _rss_mb("VmRSS:")
+    tracemalloc.reset_peak()
+    allocated_before, _ = tracemalloc.get_traced_memory()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    peak_rss = _rss_mb("VmHWM:")
+    entry = {"stage": name, "peak_traced_mb": round((peak - allocated_before) / MB, 1),
+             "peak_rss_growth_mb": None if peak_rss is None or rss_before is None else round(peak_rss - rss_before, 1)}
+    return result, entry
+
+
+def _worker(args) -> None:
+    from benchmarks.bench_pipeline_stages import _in_directory
+    from src.components.data_ingestion import DataIngestion
+    from src.components.data_transformation import DataTransformation
+    from src.configuration.mongo_db_connection import MongoDBClient
+    from src.constants import DATABASE_NAME
+    from src.entity.artifact_entity import DataValidationArtifact
+    from src.entity.config_entity import DataIngestionConfig, DataTransformationConfig
+    from src.utils.main_utils import wait_for_artifact_writes
+
+    if args.mongodb_url:
+        import pymongo
+        MongoDBClient.client = pymongo.MongoClient(args.mongodb_url)
+    else:
+        MongoDBClient.client = {DATABASE_NAME: {args.collection: _StreamedCollection(args.rows, args.seed),
+                                                WARM_UP_COLLECTION_NAME: _StreamedCollection(WARM_UP_ROWS, args.seed)}}
+
+    def run_stages(collection_name: str, directory: str) -> tuple:
+        os.makedirs(directory, exist_ok=True)
+        data_ingestion_config = _in_directory(DataIngestionConfig(collection_name=collection_name, export_mode="streaming",
+                                                                  export_batch_size=args.batch_size, incremental=False),
+                                              directory)
+        data_transformation_config = _in_directory(DataTransformationConfig(), directory)
+        data_ingestion_artifact, ingestion = _measure(
+            "ingestion", DataIngestion(data_ingestion_config=data_ingestion_config).initiate_data_ingestion)
+        wait_for_artifact_writes()
+        data_validation_artifact = DataValidationArtifact(validation_status=True, message="",
+                                                          validation_report_file_path="")
+        data_transformation = DataTransformation(data_ingestion_artifact=data_ingestion_artifact,
+                                                 data_validation_artifact=data_validation_artifact,
+                                                 data_transformation_config=data_transformation_config)
+        data_transformation_artifact, transformation = _measure("transformation",
+                                                                data_transformation.initiate_data_transformation)
+        wait_for_artifact_writes()
+        return data_ingestion_artifact, ingestion, data_transformation_artifact, transformation
+
+    tracemalloc.start()
+    # Imports and memory pools the stages set up on first use are not counted
+    if not args.mongodb_url:
+        run_stages(WARM_UP_COLLECTION_NAME, os.path.join(os.getcwd(), "warm_up"))
+    data_ingestion_artifact, ingestion, data_transformation_artifact, transformation = run_stages(
+        args.collection, os.getcwd())
+    ingestion["dataframe_mb"] = round(sum(dataframe.memory_usage(deep=True).sum() for dataframe in
+                                          (data_ingestion_artifact.train_df, data_ingestion_artifact.test_df)) / MB, 1)
+    transformation["arrays_mb"] = round(sum(array.nbytes for array in (data_transformation_artifact.train_arr,
+                                                                        data_transformation_artifact.test_arr)) / MB, 1)
+    transformation["dtype"] = str(data_transformation_artifact.train_arr.dtype)
+    tracemalloc.stop()
+    print(json.dumps([ingestion, transformation]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongodb-url", help="MongoDB server holding the collection, generated documents when not set")
+    parser.add_argument("--collection", default=DATA_INGESTION_COLLECTION_NAME)
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args)
+        return
+
+    from src.utils.main_utils import read_yaml_file, write_yaml_file
+
+    schema_config = read_yaml_file(os.path.join(REPOSITORY_DIR, SCHEMA_FILE_PATH))
+    schemas = {"pandas_defaults": _default_dtypes_schema(schema_config), "schema": schema_config}
+    environment = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPOSITORY_DIR,
+                                                                            os.environ.get("PYTHONPATH")]))}
+    results = []
+    for case in CASES:
+        with tempfile.TemporaryDirectory() as directory:
+            write_yaml_file(os.path.join(directory, SCHEMA_FILE_PATH), schemas[case])
+            completed = subprocess.run([sys.executable, "-m", "benchmarks.bench_memory", "--worker", *sys.argv[1:]],
+                                       cwd=directory, env=environment, stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL, text=True, check=True)
+        for entry in json.loads(completed.stdout.strip().splitlines()[-1]):
+            results.append({"case": case, "rows": args.rows, **entry})
+            print(results[-1])
+
+    for stage in ("ingestion", "transformation"):
+        default, compact = (next(result for result in results if result["case"] == case and result["stage"] == stage)
+                            for case in CASES)
+        reduction = {key: round(default[key] / compact[key], 2) for key in default
+                     if key.endswith("_mb") and default[key] and compact[key]}
+        results.append({"case": "reduction", "stage": stage, **reduction})
+        print(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
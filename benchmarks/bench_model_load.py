@@ -0,0 +1,90 @@
+"""
+bench_model_load.py
+
+Compares loading the pickled MyModel (dill) with the memory-mapped packed model in several worker
+processes that are alive at the same time, like the workers of a serving container. Every worker loads
+the model, scores a batch so the pages it needs are touched, and reports its load time, the growth of
+its RSS and of its unique memory (USS), and its proportional memory (PSS). Pages of a packed model are
+shared through the page cache, so its USS growth stays small whatever the number of workers.
+
+Needs psutil, a benchmark dependency: pip install -r requirements-bench.txt
+
+Usage:
+------
+    python -m benchmarks.bench_model_load --train-rows 50000 --workers 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+import psutil
+
+MB = 2**20
+
+
+def _worker(model_file_path: str, records: list, barrier, results) -> None:
+    import numpy as np  # noqa: F401
+    from src.entity.packed_model import load_model_file
+
+    process = psutil.Process()
+    before = process.memory_full_info()
+    start = time.perf_counter()
+    model = load_model_file(model_file_path)
+    load_time = time.perf_counter() - start
+    model.predict_records(records)
+    # Measured while every worker holds its model, so shared pages are split between them in the PSS
+    barrier.wait()
+    memory = process.memory_full_info()
+    results.put({"load_s": load_time, "rss_delta_mb": (memory.rss - before.rss) / MB,
+                 "uss_delta_mb": (memory.uss - before.uss) / MB, "pss_mb": getattr(memory, "pss", 0) / MB})
+    barrier.wait()
+
+
+def _run(model_file_path: str, records: list, workers: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(model_file_path, records, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measurements = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {"format": os.path.splitext(model_file_path)[1].lstrip("."), "workers": workers,
+            "file_mb": round(os.path.getsize(model_file_path) / MB, 2),
+            **{f"mean_{name}": round(sum(m[name] for m in measurements) / workers, 3) for name in measurements[0]}}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-rows", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    from benchmarks.synthetic_data import make_dataframe, train_model
+    from src.constants import TARGET_COLUMN
+    from src.entity.packed_model import save_packed_model
+    from src.utils.main_utils import save_object
+
+    my_model = train_model(args.train_rows)
+    records = make_dataframe(1_000, seed=1, include_id=False).drop(columns=[TARGET_COLUMN]).to_dict("records")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        save_object(os.path.join(directory, "model.pkl"), my_model)
+        save_packed_model(os.path.join(directory, "model.packed"), my_model)
+        for file_name in ("model.pkl", "model.packed"):
+            results.append(_run(os.path.join(directory, file_name), records, args.workers))
+            print(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
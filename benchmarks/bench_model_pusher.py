@@ -0,0 +1,127 @@
+"""
+bench_model_pusher.py
+
+Measures the throughput of pushing a large model to S3: a single PUT, boto3's upload_file (its managed
+transfer), and SimpleStorageService.upload_file_multipart with its per-part MD5 checks for each number of
+workers, then the push of ModelPusher twice, the second one skipped by the content hash. The model is a fully
+grown RandomForestClassifier trained on synthetic rows, pickled to 100MB and more with the default settings,
+unless --model-file gives an existing file.
+
+The bucket is served in-process by moto unless --endpoint-url points at an S3 compatible store (MinIO, a moto
+server, or S3 itself with the usual AWS credentials). moto keeps the objects in memory and is CPU bound, so its
+MB/s compare the cases with each other rather than measure a network.
+
+Needs moto, a benchmark dependency: pip install -r requirements-bench.txt
+
+Usage:
+------
+    python -m benchmarks.bench_model_pusher --n-estimators 60 --workers 1 4 8
+    python -m benchmarks.bench_model_pusher --model-file model.pkl --endpoint-url http://localhost:9000 --bucket models
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+
+from src.constants import AWS_ENDPOINT_URL_ENV_KEY, MODEL_PUSHER_PART_SIZE
+
+MB = 2**20
+
+
+def _train_model_file(file_path: str, args) -> None:
+    from benchmarks.synthetic_data import train_model
+    from src.utils.main_utils import save_object
+
+    start = time.perf_counter()
+    my_model = train_model(args.train_rows, n_estimators=args.n_estimators, max_depth=None, min_samples_split=2,
+                           min_samples_leaf=1)
+    save_object(file_path, my_model)
+    print({"trained_rows": args.train_rows, "n_estimators": args.n_estimators,
+           "file_mb": round(os.path.getsize(file_path) / MB, 1), "seconds": round(time.perf_counter() - start, 1)})
+
+
+def _timed(case: str, size: int, func) -> dict:
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    return {"case": case, "mb": round(size / MB, 1), "seconds": round(seconds, 3),
+            "mb_per_s": round(size / MB / seconds, 1)}
+
+
+def run_cases(args, model_file_path: str) -> list:
+    from src.cloud_storage.aws_storage import SimpleStorageService
+    from src.components.model_pusher import ModelPusher
+    from src.entity.artifact_entity import ModelEvaluationArtifact
+    from src.entity.config_entity import ModelPusherConfig
+
+    s3 = SimpleStorageService()
+    if args.endpoint_url is None:
+        s3.s3_client.create_bucket(Bucket=args.bucket)
+    size = os.path.getsize(model_file_path)
+    key = "bench/model.pkl"
+
+    def put_object():
+        with open(model_file_path, "rb") as file_obj:
+            s3.s3_client.put_object(Bucket=args.bucket, Key=key, Body=file_obj)
+
+    results = [_timed("put_object", size, put_object),
+               _timed("boto3_upload_file", size, lambda: s3.s3_client.upload_file(model_file_path, args.bucket, key))]
+    for workers in args.workers:
+        results.append({**_timed("upload_file_multipart", size, lambda: s3.upload_file_multipart(
+            model_file_path, bucket_name=args.bucket, s3_key=key, part_size=args.part_size, workers=workers)),
+            "workers": workers})
+    s3.s3_client.delete_object(Bucket=args.bucket, Key=key)
+
+    model_pusher = ModelPusher(
+        model_evaluation_artifact=ModelEvaluationArtifact(is_model_accepted=True, changed_accuracy=0.0, s3_model_path=key,
+                                                          trained_model_path=model_file_path),
+        model_pusher_config=ModelPusherConfig(bucket_name=args.bucket, s3_model_key_path=key, part_size=args.part_size,
+                                              workers=max(args.workers), local_registry_dir=None))
+    for case in ("model_pusher_push", "model_pusher_repush"):
+        entry = {}
+        results.append(_timed(case, size, lambda: entry.update(model_pusher.push_file(model_file_path, key))))
+        results[-1]["uploaded"] = entry["uploaded"]
+    s3.s3_client.delete_object(Bucket=args.bucket, Key=key)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-file", help="Model file to push instead of training one")
+    parser.add_argument("--train-rows", type=int, default=100_000)
+    parser.add_argument("--n-estimators", type=int, default=60)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--part-size", type=int, default=MODEL_PUSHER_PART_SIZE)
+    parser.add_argument("--endpoint-url", help="S3 compatible store to push to, moto in-process when not set")
+    parser.add_argument("--bucket", default="model-pusher-benchmark")
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    if args.endpoint_url:
+        os.environ[AWS_ENDPOINT_URL_ENV_KEY] = args.endpoint_url
+        backend = contextlib.nullcontext()
+    else:
+        from moto import mock_aws
+        for name, value in (("AWS_ACCESS_KEY_ID", "testing"), ("AWS_SECRET_ACCESS_KEY", "testing")):
+            os.environ.setdefault(name, value)
+        backend = mock_aws()
+
+    with tempfile.TemporaryDirectory() as directory, backend:
+        model_file_path = args.model_file
+        if model_file_path is None:
+            model_file_path = os.path.join(directory, "model.pkl")
+            _train_model_file(model_file_path, args)
+        results = run_cases(args, model_file_path)
+    for result in results:
+        print(result)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+bench_mongo_export.py
+
+Compares peak RSS and wall time of the full export path (`export_collection_as_dataframe`)
+with the streaming path of the pipeline (`DataIngestion.stream_data_into_feature_store`, which
+reads `export_collection_in_chunks` and concatenates the chunks into the ingested dataframe) and
+the range-partitioned parallel path (`export_collection_in_partitions`) of Vehicle_Data.
+
+Every mode runs in a fresh process and returns the whole dataframe, as the pipeline needs it.
+Unless --mongodb-url points at a MongoDB server holding the collection, the full and streaming
+modes read documents generated batch by batch as the cursor consumes them (bench_memory's
+_StreamedCollection), so the stand-in does not dominate the peak: mongomock materializes every
+document of a query. The parallel mode needs range queries and runs on a populated mongomock
+collection, whose documents are held in memory before the baseline is taken; mongomock also
+evaluates queries in Python under the GIL, so the parallel mode only shows its speed-up and
+its real memory against a MongoDB server.
+
+Needs mongomock, a benchmark dependency: pip install -r requirements-bench.txt
+
+Usage:
+------
+    python -m benchmarks.bench_mongo_export --rows 50000 --batch-size 10000
+    python -m benchmarks.bench_mongo_export --mongodb-url mongodb://localhost:27017
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import tempfile
+import time
+
+from benchmarks.bench_memory import _StreamedCollection
+from benchmarks.synthetic_data import make_documents
+from src.configuration.mongo_db_connection import MongoDBClient
+from src.constants import DATABASE_NAME, DATA_INGESTION_COLLECTION_NAME
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _set_client(mode: str, rows: int, seed: int, mongodb_url) -> None:
+    if mongodb_url:
+        import pymongo
+        MongoDBClient.client = pymongo.MongoClient(mongodb_url)
+    elif mode == "parallel":
+        import mongomock
+        MongoDBClient.client = mongomock.MongoClient()
+        collection = MongoDBClient.client[DATABASE_NAME][DATA_INGESTION_COLLECTION_NAME]
+        documents = make_documents(rows, seed=seed)
+        collection.insert_many(documents)
+        del documents
+    else:
+        MongoDBClient.client = {DATABASE_NAME: {DATA_INGESTION_COLLECTION_NAME: _StreamedCollection(rows, seed)}}
+
+
+def _run(mode: str, args: argparse.Namespace, queue: multiprocessing.Queue) -> None:
+    from benchmarks.bench_pipeline_stages import _in_directory
+    from src.components.data_ingestion import DataIngestion
+    from src.data_access.proj1_data import Vehicle_Data
+    from src.entity.config_entity import DataIngestionConfig
+
+    _set_client(mode, args.rows, args.seed, args.mongodb_url)
+    my_data = Vehicle_Data()
+    with tempfile.TemporaryDirectory() as directory:
+        # Parquet feature store: the streamed chunks are only concatenated, nothing is written
+        data_ingestion_config = _in_directory(DataIngestionConfig(collection_name=DATA_INGESTION_COLLECTION_NAME,
+                                                                  export_mode="streaming",
+                                                                  export_batch_size=args.batch_size), directory)
+        baseline = _peak_rss_mb()
+        start = time.perf_counter()
+        if mode == "full":
+            dataframe = my_data.export_collection_as_dataframe(collection_name=DATA_INGESTION_COLLECTION_NAME)
+        elif mode == "parallel":
+            dataframe = my_data.export_collection_in_partitions(collection_name=DATA_INGESTION_COLLECTION_NAME,
+                                                                partitions=2 * args.workers, workers=args.workers,
+                                                                batch_size=args.batch_size)
+        else:
+            dataframe = DataIngestion(data_ingestion_config=data_ingestion_config).stream_data_into_feature_store(my_data)
+        elapsed = time.perf_counter() - start
+
+    queue.put({"mode": mode, "rows": len(dataframe), "wall_time_s": round(elapsed, 3),
+               "peak_rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+               "dataframe_mb": round(float(dataframe.memory_usage(deep=True).sum()) / 2**20, 1)})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongodb-url", help="MongoDB server holding the collection, generated documents when not set")
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    results = []
+    for mode in ("full", "streaming", "parallel"):
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_run, args=(mode, args, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+        print(f"{mode:>10}: {results[-1]}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+bench_pipeline_stages.py
+
+Runs every stage of the training pipeline on synthetic data and records each one as a profiling span: ingestion
+from MongoDB, validation, transformation (with its fit_transform and SMOTEENN resampling spans), training,
+evaluation of the trained model on the holdout (there is no production model to compare it with), then
+single-record and batch prediction with the trained model. The output has the layout of the metrics.json of a
+pipeline run, with the commit it was run on, so the results of two commits are compared with
+benchmarks.compare_metrics.
+
+The collection is served by mongomock unless --mongodb-url points at a MongoDB server, e.g. a local mongod,
+which should be used from about a million rows on. The benchmark collection is dropped before and after the run,
+the stage outputs are written to a temporary directory and training uses the RandomForestClassifier parameters of
+the constants unless --model-search is given.
+
+Needs mongomock, a benchmark dependency: pip install -r requirements-bench.txt
+
+Usage:
+------
+    python -m benchmarks.bench_pipeline_stages --rows 100000 --output bench/$(git rev-parse --short HEAD).json
+    python -m benchmarks.compare_metrics bench/<baseline>.json bench/<current>.json
+"""
+
+import argparse
+import dataclasses
+import os
+import subprocess
+import tempfile
+
+from benchmarks.bench_fast_path import _latency
+from benchmarks.synthetic_data import make_dataframe, make_documents
+from src.configuration.mongo_db_connection import MongoDBClient
+from src.constants import DATABASE_NAME, DATA_INGESTION_COLLECTION_NAME, TARGET_COLUMN
+from src.entity.config_entity import (DataIngestionConfig, DataValidationConfig, DataTransformationConfig,
+                                      ModelTrainerConfig, ModelEvaluationConfig, training_pipeline_config)
+from src.utils.main_utils import load_object
+from src.utils.profiling import profile_span, reset_metrics, get_metrics, save_metrics
+
+INSERT_BATCH_ROWS = 100_000
+
+
+def _get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _in_directory(config, directory: str):
+    """
+    Returns the config with its paths inside the artifact directory of the pipeline moved to directory
+    """
+    return dataclasses.replace(config, **{
+        field.name: getattr(config, field.name).replace(training_pipeline_config.artifact_dir, directory)
+        for field in dataclasses.fields(config)
+        if isinstance(getattr(config, field.name), str)
+        and getattr(config, field.name).startswith(training_pipeline_config.artifact_dir)})
+
+
+def _load_collection(collection, rows: int, seed: int) -> None:
+    collection.drop()
+    for start in range(0, rows, INSERT_BATCH_ROWS):
+        collection.insert_many(make_documents(min(INSERT_BATCH_ROWS, rows - start), seed=seed + start, start_id=start))
+
+
+def run_stages(args, directory: str) -> None:
+    from src.components.data_ingestion import DataIngestion
+    from src.components.data_transformation import DataTransformation
+    from src.components.data_validation import DataValidation
+    from src.components.model_evaluation import ModelEvaluation
+    from src.components.model_trainer import ModelTrainer
+
+    data_ingestion_config = _in_directory(DataIngestionConfig(collection_name=args.collection, export_mode=args.export_mode),
+                                          directory)
+    data_validation_config = _in_directory(DataValidationConfig(), directory)
+    data_transformation_config = _in_directory(DataTransformationConfig(), directory)
+    model_trainer_config = _in_directory(ModelTrainerConfig(), directory)
+    model_evaluation_config = _in_directory(ModelEvaluationConfig(), directory)
+    model_evaluation_config.holdout_cache_dir = os.path.join(directory, "holdout_cache")
+    model_evaluation_config.local_registry_dir = os.path.join(directory, "model_registry")
+    if not args.model_search:
+        model_trainer_config.model_config_file_path = os.path.join(directory, "no_model_search.yaml")
+
+    with profile_span("ingestion", rows=args.rows):
+        data_ingestion_artifact = DataIngestion(data_ingestion_config=data_ingestion_config).initiate_data_ingestion()
+    with profile_span("validation"):
+        data_validation_artifact = DataValidation(data_ingestion_artifact=data_ingestion_artifact,
+                                                  data_validation_config=data_validation_config).initiate_data_validation()
+    with profile_span("transformation"):
+        data_transformation_artifact = DataTransformation(data_ingestion_artifact=data_ingestion_artifact,
+                                                          data_transformation_config=data_transformation_config,
+                                                          data_validation_artifact=data_validation_artifact
+                                                          ).initiate_data_transformation()
+    with profile_span("training"):
+        model_trainer_artifact = ModelTrainer(data_transformation_artifact=data_transformation_artifact,
+                                              model_trainer_config=model_trainer_config,
+                                              data_validation_artifact=data_validation_artifact).initiate_model_trainer()
+    with profile_span("evaluation"):
+        ModelEvaluation(model_eval_config=model_evaluation_config, data_ingestion_artifact=data_ingestion_artifact,
+                        model_trainer_artifact=model_trainer_artifact).initiate_model_evaluation()
+
+    my_model = load_object(model_trainer_artifact.trained_model_file_path)
+    batch = make_dataframe(args.batch_rows, seed=args.seed + 1, include_id=False).drop(columns=[TARGET_COLUMN])
+    record = batch.iloc[0].to_dict()
+    with profile_span("predict_record", repeats=args.repeats) as span:
+        span.update(_latency(lambda: my_model.predict_record(record), args.repeats))
+    with profile_span("predict_batch", rows=len(batch), repeats=args.batch_repeats) as span:
+        span.update(_latency(lambda: my_model.predict(batch), args.batch_repeats))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongodb-url", help="MongoDB server holding the benchmark collection, mongomock when not set")
+    parser.add_argument("--collection", default=f"{DATA_INGESTION_COLLECTION_NAME}_benchmark")
+    parser.add_argument("--export-mode", default=DataIngestionConfig.export_mode,
+                        choices=["streaming", "parallel", "full"])
+    parser.add_argument("--model-search", action="store_true", help="Train the candidates of config/model.yaml")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--batch-rows", type=int, default=10_000)
+    parser.add_argument("--batch-repeats", type=int, default=10)
+    parser.add_argument("--output", help="Optional JSON file the metrics are written to")
+    args = parser.parse_args()
+
+    if args.mongodb_url:
+        import pymongo
+        MongoDBClient.client = pymongo.MongoClient(args.mongodb_url)
+    else:
+        import mongomock
+        MongoDBClient.client = mongomock.MongoClient()
+    collection = MongoDBClient.client[DATABASE_NAME][args.collection]
+    _load_collection(collection, args.rows, args.seed)
+
+    reset_metrics()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            run_stages(args, directory)
+    finally:
+        collection.drop()
+
+    metrics = get_metrics(commit=_get_commit(), rows=args.rows, seed=args.seed,
+                          mongodb="server" if args.mongodb_url else "mongomock", export_mode=args.export_mode,
+                          model_search=args.model_search)
+    for name, entry in metrics["summary"].items():
+        print({"name": name, **entry})
+
+    if args.output:
+        save_metrics(os.path.abspath(args.output), metrics)
+
+
+if __name__ == "__main__":
+    main()
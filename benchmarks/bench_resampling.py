@@ -0,0 +1,84 @@
+"""
+bench_resampling.py
+
+Compares the SMOTEENN call the data transformation used to make, SMOTEENN(sampling_strategy="minority")
+on the float64 transformed training data, with the StratifiedSMOTEENN configurations: float32 features,
+threaded neighbour searches and per Region_Code resampling, each in its own process. Reports the wall time, the growth of the
+peak RSS during the resampling, the rows produced and the positive class share, which should stay
+close to the one of the current call.
+
+Usage:
+------
+    python -m benchmarks.bench_resampling --rows 200000 --n-jobs -1
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+from imblearn.combine import SMOTEENN
+
+from benchmarks.synthetic_data import make_dataframe
+from src.components.data_transformation import DataTransformation
+from src.constants import TARGET_COLUMN
+from src.entity.resampling import StratifiedSMOTEENN
+from src.utils.profiling import get_peak_rss, reset_peak_rss
+
+
+def _resample(config: str, args) -> dict:
+    dataframe = make_dataframe(args.rows, include_id=False)
+    features = dataframe.drop(columns=[TARGET_COLUMN])
+    target = dataframe[TARGET_COLUMN]
+    features_arr = DataTransformation(None, None, None).get_data_transformer_object().fit_transform(features)
+    strata = features["Region_Code"].to_numpy() if config.endswith("per_region") else None
+    if config == "current_smoteenn":
+        resample = lambda: SMOTEENN(sampling_strategy="minority", random_state=42).fit_resample(features_arr, target)
+    else:
+        resampler = StratifiedSMOTEENN(n_jobs=1 if config.startswith("float32_1_thread") else args.n_jobs,
+                                       algorithm=args.algorithm, dtype=config.split("_")[0],
+                                       min_stratum_rows=args.min_stratum_rows, random_state=42)
+        resample = lambda: resampler.fit_resample(features_arr, target, strata=strata)
+
+    reset_peak_rss()
+    base_memory = get_peak_rss()
+    start = time.perf_counter()
+    X, y = resample()
+    elapsed = time.perf_counter() - start
+    peak_memory = get_peak_rss() - base_memory
+    return {"config": config, "seconds": round(elapsed, 3), "peak_rss_growth_mb": round(peak_memory / 2**20, 1),
+            "rows_out": len(y), "positive_share": round(float(np.mean(np.asarray(y) == 1)), 4)}
+
+
+def _worker(config: str, args, results) -> None:
+    results.put(_resample(config, args))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--algorithm", default="auto")
+    parser.add_argument("--min-stratum-rows", type=int, default=1_000)
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    # Every configuration runs in a fresh process, so its peak RSS is not hidden by memory freed earlier
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for config in ("current_smoteenn", "float32_1_thread", "float32", "float64_per_region", "float32_per_region"):
+        queue = context.Queue()
+        process = context.Process(target=_worker, args=(config, args, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+        print(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
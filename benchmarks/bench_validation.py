@@ -0,0 +1,62 @@
+"""
+bench_validation.py
+
+Measures the SchemaValidator on growing datasets, both on a complete DataFrame and chunk by chunk,
+and reports the time per row so it can be checked that validation stays linear in the number of rows.
+
+Usage:
+------
+    python -m benchmarks.bench_validation --rows 1000000 2000000 5000000 10000000
+"""
+
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic_data import make_dataframe
+from src.constants import SCHEMA_FILE_PATH
+from src.entity.schema_validator import SchemaValidator
+from src.utils.main_utils import read_yaml_file, apply_schema_dtypes
+
+CHUNK_ROWS = 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 2_000_000, 5_000_000, 10_000_000])
+    parser.add_argument("--output", help="Optional JSON file the results are written to")
+    args = parser.parse_args()
+
+    schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
+    validator = SchemaValidator(schema_config=schema_config)
+    max_rows = max(args.rows)
+    # Categorical chunks keep a 10M row frame within a few hundred MB
+    chunks = [apply_schema_dtypes(make_dataframe(min(CHUNK_ROWS, max_rows - start), seed=start, include_id=False),
+                                  schema_config) for start in range(0, max_rows, CHUNK_ROWS)]
+
+    results = []
+    for rows in sorted(args.rows):
+        dataframe = pd.concat(chunks, ignore_index=True).iloc[:rows]
+
+        start = time.perf_counter()
+        report = validator.validate(dataframe)
+        frame_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        validator.validate_chunks(dataframe.iloc[offset:offset + CHUNK_ROWS] for offset in range(0, rows, CHUNK_ROWS))
+        chunked_time = time.perf_counter() - start
+
+        results.append({"rows": rows, "status": report["validation_status"],
+                        "frame_s": round(frame_time, 3), "frame_ns_per_row": round(frame_time / rows * 1e9, 1),
+                        "chunked_s": round(chunked_time, 3), "chunked_ns_per_row": round(chunked_time / rows * 1e9, 1)})
+        print(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
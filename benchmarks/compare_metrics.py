@@ -0,0 +1,46 @@
+"""
+compare_metrics.py
+
+Compares the metrics.json of two training pipeline runs and lists the steps whose wall time or peak RSS grew
+by more than the tolerance. Exits with status 1 when there is a regression, so it can gate a CI job.
+
+Usage:
+------
+    python -m benchmarks.compare_metrics artifact/<baseline>/metrics.json artifact/<current>/metrics.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import sys
+
+from src.constants import PIPELINE_REGRESSION_TOLERANCE
+from src.utils.profiling import compare_metrics, load_metrics
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", help="metrics.json of the baseline run")
+    parser.add_argument("current", help="metrics.json of the run to check")
+    parser.add_argument("--tolerance", type=float, default=PIPELINE_REGRESSION_TOLERANCE)
+    parser.add_argument("--min-wall-s", type=float, default=0.1)
+    parser.add_argument("--output", help="Optional JSON file the regressions are written to")
+    args = parser.parse_args()
+
+    baseline, current = load_metrics(args.baseline), load_metrics(args.current)
+    for name, entry in current["summary"].items():
+        before = baseline["summary"].get(name)
+        print({"name": name, "wall_s": entry["wall_s"], "baseline_wall_s": before and before["wall_s"],
+               "peak_rss_mb": entry["peak_rss_mb"], "baseline_peak_rss_mb": before and before["peak_rss_mb"]})
+
+    regressions = compare_metrics(current, baseline, tolerance=args.tolerance, min_wall_s=args.min_wall_s)
+    for regression in regressions:
+        print("REGRESSION", regression)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(regressions, file, indent=4)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+synthetic_data.py
+
+Synthetic vehicle insurance data following config/schema.yaml, for the benchmarks and for running the
+pipeline without the production MongoDB. The marginals follow the public cross-sell dataset the project is
+built on: about 54% male, 46% previously insured, half with a damaged vehicle, "> 2 Years" vehicles rare, a few
+regions and sales channels holding most customers, a floor on the annual premium, and about 12% positive
+Response, almost only among customers who were not insured and whose vehicle was damaged. Large datasets are
+generated in chunks with their own seeds, so a 50M row file never has to fit in memory and the same seed
+always gives the same rows.
+
+Usage:
+------
+    python -m benchmarks.synthetic_data --rows 10000000 --output data/synthetic.parquet
+"""
+
+import argparse
+import os
+import time
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from src.constants import (SCHEMA_FILE_PATH, TARGET_COLUMN, MODEL_TRAINER_N_ESTIMATORS, MODEL_TRAINER_MIN_SAMPLES_SPLIT,
+                           MODEL_TRAINER_MIN_SAMPLES_LEAF, MIN_SAMPLES_SPLIT_MAX_DEPTH, MIN_SAMPLES_SPLIT_CRITERION,
+                           MIN_SAMPLES_SPLIT_RANDOM_STATE)
+from src.utils.main_utils import read_yaml_file, apply_schema_dtypes, get_schema_dtypes
+
+# Document value types of the schema dtype kinds, whatever their width, categories are strings
+DOCUMENT_DTYPES = {"i": np.int64, "f": np.float64}
+VEHICLE_AGES = np.array(["< 1 Year", "1-2 Year", "> 2 Years"])
+# Regions and sales channels with most of the customers, the others share the rest uniformly
+TOP_REGIONS = {28.0: 0.28, 8.0: 0.09, 46.0: 0.05, 41.0: 0.05}
+TOP_CHANNELS = {152.0: 0.35, 26.0: 0.21, 124.0: 0.19, 160.0: 0.06}
+MIN_ANNUAL_PREMIUM = 2630.0
+
+
+def _choice_with_top_values(rng: np.random.Generator, top_values: dict, low: int, high: int, rows: int) -> np.ndarray:
+    values = rng.integers(low, high, size=rows).astype(np.float64)
+    draw = rng.random(rows)
+    threshold = 0.0
+    for value, probability in top_values.items():
+        values[(draw >= threshold) & (draw < threshold + probability)] = value
+        threshold += probability
+    return values
+
+
+def make_dataframe(rows: int, seed: int = 42, include_id: bool = True, start_id: int = 0) -> pd.DataFrame:
+    """
+    Returns rows with the schema columns, as exported from MongoDB: "_id" (ObjectId-like hex strings)
+    when include_id is set, without the "id" column dropped at ingestion
+    """
+    rng = np.random.default_rng(seed)
+    # Young customers mostly have new vehicles
+    age = np.where(rng.random(rows) < 0.45, rng.integers(20, 30, size=rows), rng.integers(30, 86, size=rows))
+    young = age < 30
+    vehicle_age = np.where(young, rng.choice(3, size=rows, p=[0.85, 0.14, 0.01]),
+                           rng.choice(3, size=rows, p=[0.12, 0.81, 0.07]))
+    previously_insured = (rng.random(rows) < np.where(young, 0.62, 0.33)).astype(np.int64)
+    # Customers who were insured rarely report a damaged vehicle
+    vehicle_damage = rng.random(rows) < np.where(previously_insured == 1, 0.02, 0.92)
+    annual_premium = np.where(rng.random(rows) < 0.17, MIN_ANNUAL_PREMIUM,
+                              np.maximum(MIN_ANNUAL_PREMIUM, rng.lognormal(np.log(33000), 0.35, size=rows)))
+
+    # Interest peaks for middle-aged customers with older vehicles, and is close to zero without damage
+    response_rate = np.where(vehicle_damage & (previously_insured == 0),
+                             0.19 + 0.08 * ((age >= 30) & (age < 55)) + 0.06 * (vehicle_age > 0), 0.003)
+
+    return pd.DataFrame({
+        **({"_id": [f"{i:024x}" for i in range(start_id, start_id + rows)]} if include_id else {}),
+        "Gender": np.where(rng.random(rows) < 0.54, "Male", "Female").astype(object),
+        "Age": age.astype(np.int64),
+        "Driving_License": (rng.random(rows) < 0.998).astype(np.int64),
+        "Region_Code": _choice_with_top_values(rng, TOP_REGIONS, 0, 53, rows),
+        "Previously_Insured": previously_insured,
+        "Vehicle_Age": VEHICLE_AGES[vehicle_age].astype(object),
+        "Vehicle_Damage": np.where(vehicle_damage, "Yes", "No").astype(object),
+        "Annual_Premium": np.round(annual_premium),
+        "Policy_Sales_Channel": _choice_with_top_values(rng, TOP_CHANNELS, 1, 164, rows),
+        "Vintage": rng.integers(10, 300, size=rows),
+        TARGET_COLUMN: (rng.random(rows) < response_rate).astype(np.int64),
+    })
+
+
+def iter_dataframe_chunks(rows: int, chunk_rows: int = 1_000_000, seed: int = 42,
+                          include_id: bool = True) -> Iterator[pd.DataFrame]:
+    """
+    Yields make_dataframe chunks of at most chunk_rows rows, every chunk with its own seed derived from seed
+    """
+    seeds = np.random.SeedSequence(seed).spawn((rows + chunk_rows - 1) // chunk_rows)
+    for index, chunk_seed in enumerate(seeds):
+        start = index * chunk_rows
+        yield make_dataframe(min(chunk_rows, rows - start), seed=chunk_seed, include_id=include_id, start_id=start)
+
+
+def make_documents(rows: int, seed: int = 42, start_id: int = 0) -> list:
+    """
+    Returns MongoDB documents with the schema columns: an "id" counting from start_id + 1 and no "_id",
+    which the database assigns
+    """
+    dataframe = make_dataframe(rows, seed=seed, include_id=False)
+    dataframe.insert(0, "id", np.arange(start_id + 1, start_id + rows + 1))
+    schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
+    dtypes = {name: DOCUMENT_DTYPES.get(getattr(dtype, "kind", None), object)
+              for name, dtype in get_schema_dtypes(schema_config).items()}
+    return dataframe.astype({name: dtypes[name] for name in dataframe.columns}).to_dict("records")
+
+
+def train_model(rows: int, seed: int = 0, **forest_params):
+    """
+    Returns a MyModel with the preprocessing pipeline and the RandomForestClassifier parameters of the
+    constants, overridden by forest_params, fitted on synthetic rows
+    """
+    from src.components.data_transformation import DataTransformation
+    from src.entity.estimator import MyModel
+
+    dataframe = apply_schema_dtypes(make_dataframe(rows, seed=seed, include_id=False),
+                                    read_yaml_file(file_path=SCHEMA_FILE_PATH))
+    preprocessor = DataTransformation(None, None, None).get_data_transformer_object()
+    features = preprocessor.fit_transform(dataframe.drop(columns=[TARGET_COLUMN]))
+    params = dict(n_estimators=MODEL_TRAINER_N_ESTIMATORS, min_samples_split=MODEL_TRAINER_MIN_SAMPLES_SPLIT,
+                  min_samples_leaf=MODEL_TRAINER_MIN_SAMPLES_LEAF, max_depth=MIN_SAMPLES_SPLIT_MAX_DEPTH,
+                  criterion=MIN_SAMPLES_SPLIT_CRITERION, random_state=MIN_SAMPLES_SPLIT_RANDOM_STATE)
+    model = RandomForestClassifier(**{**params, **forest_params})
+    model.fit(features, dataframe[TARGET_COLUMN])
+    return MyModel(preprocessing_object=preprocessor, trained_model_object=model)
+
+
+def write_dataset(file_path: str, rows: int, chunk_rows: int = 1_000_000, seed: int = 42) -> None:
+    """
+    Writes rows to a parquet or csv file chunk by chunk
+    """
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    file_format = os.path.splitext(file_path)[1].lstrip(".").lower()
+    if file_format not in ("parquet", "csv"):
+        raise ValueError(f"Unsupported dataset format: '{file_format}', expected parquet or csv")
+    writer = None
+    try:
+        for index, chunk in enumerate(iter_dataframe_chunks(rows, chunk_rows=chunk_rows, seed=seed)):
+            if file_format == "csv":
+                chunk.to_csv(file_path, index=False, header=index == 0, mode="w" if index == 0 else "a")
+                continue
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(file_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True, help="parquet or csv file the rows are written to")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    write_dataset(args.output, args.rows, chunk_rows=args.chunk_rows, seed=args.seed)
+    print({"rows": args.rows, "file": args.output, "seconds": round(time.perf_counter() - start, 3),
+           "size_mb": round(os.path.getsize(args.output) / 2**20, 1)})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 from src.pipline.training_pipeline import TrainPipeline
 
-pipeline = TrainPipeline()
-pipeline.run_pipeline()
\ No newline at end of file
+# The model search starts worker processes that re-import this module, so the pipeline only runs here
+if __name__ == "__main__":
+    pipeline = TrainPipeline()
+    pipeline.run_pipeline()
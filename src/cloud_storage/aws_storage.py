@@ -0,0 +1,219 @@
+import base64
+import hashlib
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import dill
+from botocore.exceptions import ClientError
+
+from src.configuration.aws_connection import S3Client
+from src.exception import MyException
+from src.logger import logging
+
+
+class SimpleStorageService:
+    """
+    Wrapper around the S3 operations used by the model registry
+    """
+
+    def __init__(self):
+        """
+        Gets the S3 resource and client from the shared S3Client connection
+        """
+        s3_client = S3Client()
+        self.s3_resource = s3_client.s3_resource
+        self.s3_client = s3_client.s3_client
+
+    def s3_key_path_available(self, bucket_name: str, s3_key: str) -> bool:
+        """
+        Checks whether any object exists under the given key prefix of the bucket
+        """
+        try:
+            bucket = self.get_bucket(bucket_name)
+            return any(True for _ in bucket.objects.filter(Prefix=s3_key).limit(1))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def get_bucket(self, bucket_name: str):
+        """
+        Returns the bucket resource of bucket_name
+        """
+        try:
+            return self.s3_resource.Bucket(bucket_name)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    @staticmethod
+    def _get_version_token(response: dict) -> str:
+        # VersionId on a versioned bucket, the (quoted) ETag otherwise
+        version_id = response.get("VersionId")
+        return version_id if version_id and version_id != "null" else response["ETag"]
+
+    def get_object_metadata(self, bucket_name: str, s3_key: str) -> Optional[dict]:
+        """
+        Returns the version token, size and user metadata of an object with a single HEAD request,
+        None when the object does not exist
+        """
+        try:
+            response = self.s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+            return {"version": self._get_version_token(response), "size": response["ContentLength"],
+                    "metadata": response.get("Metadata", {})}
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise MyException(e, sys) from e
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def get_object_version(self, bucket_name: str, s3_key: str) -> Optional[str]:
+        """
+        Returns a token identifying the current version of an object with a single HEAD request: its VersionId
+        on a versioned bucket, its (quoted) ETag otherwise. Returns None when the object does not exist.
+        """
+        object_metadata = self.get_object_metadata(bucket_name, s3_key)
+        return None if object_metadata is None else object_metadata["version"]
+
+    def download_file(self, bucket_name: str, s3_key: str, file_path: str, version: Optional[str] = None) -> None:
+        """
+        Downloads an object to file_path. When a version token of get_object_version is given, exactly that
+        version is downloaded (VersionId) or the download fails if the object changed meanwhile (ETag).
+        The file is written under a temporary name and moved in place once complete.
+        """
+        try:
+            request = {"Bucket": bucket_name, "Key": s3_key}
+            if version is not None:
+                # ETags are always returned quoted, version ids never contain quotes
+                request["IfMatch" if version.startswith('"') else "VersionId"] = version
+
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            # Unique per process and thread, so workers downloading the same version never share the file
+            temp_file_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            body = self.s3_client.get_object(**request)["Body"]
+            try:
+                with open(temp_file_path, "wb") as file_obj:
+                    shutil.copyfileobj(body, file_obj)
+                os.replace(temp_file_path, file_path)
+            finally:
+                if os.path.exists(temp_file_path):
+                    os.remove(temp_file_path)
+            logging.info(f"Downloaded s3://{bucket_name}/{s3_key} to {file_path}")
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def upload_file(self, from_filename: str, to_filename: str, bucket_name: str, remove: bool = True) -> None:
+        """
+        Uploads a local file to the bucket, optionally removing the local file afterwards
+        """
+        try:
+            logging.info(f"Uploading {from_filename} to s3://{bucket_name}/{to_filename}")
+            self.s3_resource.meta.client.upload_file(from_filename, bucket_name, to_filename)
+            if remove:
+                os.remove(from_filename)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    @staticmethod
+    def _sha256(data: bytes) -> str:
+        return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+    @staticmethod
+    def _check_checksum(response: dict, expected: str, description: str) -> None:
+        # S3-compatible stores without additional checksums do not return one
+        checksum = response.get("ChecksumSHA256")
+        if checksum is not None and checksum != expected:
+            raise Exception(f"Checksum mismatch for {description}: S3 returned SHA256 {checksum}, expected {expected}")
+
+    def upload_file_multipart(self, from_filename: str, bucket_name: str, s3_key: str, part_size: int, workers: int,
+                              metadata: Optional[dict] = None) -> str:
+        """
+        Uploads a local file in parts of part_size bytes sent by workers threads. Every part carries its MD5 and
+        SHA256, so S3 rejects a part corrupted in transit, and the SHA256 checksums S3 returns for every part and
+        for the whole object are checked against the same digests. Unlike ETags, they are the digests of the
+        data whatever the encryption of the bucket. Files of a single part are sent with one PUT. A failed
+        upload is aborted, so no orphan parts are left in the bucket.
+        Returns the version token of the uploaded object, as get_object_version does.
+        """
+        try:
+            size = os.path.getsize(from_filename)
+            metadata = metadata or {}
+            if size <= part_size:
+                with open(from_filename, "rb") as file_obj:
+                    data = file_obj.read()
+                checksum = self._sha256(data)
+                response = self.s3_client.put_object(Bucket=bucket_name, Key=s3_key, Body=data, Metadata=metadata,
+                                                     ContentMD5=base64.b64encode(hashlib.md5(data).digest()).decode(),
+                                                     ChecksumAlgorithm="SHA256", ChecksumSHA256=checksum)
+                self._check_checksum(response, checksum, f"s3://{bucket_name}/{s3_key}")
+                return self._get_version_token(response)
+
+            upload_id = self.s3_client.create_multipart_upload(Bucket=bucket_name, Key=s3_key, Metadata=metadata,
+                                                               ChecksumAlgorithm="SHA256")["UploadId"]
+            try:
+                def upload_part(part_number: int) -> tuple:
+                    with open(from_filename, "rb") as file_obj:
+                        file_obj.seek((part_number - 1) * part_size)
+                        data = file_obj.read(part_size)
+                    digest = hashlib.sha256(data).digest()
+                    checksum = base64.b64encode(digest).decode()
+                    response = self.s3_client.upload_part(Bucket=bucket_name, Key=s3_key, UploadId=upload_id,
+                                                          PartNumber=part_number, Body=data,
+                                                          ContentMD5=base64.b64encode(hashlib.md5(data).digest()).decode(),
+                                                          ChecksumAlgorithm="SHA256", ChecksumSHA256=checksum)
+                    self._check_checksum(response, checksum, f"part {part_number} of s3://{bucket_name}/{s3_key}")
+                    return {"PartNumber": part_number, "ETag": response["ETag"], "ChecksumSHA256": checksum}, digest
+
+                n_parts = (size + part_size - 1) // part_size
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-upload") as executor:
+                    parts = list(executor.map(upload_part, range(1, n_parts + 1)))
+                response = self.s3_client.complete_multipart_upload(
+                    Bucket=bucket_name, Key=s3_key, UploadId=upload_id,
+                    MultipartUpload={"Parts": [part for part, _ in parts]})
+            except Exception:
+                self.s3_client.abort_multipart_upload(Bucket=bucket_name, Key=s3_key, UploadId=upload_id)
+                raise
+            # The checksum of a multipart object is the SHA256 of the part digests followed by the number of parts
+            expected = f"{self._sha256(b''.join(digest for _, digest in parts))}-{n_parts}"
+            self._check_checksum(response, expected, f"s3://{bucket_name}/{s3_key}")
+            logging.info(f"Uploaded {from_filename} to s3://{bucket_name}/{s3_key} in {n_parts} parts")
+            return self._get_version_token(response)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def upload_bytes(self, data: bytes, bucket_name: str, s3_key: str) -> str:
+        """
+        Writes a small object from memory, returns its version token
+        """
+        try:
+            response = self.s3_client.put_object(Bucket=bucket_name, Key=s3_key, Body=data,
+                                                 ContentMD5=base64.b64encode(hashlib.md5(data).digest()).decode())
+            return self._get_version_token(response)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def read_object(self, bucket_name: str, s3_key: str) -> Optional[bytes]:
+        """
+        Returns the content of a small object, None when it does not exist
+        """
+        try:
+            return self.s3_client.get_object(Bucket=bucket_name, Key=s3_key)["Body"].read()
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise MyException(e, sys) from e
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def load_model(self, model_name: str, bucket_name: str, model_dir: Optional[str] = None) -> object:
+        """
+        Loads a serialized model straight from the bucket, without any local cache
+        """
+        try:
+            model_file = model_dir + "/" + model_name if model_dir else model_name
+            body = self.s3_client.get_object(Bucket=bucket_name, Key=model_file)["Body"]
+            return dill.loads(body.read())
+        except Exception as e:
+            raise MyException(e, sys) from e
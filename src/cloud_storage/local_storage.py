@@ -0,0 +1,139 @@
+import os
+import shutil
+import sys
+import threading
+from typing import Optional
+
+import dill
+
+from src.exception import MyException
+from src.logger import logging
+from src.utils.main_utils import get_file_digest
+
+
+class LocalStorageService:
+    """
+    Filesystem-backed stand-in for SimpleStorageService with the same interface.
+    A bucket is a directory under root_dir and a key a relative path inside it, so the model registry
+    can be used locally and in development without any S3 endpoint.
+    """
+
+    def __init__(self, root_dir: str):
+        """
+        :param root_dir: directory holding one sub-directory per bucket
+        """
+        self.root_dir = root_dir
+
+    def _object_path(self, bucket_name: str, s3_key: str) -> str:
+        return os.path.join(self.root_dir, bucket_name, *s3_key.split("/"))
+
+    def s3_key_path_available(self, bucket_name: str, s3_key: str) -> bool:
+        """
+        Checks whether a file or directory exists under the given key of the bucket
+        """
+        return os.path.exists(self._object_path(bucket_name, s3_key))
+
+    def get_object_version(self, bucket_name: str, s3_key: str) -> Optional[str]:
+        """
+        Returns a token identifying the current version of a file from its modification time and size,
+        or None when the file does not exist
+        """
+        try:
+            stat = os.stat(self._object_path(bucket_name, s3_key))
+            return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def get_object_metadata(self, bucket_name: str, s3_key: str) -> Optional[dict]:
+        """
+        Returns the version token, size and metadata of a file, None when it does not exist. Files hold no user
+        metadata, their sha256 is computed instead.
+        """
+        version = self.get_object_version(bucket_name, s3_key)
+        if version is None:
+            return None
+        object_path = self._object_path(bucket_name, s3_key)
+        return {"version": version, "size": os.path.getsize(object_path),
+                "metadata": {"sha256": get_file_digest(object_path)}}
+
+    def download_file(self, bucket_name: str, s3_key: str, file_path: str, version: Optional[str] = None) -> None:
+        """
+        Copies a file of the bucket to file_path, failing if it no longer matches the given version
+        """
+        try:
+            source_path = self._object_path(bucket_name, s3_key)
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            temp_file_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(source_path, temp_file_path)
+            if version is not None and self.get_object_version(bucket_name, s3_key) != version:
+                os.remove(temp_file_path)
+                raise Exception(f"{source_path} changed while it was downloaded, expected version {version}")
+            os.replace(temp_file_path, file_path)
+            logging.info(f"Copied {source_path} to {file_path}")
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def upload_file(self, from_filename: str, to_filename: str, bucket_name: str, remove: bool = True) -> None:
+        """
+        Copies a local file into the bucket, replacing the previous version atomically
+        """
+        try:
+            target_path = self._object_path(bucket_name, to_filename)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            temp_file_path = f"{target_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(from_filename, temp_file_path)
+            os.replace(temp_file_path, target_path)
+            logging.info(f"Copied {from_filename} to {target_path}")
+            if remove:
+                os.remove(from_filename)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def upload_file_multipart(self, from_filename: str, bucket_name: str, s3_key: str, part_size: int, workers: int,
+                              metadata: Optional[dict] = None) -> str:
+        """
+        Copies a local file into the bucket in one piece, the part settings only apply to S3.
+        Returns the version token of the copy.
+        """
+        self.upload_file(from_filename, to_filename=s3_key, bucket_name=bucket_name, remove=False)
+        return self.get_object_version(bucket_name, s3_key)
+
+    def upload_bytes(self, data: bytes, bucket_name: str, s3_key: str) -> str:
+        """
+        Writes a small file from memory atomically, returns its version token
+        """
+        try:
+            target_path = self._object_path(bucket_name, s3_key)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            temp_file_path = f"{target_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_file_path, "wb") as file_obj:
+                file_obj.write(data)
+            os.replace(temp_file_path, target_path)
+            return self.get_object_version(bucket_name, s3_key)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def read_object(self, bucket_name: str, s3_key: str) -> Optional[bytes]:
+        """
+        Returns the content of a file, None when it does not exist
+        """
+        try:
+            with open(self._object_path(bucket_name, s3_key), "rb") as file_obj:
+                return file_obj.read()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def load_model(self, model_name: str, bucket_name: str, model_dir: Optional[str] = None) -> object:
+        """
+        Loads a serialized model straight from the bucket directory
+        """
+        try:
+            model_file = model_dir + "/" + model_name if model_dir else model_name
+            with open(self._object_path(bucket_name, model_file), "rb") as file_obj:
+                return dill.load(file_obj)
+        except Exception as e:
+            raise MyException(e, sys) from e
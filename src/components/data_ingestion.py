@@ -1,14 +1,21 @@
 import os
 import sys
+import json
+from typing import Tuple
 
+from bson import ObjectId
+import pandas as pd
 from pandas import DataFrame
-from sklearn.model_selection import train_test_split
 
 from src.entity.config_entity import DataIngestionConfig
 from src.entity.artifact_entity import DataIngestionArtifact
 from src.exception import MyException
 from src.logger import logging
 from src.data_access.proj1_data import Vehicle_Data
+from src.constants import SCHEMA_FILE_PATH
+from src.utils.main_utils import (read_yaml_file, save_dataframe, load_dataframe, get_file_format, apply_schema_dtypes,
+                                  write_artifact_async, concat_dataframes)
+from src.utils.profiling import profile_span
 
 class DataIngestion:
     def __init__(self, data_ingestion_config: DataIngestionConfig = DataIngestionConfig()):
@@ -17,13 +24,14 @@ class DataIngestion:
         """
         try:
             self.data_ingestion_config = data_ingestion_config
+            self._schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
         except Exception as e:
             raise MyException(e, sys)
 
     def export_data_into_feature_store(self) -> DataFrame:
         """
         Method Name :   export_data_into_feature_store
-        Description :   This method exports data from mongodb to csv file
+        Description :   This method exports data from mongodb to the feature store file
         
         Output      :   data is returned as artifact of data ingestion components
         On Failure  :   Write an exception log and then raise an exception
@@ -31,42 +39,246 @@ class DataIngestion:
         try:
             logging.info(f"Exporting the data from mongodb")
             my_data = Vehicle_Data()
-            dataframe = my_data.export_collection_as_dataframe(collection_name=self.data_ingestion_config.collection_name)
-            logging.info(f"Shape of the dataframe: {dataframe.shape}")
+            if self.data_ingestion_config.incremental:
+                return self.export_delta_into_feature_store(my_data)
+
             feature_store_file_path = self.data_ingestion_config.feature_store_file_path
             dir_path = os.path.dirname(feature_store_file_path)
             os.makedirs(dir_path,exist_ok=True)
+
+            streamed_csv = (self.data_ingestion_config.export_mode == "streaming"
+                            and get_file_format(feature_store_file_path) == "csv")
+            with profile_span("mongo_fetch", mode=self.data_ingestion_config.export_mode) as span:
+                if self.data_ingestion_config.export_mode == "streaming":
+                    dataframe = self.stream_data_into_feature_store(my_data)
+                elif self.data_ingestion_config.export_mode == "parallel":
+                    dataframe = my_data.export_collection_in_partitions(collection_name=self.data_ingestion_config.collection_name,
+                                                                        partitions=self.data_ingestion_config.export_partitions,
+                                                                        workers=self.data_ingestion_config.export_workers,
+                                                                        batch_size=self.data_ingestion_config.export_batch_size,
+                                                                        key=self.data_ingestion_config.export_partition_key)
+                else:
+                    dataframe = my_data.export_collection_as_dataframe(collection_name=self.data_ingestion_config.collection_name)
+                span["rows"] = len(dataframe)
+
+            dataframe = self.prepare_feature_store_dataframe(dataframe)
+            # Streamed csv chunks are already appended to the feature store
+            if not streamed_csv:
+                self.save_artifact_dataframe(feature_store_file_path, dataframe)
+
+            logging.info(f"Shape of the dataframe: {dataframe.shape}")
             logging.info(f"Saved exported data to feature store file path: {feature_store_file_path}")
-            dataframe.to_csv(feature_store_file_path, index=False, header=True)
             return dataframe
         except Exception as e:
             raise MyException(e, sys)
-    
-    def split_data_as_train_test(self, dataframe: DataFrame) -> None:
+
+    def stream_data_into_feature_store(self, my_data: Vehicle_Data) -> DataFrame:
+        """
+        Method Name :   stream_data_into_feature_store
+        Description :   This method reads the collection in batches, so the raw documents are never held in memory
+                        at once. With a csv feature store every chunk is appended to the file as soon as it is fetched
+
+        Output      :   Concatenated chunks are returned as a single dataframe, the chunks are freed as it is built
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            feature_store_file_path = self.data_ingestion_config.feature_store_file_path
+            append_to_csv = get_file_format(feature_store_file_path) == "csv"
+            chunks = []
+            for chunk in my_data.export_collection_in_chunks(collection_name=self.data_ingestion_config.collection_name,
+                                                             batch_size=self.data_ingestion_config.export_batch_size):
+                if append_to_csv:
+                    chunk.to_csv(feature_store_file_path, index=False, header=not chunks, mode="w" if not chunks else "a")
+                chunks.append(chunk)
+                logging.info(f"Exported chunk {len(chunks)} with {len(chunk)} rows")
+
+            if not chunks:
+                raise Exception(f"Collection '{self.data_ingestion_config.collection_name}' returned no documents")
+            # Built column by column while the chunks are released, so the export never holds the data twice
+            return concat_dataframes(chunks, release=True)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def save_artifact_dataframe(self, file_path: str, dataframe: DataFrame) -> None:
+        """
+        Method Name :   save_artifact_dataframe
+        Description :   This method writes an artifact dataframe, in the background when the data is handed
+                        to the next stages in memory
+
+        Output      :   Dataframe is written (or queued for writing) to the file path
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            if self.data_ingestion_config.in_memory_handoff:
+                write_artifact_async(save_dataframe, file_path, dataframe)
+            else:
+                save_dataframe(file_path, dataframe)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def prepare_feature_store_dataframe(self, dataframe: DataFrame) -> DataFrame:
+        """
+        Method Name :   prepare_feature_store_dataframe
+        Description :   This method stores the MongoDB '_id' as string and casts the schema columns to their
+                        schema dtypes, so columnar feature stores keep the dtypes declared in schema.yaml
+
+        Output      :   Returns the prepared dataframe
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            if "_id" in dataframe.columns:
+                dataframe["_id"] = dataframe["_id"].astype(str)
+            return apply_schema_dtypes(dataframe, self._schema_config)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def append_to_consolidated_store(self, chunk: DataFrame) -> None:
+        """
+        Method Name :   append_to_consolidated_store
+        Description :   This method appends a chunk to the consolidated feature store. A csv store is a single file,
+                        columnar stores are directories with one part file per appended chunk
+
+        Output      :   Chunk is persisted in the consolidated feature store
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            store_file_path = self.data_ingestion_config.consolidated_store_file_path
+            file_format = get_file_format(store_file_path)
+            if file_format == "csv":
+                store_exists = os.path.exists(store_file_path)
+                chunk.to_csv(store_file_path, index=False, header=not store_exists, mode="a" if store_exists else "w")
+            else:
+                os.makedirs(store_file_path, exist_ok=True)
+                part_file_path = os.path.join(store_file_path, f"part-{len(os.listdir(store_file_path)):05d}.{file_format}")
+                save_dataframe(part_file_path, self.prepare_feature_store_dataframe(chunk))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def read_high_water_mark(self):
+        """
+        Method Name :   read_high_water_mark
+        Description :   This method reads the last ingested value of the incremental key from the high-water mark file
+
+        Output      :   Returns the high-water mark, or None when nothing has been ingested into the store yet
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            high_water_mark_file_path = self.data_ingestion_config.high_water_mark_file_path
+            if not (os.path.exists(high_water_mark_file_path)
+                    and os.path.exists(self.data_ingestion_config.consolidated_store_file_path)):
+                return None
+            with open(high_water_mark_file_path, "r") as file:
+                high_water_mark = json.load(file)
+            if high_water_mark["key"] != self.data_ingestion_config.incremental_key:
+                raise Exception(f"High-water mark was recorded on '{high_water_mark['key']}', "
+                                f"not on '{self.data_ingestion_config.incremental_key}'")
+            return ObjectId(high_water_mark["value"]) if high_water_mark["object_id"] else high_water_mark["value"]
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def write_high_water_mark(self, value, rows: int) -> None:
+        """
+        Method Name :   write_high_water_mark
+        Description :   This method atomically replaces the high-water mark file with the given key value
+
+        Output      :   High-water mark file is written next to the consolidated feature store
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            high_water_mark_file_path = self.data_ingestion_config.high_water_mark_file_path
+            high_water_mark = {
+                "key": self.data_ingestion_config.incremental_key,
+                "value": str(value) if isinstance(value, ObjectId) else value,
+                "object_id": isinstance(value, ObjectId),
+                "rows": rows
+            }
+            temp_file_path = f"{high_water_mark_file_path}.tmp"
+            with open(temp_file_path, "w") as file:
+                json.dump(high_water_mark, file, indent=4)
+            os.replace(temp_file_path, high_water_mark_file_path)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def export_delta_into_feature_store(self, my_data: Vehicle_Data) -> DataFrame:
+        """
+        Method Name :   export_delta_into_feature_store
+        Description :   This method fetches only the documents added after the persisted high-water mark, appends
+                        them to the consolidated feature store and then advances the high-water mark
+
+        Output      :   Merged dataset of the consolidated feature store is returned
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            key = self.data_ingestion_config.incremental_key
+            store_file_path = self.data_ingestion_config.consolidated_store_file_path
+            os.makedirs(os.path.dirname(store_file_path), exist_ok=True)
+
+            # Documents inserted while the export runs are left for the next run
+            lower = self.read_high_water_mark()
+            upper = my_data.get_max_key(collection_name=self.data_ingestion_config.collection_name, key=key)
+            key_range = {"$lte": upper}
+            if lower is not None:
+                key_range["$gt"] = lower
+            logging.info(f"Fetching documents with {key} in ({lower}, {upper}]")
+
+            new_rows = 0
+            if upper is not None and upper != lower:
+                with profile_span("mongo_fetch", mode="incremental") as span:
+                    for chunk in my_data.export_collection_in_chunks(collection_name=self.data_ingestion_config.collection_name,
+                                                                     batch_size=self.data_ingestion_config.export_batch_size,
+                                                                     query={key: key_range}, sort_key=key,
+                                                                     extra_columns=[key]):
+                        self.append_to_consolidated_store(chunk)
+                        new_rows += len(chunk)
+                    span["rows"] = new_rows
+                self.write_high_water_mark(upper, rows=new_rows)
+            logging.info(f"Appended {new_rows} new rows to the consolidated feature store: {store_file_path}")
+
+            if not os.path.exists(store_file_path):
+                raise Exception(f"Collection '{self.data_ingestion_config.collection_name}' returned no documents")
+
+            dataframe = load_dataframe(store_file_path)
+            # Rows appended by a run that failed before advancing the high-water mark are fetched again
+            if key not in dataframe.columns:
+                raise Exception(f"Incremental key '{key}' is missing from the consolidated feature store")
+            dataframe = dataframe.drop_duplicates(subset=[key], keep="last", ignore_index=True)
+            # A key that is not part of the export, like 'id', is only stored to deduplicate the rows
+            if key not in my_data.get_exported_columns():
+                dataframe = dataframe.drop(columns=[key])
+            return self.prepare_feature_store_dataframe(dataframe)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def split_data_as_train_test(self, dataframe: DataFrame) -> Tuple[DataFrame, DataFrame]:
         """
         Method Name :   split_data_as_train_test
-        Description :   This method splits the dataframe into train set and test set based on split ratio 
+        Description :   This method splits the dataframe into train set and test set based on split ratio.
+                        The split of a row depends only on the hash of its split key, so it is the same in every run
         
-        Output      :   Folder is created in s3 bucket
+        Output      :   Train set and test set are saved to the ingested folder and returned
         On Failure  :   Write an exception log and then raise an exception
         """
 
         logging.info("Entered split_data_as_train_test method of Data_Ingestion class")
         try:
-            train_set, test_set = train_test_split(dataframe, test_size=self.data_ingestion_config.train_test_split_ratio)
+            split_key = self.data_ingestion_config.split_key
+            if split_key not in dataframe.columns:
+                raise Exception(f"Split key '{split_key}' is missing from the exported data")
+            # Stable across processes and runs: pandas hashes with a fixed key
+            hashes = pd.util.hash_pandas_object(dataframe[split_key].astype(str), index=False, categorize=False)
+            in_test_set = (hashes.to_numpy() % 10_000) < self.data_ingestion_config.train_test_split_ratio * 10_000
+            train_set, test_set = dataframe[~in_test_set], dataframe[in_test_set]
             logging.info("Performed train test split on the dataframe")
             logging.info(
                 "Exited split_data_as_train_test method of Data_Ingestion class"
             )
-            dir_path = os.path.dirname(self.data_ingestion_config.training_file_path)
-            os.makedirs(dir_path, exist_ok=True)
-
             logging.info(f"Exporting train and test file path")
             
-            train_set.to_csv(self.data_ingestion_config.training_file_path, index=False, header=True)
-            test_set.to_csv(self.data_ingestion_config.testing_file_path, index=False, header=True)
+            self.save_artifact_dataframe(self.data_ingestion_config.training_file_path, train_set)
+            self.save_artifact_dataframe(self.data_ingestion_config.testing_file_path, test_set)
 
             logging.info(f"Exported train and test file path")
+            return train_set, test_set
         except Exception as e:
             raise MyException(e, sys) from e
         
@@ -83,13 +295,15 @@ class DataIngestion:
         try:
             dataframe = self.export_data_into_feature_store()
             logging.info("Fetched data from MongoDB")
-            self.split_data_as_train_test(dataframe)
+            train_set, test_set = self.split_data_as_train_test(dataframe)
             logging.info("Performed train test split on the dataset")
             logging.info(
                 "Exited initiate_data_ingestion method of Data_Ingestion class"
             )
 
             data_ingestion_artifact = DataIngestionArtifact(trained_file_path=self.data_ingestion_config.training_file_path, test_file_path=self.data_ingestion_config.testing_file_path)
+            if self.data_ingestion_config.in_memory_handoff:
+                data_ingestion_artifact.train_df, data_ingestion_artifact.test_df = train_set, test_set
             logging.info(f"Data ingestion artifact: {data_ingestion_artifact}")
             return data_ingestion_artifact
         except Exception as e:
@@ -1,17 +1,40 @@
+import os
 import sys
+from dataclasses import dataclass
+from typing import Optional, Tuple
 import numpy as np
 import pandas as pd
-from imblearn.combine import SMOTEENN
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
 from sklearn.compose import ColumnTransformer
+from sklearn.model_selection import train_test_split
 
-from src.constants import TARGET_COLUMN, SCHEMA_FILE_PATH, CURRENT_YEAR
+from src.constants import TARGET_COLUMN, SCHEMA_FILE_PATH, CURRENT_YEAR, MODEL_TRAINER_TRAINING_ROWS_NAME
 from src.entity.config_entity import DataTransformationConfig
 from src.entity.artifact_entity import DataTransformationArtifact, DataValidationArtifact, DataIngestionArtifact
+from src.entity.feature_engineering import VehicleFeatureEngineer
+from src.entity.model_search import ModelSearch, read_model_config
+from src.entity.resampling import StratifiedSMOTEENN
 from src.exception import MyException
 from src.logger import logging
-from src.utils.main_utils import save_object, save_numpy_array_data, read_yaml_file
+from src.utils.main_utils import (save_object, load_object, save_numpy_array_data, read_yaml_file, load_dataframe,
+                                  apply_schema_dtypes, write_artifact_async, get_row_hashes)
+from src.utils.profiling import profile_span
+
+@dataclass
+class PreparedTransformation:
+    preprocessor: Pipeline
+    # Features, target and resampling strata of the transformed training rows, not resampled yet
+    train: tuple
+    test_df: pd.DataFrame
+    training_row_hashes: np.ndarray
+    incremental: bool = False
+    # Incremental runs: transformed rows of the previous model, for the full refit comparison
+    history: Optional[tuple] = None
+    # Transformed training rows held out for the model search, never resampled
+    validation: Optional[np.ndarray] = None
+
 
 class DataTransformation:
     def __init__(self, data_ingestion_artifact: DataIngestionArtifact,
@@ -26,24 +49,44 @@ class DataTransformation:
             raise MyException(e,sys)
     
     @staticmethod
-    def read_data(file_path) -> pd.DataFrame:
+    def read_data(file_path, columns: Optional[list] = None) -> pd.DataFrame:
         try:
-            return pd.read_csv(file_path)
+            return load_dataframe(file_path, columns=columns)
         except Exception as e:
             raise MyException(e, sys)
+
+    def _load_split(self, dataframe: Optional[pd.DataFrame], file_path: str) -> pd.DataFrame:
+        """
+        Returns the required columns of a split, from the DataFrame handed over in memory when present
+        and from its file otherwise
+        """
+        required_columns = self._get_required_columns()
+        if dataframe is not None:
+            return dataframe[[column for column in dataframe.columns if column in required_columns]]
+        return apply_schema_dtypes(self.read_data(file_path=file_path, columns=required_columns), self._schema_config)
+
+    def _get_required_columns(self) -> list:
+        """
+        Returns the schema columns used by the transformation, so the dropped columns are never read
+        """
+        drop_col = self._schema_config["drop_columns"]
+        return [name for column in self._schema_config["columns"] for name in column if name != drop_col]
         
     def get_data_transformer_object(self) -> Pipeline:
         """
         Creates and returns a data transformer object that performs gender mapping, 
         dummy variable creation, column renaming, feature scaling, and type adjustments.
+        The feature engineering is fused into one step with an output layout fixed at fit time,
+        so the same pipeline is applied to raw training, test and inference data.
         """
         logging.info("Entered get_data_transformer_object method of DataTransformation class")
 
         try:
             # Initialize transformers
+            feature_engineer = VehicleFeatureEngineer.from_schema(self._schema_config)
             numeric_transformer = StandardScaler()
             min_max_scaler = MinMaxScaler()
-            logging.info("Transformers Initialized: StandardScaler-MinMaxScaler")
+            logging.info("Transformers Initialized: VehicleFeatureEngineer-StandardScaler-MinMaxScaler")
 
             # Loads schema configurations
             num_features = self._schema_config["num_features"]
@@ -61,7 +104,7 @@ class DataTransformation:
             )
 
             # Wrapping everything in a single pipeline            
-            final_pipeline = Pipeline(steps=[("preprocessor", preprocessor)])
+            final_pipeline = Pipeline(steps=[("feature_engineering", feature_engineer), ("preprocessor", preprocessor)])
 
             logging.info("Final Pipeline is ready!")
             logging.info("Exited get_data_transformer_object method of DataTransformation class")
@@ -71,51 +114,104 @@ class DataTransformation:
             logging.exception("Exception occurred in get_data_transformer_object method of DataTransformation class")
             raise MyException(e, sys) from e
 
-    def _map_gender_column(self, df):
+    def get_resampler(self) -> StratifiedSMOTEENN:
         """
-        Mapping the Gender column: 0 for Female and 1 for Male
+        Creates the SMOTEENN resampler configured by the data transformation config
         """
-        logging.info("Mapping 'Gender' column to binary values")
-        df['Gender'] = df['Gender'].map({'Female': 0, 'Male': 1})
-        return df
+        config = self.data_transformation_config
+        return StratifiedSMOTEENN(n_jobs=config.resampling_n_jobs, algorithm=config.resampling_algorithm,
+                                  dtype=config.resampling_dtype, min_stratum_rows=config.resampling_min_stratum_rows,
+                                  random_state=config.resampling_random_state)
 
-    def _create_dummy_columns(self, df):
+    def _get_strata(self, input_feature_df: pd.DataFrame) -> Optional[np.ndarray]:
         """
-        Creates dummy variables for categorical features
+        Returns the stratum of every row for the resampling, None when the rows are resampled all at once
         """
-        logging.info("Creating dummy variables for the categorical features")
-        df = pd.get_dummies(df, drop_first=True)
-        return df
-    
-    def _rename_columns(self, df):
+        stratify_column = self.data_transformation_config.resampling_stratify_column
+        if stratify_column is None:
+            return None
+        return input_feature_df[stratify_column].to_numpy()
+
+    def _get_previous_training_state(self) -> Optional[Tuple[Pipeline, np.ndarray]]:
         """
-        Renames specific columns and ensure integer types for dummy columns
+        Returns the preprocessing pipeline and the training row hashes of the model an incremental run warm-starts,
+        None when the run has to train from scratch
         """
-        logging.info("Renaming specific columns and casting to int")
-        df = df.rename(columns={
-            "Vehicle_Age_< 1 Year": "Vehicle_Age_lt_1_Year",
-            "Vehicle_Age_> 2 Years": "Vehicle_Age_gt_2_Years"
-        })
+        previous_model_file_path = self.data_transformation_config.previous_model_file_path
+        if not self.data_transformation_config.incremental_training or previous_model_file_path is None:
+            return None
+        if self.data_validation_artifact.drift_detected:
+            logging.info("Drift detected against the previous model, training from scratch")
+            return None
+        training_rows_file_path = os.path.join(os.path.dirname(previous_model_file_path), MODEL_TRAINER_TRAINING_ROWS_NAME)
+        if not os.path.exists(training_rows_file_path):
+            logging.info(f"{previous_model_file_path} has no training rows file, training from scratch")
+            return None
+        previous_model = load_object(file_path=previous_model_file_path)
+        if not isinstance(previous_model.trained_model_object, (RandomForestClassifier, ExtraTreesClassifier)):
+            logging.info(f"{type(previous_model.trained_model_object).__name__} can not be warm-started, training from scratch")
+            return None
+        logging.info(f"Warm-starting the model {previous_model_file_path}")
+        return previous_model.preprocessing_object, np.load(training_rows_file_path)
 
-        for col in ["Vehicle_Age_lt_1_Year", "Vehicle_Age_gt_2_Years", "Vehicle_Damage_Yes"]:
-            if col in df.columns:
-                df[col] = df[col].astype('int')
+    def _transform(self, preprocessor: Pipeline, dataframe: pd.DataFrame, name: str,
+                   fit: bool = False) -> Tuple[np.ndarray, pd.Series, Optional[np.ndarray]]:
+        """
+        Transforms a split, fitting the preprocessor when fit is set.
+        Returns the features, the target and the resampling strata of the rows.
+        """
+        input_feature_df = dataframe.drop(columns=[TARGET_COLUMN])
+        with profile_span(f"{'fit_transform' if fit else 'transform'} of the {name}", rows=len(input_feature_df)):
+            if fit:
+                input_feature_arr = preprocessor.fit_transform(input_feature_df)
+            else:
+                input_feature_arr = preprocessor.transform(input_feature_df)
+        return input_feature_arr, dataframe[TARGET_COLUMN], self._get_strata(input_feature_df)
 
-        return df
-    
-    def _drop_id_column(self, df):
+    def resample_split(self, transformed: Tuple[np.ndarray, pd.Series, Optional[np.ndarray]], name: str) -> np.ndarray:
         """
-        Drops the 'id' column if it exists
+        Balances a transformed split with SMOTEENN and returns the features with the target in the last column
         """
-        logging.info("Dropping the 'id' column")
-        drop_col = self._schema_config["drop_columns"]
-        if drop_col in df.columns:
-            df = df.drop(drop_col, axis=1)
-        return df
-    
-    def initiate_data_transformation(self) -> DataTransformationArtifact:
+        try:
+            input_feature_arr, target_feature_df, strata = transformed
+            with profile_span(f"SMOTEENN resampling of the {name}", rows=len(input_feature_arr)) as span:
+                input_feature_final, target_feature_final = self.get_resampler().fit_resample(
+                    input_feature_arr, target_feature_df, strata=strata)
+                span["rows_out"] = len(input_feature_final)
+
+            # Targets are stored in the dtype of the resampled features, so the arrays are not upcast
+            return np.column_stack((input_feature_final, target_feature_final.astype(input_feature_final.dtype)))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def transform_and_resample(self, preprocessor: Pipeline, dataframe: pd.DataFrame, name: str) -> np.ndarray:
         """
-        Initiates the data transformation component for the pipeline
+        Transforms a split with the fitted preprocessor and balances it with SMOTEENN
+        """
+        try:
+            return self.resample_split(self._transform(preprocessor, dataframe, name), name)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def split_validation_rows(self, train_df: pd.DataFrame) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+        """
+        Holds out the validation rows of the model search when config/model.yaml compares several candidates.
+        They are split off before the preprocessor is fitted and the rows are resampled, so the candidates
+        are scored on real rows only.
+        """
+        model_search = ModelSearch(read_model_config(self.data_transformation_config.model_config_file_path))
+        if not model_search.validation_fraction:
+            return train_df, None
+        train_df, validation_df = train_test_split(train_df, test_size=model_search.validation_fraction,
+                                                   random_state=model_search.random_state,
+                                                   stratify=train_df[TARGET_COLUMN])
+        logging.info(f"Held out {len(validation_df)} training rows to validate the model search")
+        return train_df, validation_df
+
+    def prepare_data_transformation(self) -> PreparedTransformation:
+        """
+        Loads the splits, fits the preprocessor (or reuses the one of the model an incremental run warm-starts)
+        and transforms the training rows, leaving the resampling and the test split to the next steps
         """
         try:
             logging.info("Data Transformation Started")
@@ -124,74 +220,110 @@ class DataTransformation:
                 raise Exception(self.data_validation_artifact.message)
 
             # Load train and test data
-            train_df = self.read_data(file_path=self.data_ingestion_artifact.trained_file_path)
-            test_df = self.read_data(file_path=self.data_ingestion_artifact.test_file_path)
+            train_df = self._load_split(self.data_ingestion_artifact.train_df, self.data_ingestion_artifact.trained_file_path)
+            test_df = self._load_split(self.data_ingestion_artifact.test_df, self.data_ingestion_artifact.test_file_path)
             logging.info("Train-Test data loaded")
 
-            # X and Y for train data
-            input_feature_train_df = train_df.drop(columns=[TARGET_COLUMN], axis=1)
-            target_feature_train_df = train_df[TARGET_COLUMN]
-
-            # X and Y for test data
-            input_feature_test_df = test_df.drop(columns=[TARGET_COLUMN], axis=1)
-            target_feature_test_df = test_df[TARGET_COLUMN]
-            
-            logging.info("Input and target columns are defined for both the training and testing DataFrames")
-
-            # Apply custom transformations in specified sequence
-            input_feature_train_df = self._map_gender_column(input_feature_train_df)
-            input_feature_train_df = self._drop_id_column(input_feature_train_df)
-            input_feature_train_df = self._create_dummy_columns(input_feature_train_df)
-            input_feature_train_df = self._rename_columns(input_feature_train_df)
-
-            input_feature_test_df = self._map_gender_column(input_feature_test_df)
-            input_feature_test_df = self._drop_id_column(input_feature_test_df)
-            input_feature_test_df = self._create_dummy_columns(input_feature_test_df)
-            input_feature_test_df = self._rename_columns(input_feature_test_df)
-            
-            logging.info("Custom transformations applied to train and test data")
+            train_row_hashes = get_row_hashes(train_df)
+            history = None
+            validation = None
+            previous_training_state = self._get_previous_training_state()
 
             logging.info("Starting data transformation")
-            
-            preprocessor = self.get_data_transformer_object()
-            
-            logging.info("Got the preprocessor object")
-
-
-            logging.info("Initializing transformation for Training-data")
-            input_feature_train_arr = preprocessor.fit_transform(input_feature_train_df)
-            logging.info("Initializing transformation for Testing-data")
-            input_feature_test_arr = preprocessor.transform(input_feature_test_df)
-            logging.info("Transformation done end to end to train-test df")
+            if previous_training_state is not None:
+                # Incremental training: the preprocessor of the previous model is reused and only the training
+                # rows it has not seen are transformed for the new trees
+                preprocessor, previous_row_hashes = previous_training_state
+                seen = np.isin(train_row_hashes, previous_row_hashes)
+                if seen.all():
+                    raise Exception("No new training rows since the previous model")
+                # Test rows the previous model was trained on would flatter the warm-started model
+                test_df = test_df[~np.isin(get_row_hashes(test_df), previous_row_hashes)]
+                logging.info(f"Incremental training on {int((~seen).sum())} new rows, {int(seen.sum())} rows were "
+                             f"seen by the previous model, {len(test_df)} unseen test rows")
 
+                train = self._transform(preprocessor, train_df[~seen], "new training data")
+                if self.data_transformation_config.compare_full_refit and seen.any():
+                    history = self._transform(preprocessor, train_df[seen], "training data of the previous model")
+                training_row_hashes = np.union1d(previous_row_hashes, train_row_hashes)
+            else:
+                train_df, validation_df = self.split_validation_rows(train_df)
+                preprocessor = self.get_data_transformer_object()
+                logging.info("Got the preprocessor object")
+                train = self._transform(preprocessor, train_df, "training data", fit=True)
+                if validation_df is not None:
+                    validation_feature_arr, validation_target, _ = self._transform(preprocessor, validation_df,
+                                                                                   "validation data")
+                    validation = np.column_stack((validation_feature_arr,
+                                                  validation_target.to_numpy().astype(validation_feature_arr.dtype)))
+                    train_row_hashes = get_row_hashes(train_df)
+                training_row_hashes = np.unique(train_row_hashes)
 
-            logging.info("Applying SMOTEENN for handling imbalanced dataset")
-            smt = SMOTEENN(sampling_strategy="minority")
-            
-            input_feature_train_final, target_feature_train_final = smt.fit_resample(
-                input_feature_train_arr, target_feature_train_df)
+            return PreparedTransformation(preprocessor=preprocessor, train=train, test_df=test_df, history=history,
+                                          validation=validation, training_row_hashes=training_row_hashes,
+                                          incremental=previous_training_state is not None)
+        except Exception as e:
+            raise MyException(e, sys) from e
 
-            input_feature_test_final, target_feature_test_final = smt.fit_resample(
-                input_feature_test_arr, target_feature_test_df
+    def complete_data_transformation(self, prepared: PreparedTransformation, train_arr: np.ndarray, test_arr: np.ndarray,
+                                     history_train_arr: Optional[np.ndarray] = None) -> DataTransformationArtifact:
+        """
+        Saves the fitted preprocessor and the resampled splits and returns the data transformation artifact
+        """
+        try:
+            preprocessor = prepared.preprocessor
+            data_transformation_artifact = DataTransformationArtifact(
+                transformed_object_file_path=self.data_transformation_config.transformed_object_file_path,
+                transformed_train_file_path=self.data_transformation_config.transformed_train_file_path,
+                transformed_test_file_path=self.data_transformation_config.transformed_test_file_path
             )
-            logging.info("SMOTEENN applied to train-test DataFrames")
-
-            train_arr = np.c_[input_feature_train_final, np.array(target_feature_train_final)]
-            test_arr = np.c_[input_feature_test_final, np.array(target_feature_test_final)]
-            logging.info("feature-target concatenation done for train-test DataFrames")
 
-            save_object(self.data_transformation_config.transformed_object_file_path, preprocessor)
-            save_numpy_array_data(self.data_transformation_config.transformed_train_file_path, array=train_arr)
-            save_numpy_array_data(self.data_transformation_config.transformed_test_file_path, array=test_arr)
+            if self.data_transformation_config.in_memory_handoff:
+                # The model trainer uses the in-memory objects, the files are written in the background
+                write_artifact_async(save_object, self.data_transformation_config.transformed_object_file_path, preprocessor)
+                write_artifact_async(save_numpy_array_data, self.data_transformation_config.transformed_train_file_path, array=train_arr)
+                write_artifact_async(save_numpy_array_data, self.data_transformation_config.transformed_test_file_path, array=test_arr)
+                data_transformation_artifact.train_arr = train_arr
+                data_transformation_artifact.test_arr = test_arr
+                data_transformation_artifact.preprocessing_object = preprocessor
+                data_transformation_artifact.validation_arr = prepared.validation
+            else:
+                save_object(self.data_transformation_config.transformed_object_file_path, preprocessor)
+                save_numpy_array_data(self.data_transformation_config.transformed_train_file_path, array=train_arr)
+                save_numpy_array_data(self.data_transformation_config.transformed_test_file_path, array=test_arr)
+            if prepared.validation is not None:
+                data_transformation_artifact.transformed_validation_file_path = \
+                    self.data_transformation_config.transformed_validation_file_path
+                if self.data_transformation_config.in_memory_handoff:
+                    write_artifact_async(save_numpy_array_data, data_transformation_artifact.transformed_validation_file_path,
+                                         array=prepared.validation)
+                else:
+                    save_numpy_array_data(data_transformation_artifact.transformed_validation_file_path,
+                                          array=prepared.validation)
             logging.info("Saving transformation object and transformed files")
+            data_transformation_artifact.training_row_hashes = prepared.training_row_hashes
+            data_transformation_artifact.incremental = prepared.incremental
+            data_transformation_artifact.history_train_arr = history_train_arr
 
             logging.info("Data transformation completed successfully")
             
-            return DataTransformationArtifact(
-                transformed_object_file_path=self.data_transformation_config.transformed_object_file_path,
-                transformed_train_file_path=self.data_transformation_config.transformed_train_file_path,
-                transformed_test_file_path=self.data_transformation_config.transformed_test_file_path
-            )
+            return data_transformation_artifact
         
         except Exception as e:
-            raise MyException(e, sys) from e
\ No newline at end of file
+            raise MyException(e, sys) from e
+
+    def initiate_data_transformation(self) -> DataTransformationArtifact:
+        """
+        Initiates the data transformation component for the pipeline
+        """
+        try:
+            prepared = self.prepare_data_transformation()
+            train_arr = self.resample_split(prepared.train, "training data")
+            history_train_arr = None
+            if prepared.history is not None:
+                history_train_arr = self.resample_split(prepared.history, "training data of the previous model")
+            test_arr = self.transform_and_resample(prepared.preprocessor, prepared.test_df, "testing data")
+            logging.info("Transformation and SMOTEENN done end to end to train-test df")
+            return self.complete_data_transformation(prepared, train_arr, test_arr, history_train_arr)
+        except Exception as e:
+            raise MyException(e, sys) from e
@@ -1,14 +1,15 @@
-import json
 import sys
 import os
-import pandas as pd
+from typing import Tuple
 from pandas import DataFrame
 
 from src.exception import MyException
 from src.logger import logging
-from src.utils.main_utils import read_yaml_file
+from src.utils.main_utils import read_yaml_file, write_yaml_file, load_dataframe
 from src.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
 from src.entity.config_entity import DataValidationConfig
+from src.entity.schema_validator import SchemaValidator
+from src.entity.drift_sketch import ReferenceSketch
 from src.constants import SCHEMA_FILE_PATH
 
 class DataValidation:
@@ -75,60 +76,104 @@ class DataValidation:
     @staticmethod
     def read_data(file_path) -> DataFrame:
         try:
-            return pd.read_csv(file_path)
+            return load_dataframe(file_path)
         except Exception as e:
             raise MyException(e, sys)
     
-    def initiate_data_validation(self) -> DataValidationArtifact:
+    def detect_drift(self, train_df: DataFrame, test_df: DataFrame) -> dict:
         """
-        Method Name :   initiate_data_validation
-        Description :   This method initiates the data validation component for the pipeline
-        
-        Output      :   Returns bool value based on validation results
+        Method Name :   detect_drift
+        Description :   This method sketches the training data, saves the sketch as the drift reference and scores
+                        the test data against it. When a baseline sketch of a previous model is configured, the
+                        training data is scored against that baseline as well.
+
+        Output      :   Returns the drift reports keyed by the scored batch
         On Failure  :   Write an exception log and then raise an exception
         """
+        try:
+            thresholds = {"psi_threshold": self.data_validation_config.drift_psi_threshold,
+                          "ks_threshold": self.data_validation_config.drift_ks_threshold}
+            reference_sketch = ReferenceSketch.from_schema(self._schema_config).update(train_df)
+            reference_sketch.save(self.data_validation_config.drift_reference_file_path)
+            drift_report = {"test": reference_sketch.score(test_df, **thresholds)}
+
+            baseline_file_path = self.data_validation_config.baseline_drift_reference_file_path
+            if baseline_file_path is not None and os.path.exists(baseline_file_path):
+                drift_report["baseline"] = ReferenceSketch.load(baseline_file_path).compare(reference_sketch, **thresholds)
+            return drift_report
+        except Exception as e:
+            raise MyException(e, sys) from e
 
+    def load_split(self, split: str) -> DataFrame:
+        """
+        Returns the "train" or "test" split, the DataFrame handed over in memory by data ingestion when present
+        and its file otherwise
+        """
         try:
-            validation_error_msg = ""
-            logging.info("Data Validation Started")
-            
-            # Reading the train and test DataFrames from the specified file paths 
-            train_df, test_df = (DataValidation.read_data(file_path=self.data_ingestion_artifact.trained_file_path),
-                                 DataValidation.read_data(file_path=self.data_ingestion_artifact.test_file_path))
+            if split == "train":
+                dataframe, file_path = self.data_ingestion_artifact.train_df, self.data_ingestion_artifact.trained_file_path
+            else:
+                dataframe, file_path = self.data_ingestion_artifact.test_df, self.data_ingestion_artifact.test_file_path
+            return DataValidation.read_data(file_path=file_path) if dataframe is None else dataframe
+        except Exception as e:
+            raise MyException(e, sys) from e
 
-            
-            # Checking column length of DataFrame for the train DataFrame
-            status = self.validate_number_of_columns(dataframe=train_df)
+    def validate_split(self, dataframe: DataFrame, split_name: str) -> Tuple[str, dict]:
+        """
+        Method Name :   validate_split
+        Description :   This method checks the columns, dtypes, allowed categories, numeric bounds and null ratios
+                        of one split. Splits are independent, so they can be validated concurrently.
 
-            if not status:
-                validation_error_msg += "Mismatch in the number of columns: Some required columns are missing in the training DataFrame"
-            else:
-                logging.info("All required columns are present in the training DataFrame")
-            
-            
-            # Checking column length of DataFrame for the test DataFrame
-            status = self.validate_number_of_columns(dataframe=test_df)
+        Output      :   Returns the validation error message, empty when the checks pass, and the schema report
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            validation_error_msg = ""
 
+            # Checking column length of the DataFrame
+            status = self.validate_number_of_columns(dataframe=dataframe)
             if not status:
-                validation_error_msg += "Mismatch in the number of columns: Some required columns are missing in the test DataFrame"
+                validation_error_msg += f"Mismatch in the number of columns: Some required columns are missing in the {split_name} DataFrame"
             else:
-                logging.info("All required columns are present in the test DataFrame")
-            
-            
-            # Validating the existence of required columns in the training DataFrame
-            status = self.is_column_exist(df=train_df)
+                logging.info(f"All required columns are present in the {split_name} DataFrame")
+
+            # Validating the existence of required columns in the DataFrame
+            status = self.is_column_exist(df=dataframe)
             if not status:
-                validation_error_msg += "Columns are missing in the training DataFrame."
+                validation_error_msg += f"Columns are missing in the {split_name} DataFrame."
             else:
-                logging.info(f"All required categorical and numerical columns are present in the training DataFrame: {status}")
+                logging.info(f"All required categorical and numerical columns are present in the {split_name} DataFrame: {status}")
 
-            
-            # Validating the existence of required columns in the test DataFrame
-            status = self.is_column_exist(df=test_df)
-            if not status:
-                validation_error_msg += "Columns are missing in the test DataFrame."
+            # Checking dtypes, allowed categories, numeric bounds and null ratios in one vectorized pass
+            report = SchemaValidator(schema_config=self._schema_config).validate(dataframe)
+            if not report["validation_status"]:
+                validation_error_msg += f"Schema checks failed for the {split_name} DataFrame: {'; '.join(report['errors'])}. "
             else:
-                logging.info(f"All required categorical and numerical columns are present in the test DataFrame: {status}")
+                logging.info(f"Schema checks passed for the {split_name} DataFrame")
+            return validation_error_msg, report
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def complete_data_validation(self, train_df: DataFrame, test_df: DataFrame,
+                                 train_result: Tuple[str, dict], test_result: Tuple[str, dict]) -> DataValidationArtifact:
+        """
+        Method Name :   complete_data_validation
+        Description :   This method detects drift on the splits that passed validate_split and saves the report
+
+        Output      :   Returns the data validation artifact
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            (train_error_msg, train_report), (test_error_msg, test_report) = train_result, test_result
+            validation_error_msg = train_error_msg + test_error_msg
+
+            # Drift detection needs the schema columns, so it only runs on DataFrames that passed the checks above
+            drift_report = self.detect_drift(train_df, test_df) if not validation_error_msg else {}
+            drift_detected = any(report["drift_detected"] for report in drift_report.values())
+            if drift_detected:
+                logging.warning(f"Data drift detected: { {name: report['drifted_columns'] for name, report in drift_report.items()} }")
+                if self.data_validation_config.fail_on_drift:
+                    validation_error_msg += "Data drift detected in the training data. "
 
             # Indicates whether validation has passed or failed
             validation_status = len(validation_error_msg) == 0
@@ -137,26 +182,41 @@ class DataValidation:
             data_validation_artifact = DataValidationArtifact(
                 validation_status=validation_status,
                 message=validation_error_msg,
-                validation_report_file_path=self.data_validation_config.validation_report_file_path
+                validation_report_file_path=self.data_validation_config.validation_report_file_path,
+                drift_reference_file_path=self.data_validation_config.drift_reference_file_path if drift_report else None,
+                drift_detected=drift_detected
             )
 
-            # Ensure that the directory for validation_report_file_path exists
-            report_dir = os.path.dirname(self.data_validation_config.validation_report_file_path)
-            os.makedirs(report_dir, exist_ok=True)
-
             validation_report = {
                 "validation_status": validation_status,
-                "message": validation_error_msg.strip()
+                "message": validation_error_msg.strip(),
+                "train": train_report,
+                "test": test_report,
+                "drift": drift_report
             }
+            write_yaml_file(self.data_validation_config.validation_report_file_path, validation_report)
 
-            with open(self.data_validation_config.validation_report_file_path, "w") as report_file:
-                json.dump(validation_report, report_file, indent=4)
-
-            logging.info("Data validation artifact created and saved to the JSON file")
+            logging.info("Data validation artifact created and saved to the YAML report")
             logging.info(f"Data validation artifact: {data_validation_artifact}")
             
             return data_validation_artifact
         except Exception as e:
             raise MyException(e, sys) from e
 
+    def initiate_data_validation(self) -> DataValidationArtifact:
+        """
+        Method Name :   initiate_data_validation
+        Description :   This method initiates the data validation component for the pipeline
+        
+        Output      :   Returns bool value based on validation results
+        On Failure  :   Write an exception log and then raise an exception
+        """
 
+        try:
+            logging.info("Data Validation Started")
+            train_df, test_df = self.load_split("train"), self.load_split("test")
+            return self.complete_data_validation(train_df, test_df,
+                                                 train_result=self.validate_split(train_df, "training"),
+                                                 test_result=self.validate_split(test_df, "test"))
+        except Exception as e:
+            raise MyException(e, sys) from e
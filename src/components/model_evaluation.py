@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from src.cloud_storage.local_storage import LocalStorageService
+from src.constants import SCHEMA_FILE_PATH, TARGET_COLUMN
+from src.entity.artifact_entity import ModelTrainerArtifact, ModelEvaluationArtifact, DataIngestionArtifact
+from src.entity.classification_metrics import ClassificationMetricsAccumulator
+from src.entity.config_entity import ModelEvaluationConfig
+from src.entity.packed_model import load_model_file
+from src.entity.s3_estimator import Proj1Estimator
+from src.exception import MyException
+from src.logger import logging
+from src.utils.main_utils import load_dataframe, apply_schema_dtypes, read_yaml_file, get_file_digest, write_yaml_file
+from src.utils.profiling import profile_span
+
+@dataclass
+class EvaluateModelResponse:
+    trained_model_metrics: dict
+    best_model_metrics: Optional[dict]
+    is_model_accepted: bool
+    difference: float
+
+
+class ModelEvaluation:
+
+    def __init__(self, model_eval_config: ModelEvaluationConfig, data_ingestion_artifact: DataIngestionArtifact,
+                 model_trainer_artifact: ModelTrainerArtifact):
+        """
+        :param model_eval_config: Configuration for model evaluation
+        :param data_ingestion_artifact: Output reference of data ingestion artifact stage, its test split is the holdout
+        :param model_trainer_artifact: Output reference of model trainer artifact stage
+        """
+        try:
+            self.model_eval_config = model_eval_config
+            self.data_ingestion_artifact = data_ingestion_artifact
+            self.model_trainer_artifact = model_trainer_artifact
+            self._schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def get_best_model(self) -> Optional[Proj1Estimator]:
+        """
+        Method Name :   get_best_model
+        Description :   This function is used to get the model in production, from S3 or from the local
+                        directory standing in for it
+
+        Output      :   Returns the estimator of the production model, None when there is no model in production
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            bucket_name = self.model_eval_config.bucket_name
+            model_path = self.model_eval_config.s3_model_key_path
+            storage = None
+            if self.model_eval_config.local_registry_dir:
+                storage = LocalStorageService(root_dir=self.model_eval_config.local_registry_dir)
+            proj1_estimator = Proj1Estimator(bucket_name=bucket_name, model_path=model_path, storage=storage)
+
+            if proj1_estimator.is_model_present(model_path=model_path):
+                return proj1_estimator
+            return None
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def _prune_holdout_cache(self) -> None:
+        """
+        Removes the least recently used holdout files beyond holdout_cache_max_files
+        """
+        cache_dir = self.model_eval_config.holdout_cache_dir
+        files = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".npy")]
+        for file_path in sorted(files, key=os.path.getmtime)[:-self.model_eval_config.holdout_cache_max_files]:
+            os.remove(file_path)
+            logging.info(f"Removed cached holdout {file_path}")
+
+    def get_holdout(self, feature_engineering) -> np.ndarray:
+        """
+        Returns the holdout as a read-only memory-mapped array of engineered features with the target in the last
+        column. The array is built once per holdout file and feature engineering step and reused by later calls
+        and runs; the features are written chunk by chunk, so only the raw holdout is held in memory.
+        """
+        try:
+            holdout_file_path = self.data_ingestion_artifact.test_file_path
+            key = hashlib.sha256(json.dumps({"holdout": get_file_digest(holdout_file_path),
+                                             "feature_engineering": feature_engineering.to_dict()},
+                                            sort_keys=True, default=str).encode()).hexdigest()
+            cache_file_path = os.path.join(self.model_eval_config.holdout_cache_dir, f"{key[:32]}.npy")
+
+            if os.path.exists(cache_file_path):
+                logging.info(f"Using the cached holdout {cache_file_path}")
+                os.utime(cache_file_path)
+                return np.load(cache_file_path, mmap_mode="r")
+
+            columns = list(feature_engineering.feature_names_in_) + [TARGET_COLUMN]
+            dataframe = apply_schema_dtypes(load_dataframe(holdout_file_path, columns=columns), self._schema_config)
+            n_features = len(feature_engineering.feature_names_out_)
+            os.makedirs(self.model_eval_config.holdout_cache_dir, exist_ok=True)
+            temporary_file_path = f"{cache_file_path}.{os.getpid()}.tmp"
+            with profile_span("holdout preprocessing", rows=len(dataframe)):
+                holdout = np.lib.format.open_memmap(temporary_file_path, mode="w+", dtype=feature_engineering.dtype,
+                                                    shape=(len(dataframe), n_features + 1))
+                for start in range(0, len(dataframe), self.model_eval_config.chunk_rows):
+                    chunk = dataframe.iloc[start:start + self.model_eval_config.chunk_rows]
+                    holdout[start:start + len(chunk), :-1] = feature_engineering.transform(chunk).to_numpy()
+                    holdout[start:start + len(chunk), -1] = chunk[TARGET_COLUMN].to_numpy()
+                holdout.flush()
+                del holdout
+            os.replace(temporary_file_path, cache_file_path)
+            self._prune_holdout_cache()
+            logging.info(f"Cached the engineered holdout of {len(dataframe)} rows to {cache_file_path}")
+            return np.load(cache_file_path, mmap_mode="r")
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def score_model(self, model, holdout: np.ndarray, name: str) -> dict:
+        """
+        Returns the F1, precision, recall and ROC AUC of a model on the holdout, scored chunk by chunk
+        """
+        try:
+            with profile_span(f"scoring of the {name} model", rows=len(holdout)):
+                accumulator = ClassificationMetricsAccumulator(bins=self.model_eval_config.auc_bins)
+                classes = np.asarray(model.classes)
+                positive_column = int(np.flatnonzero(classes == accumulator.positive_label)[0])
+                for start in range(0, len(holdout), self.model_eval_config.chunk_rows):
+                    chunk = holdout[start:start + self.model_eval_config.chunk_rows]
+                    proba = model.predict_proba_array(chunk[:, :-1])
+                    accumulator.update(chunk[:, -1], classes.take(np.argmax(proba, axis=1)), proba[:, positive_column])
+                metrics = accumulator.result()
+            logging.info(f"Metrics of the {name} model on the holdout: {metrics}")
+            return metrics
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def evaluate_model(self) -> EvaluateModelResponse:
+        """
+        Method Name :   evaluate_model
+        Description :   This function scores the trained model and the production model on the same holdout,
+                        both at the same time
+
+        Output      :   Returns the metrics of both models and whether the trained model is accepted
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            trained_model = load_model_file(file_path=self.model_trainer_artifact.packed_model_file_path
+                                            or self.model_trainer_artifact.trained_model_file_path)
+            models = {"trained": trained_model}
+            best_model = self.get_best_model()
+            if best_model is not None:
+                logging.info(f"Evaluating against the production model s3://{best_model.bucket_name}/{best_model.model_path}")
+                models["production"] = best_model.load_model()
+            else:
+                logging.info("No model in production, the trained model is accepted")
+
+            # Models with the same feature engineering share the holdout features
+            holdouts = {}
+            for model in models.values():
+                layout = json.dumps(model.feature_engineering.to_dict(), sort_keys=True, default=str)
+                if layout not in holdouts:
+                    holdouts[layout] = self.get_holdout(model.feature_engineering)
+
+            def score(name: str) -> dict:
+                model = models[name]
+                layout = json.dumps(model.feature_engineering.to_dict(), sort_keys=True, default=str)
+                return self.score_model(model, holdouts[layout], name)
+
+            with ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="model-evaluation") as executor:
+                metrics = dict(zip(models, executor.map(score, models)))
+
+            trained_model_f1_score = metrics["trained"]["f1_score"]
+            best_model_metrics = metrics.get("production")
+            tmp_best_model_score = 0 if best_model_metrics is None else best_model_metrics["f1_score"]
+            difference = trained_model_f1_score - tmp_best_model_score
+            is_model_accepted = best_model_metrics is None or difference > self.model_eval_config.changed_threshold_score
+            result = EvaluateModelResponse(trained_model_metrics=metrics["trained"],
+                                           best_model_metrics=best_model_metrics,
+                                           is_model_accepted=is_model_accepted,
+                                           difference=difference)
+            logging.info(f"Result: {result}")
+            return result
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def initiate_model_evaluation(self) -> ModelEvaluationArtifact:
+        """
+        Method Name :   initiate_model_evaluation
+        Description :   This function is used to initiate all steps of the model evaluation
+
+        Output      :   Returns model evaluation artifact
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            logging.info("Initialized Model Evaluation Component.")
+            evaluate_model_response = self.evaluate_model()
+            s3_model_path = self.model_eval_config.s3_model_key_path
+
+            write_yaml_file(self.model_eval_config.report_file_path, {
+                "is_model_accepted": evaluate_model_response.is_model_accepted,
+                "changed_accuracy": evaluate_model_response.difference,
+                "changed_threshold_score": self.model_eval_config.changed_threshold_score,
+                "holdout_file_path": self.data_ingestion_artifact.test_file_path,
+                "trained_model": evaluate_model_response.trained_model_metrics,
+                "production_model": evaluate_model_response.best_model_metrics}, replace=True)
+
+            model_evaluation_artifact = ModelEvaluationArtifact(
+                is_model_accepted=evaluate_model_response.is_model_accepted,
+                changed_accuracy=evaluate_model_response.difference,
+                s3_model_path=s3_model_path,
+                trained_model_path=self.model_trainer_artifact.trained_model_file_path,
+                report_file_path=self.model_eval_config.report_file_path)
+
+            logging.info(f"Model evaluation artifact: {model_evaluation_artifact}")
+            return model_evaluation_artifact
+        except Exception as e:
+            raise MyException(e, sys) from e
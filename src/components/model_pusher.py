@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+from src.cloud_storage.local_storage import LocalStorageService
+from src.entity.artifact_entity import (ModelPusherArtifact, ModelEvaluationArtifact, ModelTrainerArtifact,
+                                        DataTransformationArtifact)
+from src.entity.config_entity import ModelPusherConfig
+from src.exception import MyException
+from src.logger import logging
+from src.utils.main_utils import get_file_digest
+from src.utils.profiling import profile_span
+
+
+class ModelPusher:
+    def __init__(self, model_evaluation_artifact: ModelEvaluationArtifact, model_pusher_config: ModelPusherConfig,
+                 model_trainer_artifact: Optional[ModelTrainerArtifact] = None,
+                 data_transformation_artifact: Optional[DataTransformationArtifact] = None):
+        """
+        :param model_evaluation_artifact: Output reference of model evaluation artifact stage
+        :param model_pusher_config: Configuration for model pusher
+        :param model_trainer_artifact: Output reference of model trainer artifact stage, its packed model is pushed
+        :param data_transformation_artifact: Output reference of data transformation artifact stage, its
+                                             preprocessing object is pushed
+        """
+        try:
+            self.model_evaluation_artifact = model_evaluation_artifact
+            self.model_pusher_config = model_pusher_config
+            self.model_trainer_artifact = model_trainer_artifact
+            self.data_transformation_artifact = data_transformation_artifact
+            if model_pusher_config.local_registry_dir:
+                self.s3 = LocalStorageService(root_dir=model_pusher_config.local_registry_dir)
+            else:
+                from src.cloud_storage.aws_storage import SimpleStorageService
+                self.s3 = SimpleStorageService()
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def push_file(self, file_path: str, s3_key: str) -> dict:
+        """
+        Uploads a file to the key unless the object of the key already has the same sha256, recorded in its
+        metadata by the previous push
+        :return: manifest entry of the object: its key, sha256, size, version and whether it was uploaded
+        """
+        try:
+            bucket_name = self.model_pusher_config.bucket_name
+            digest = get_file_digest(file_path)
+            size = os.path.getsize(file_path)
+            object_metadata = self.s3.get_object_metadata(bucket_name, s3_key)
+            if object_metadata is not None and object_metadata["metadata"].get("sha256") == digest:
+                logging.info(f"s3://{bucket_name}/{s3_key} already holds {file_path}, the upload is skipped")
+                return {"key": s3_key, "sha256": digest, "size": size, "version": object_metadata["version"],
+                        "uploaded": False}
+
+            with profile_span("model_push_upload", bytes=size, file=os.path.basename(file_path)):
+                version = self.s3.upload_file_multipart(file_path, bucket_name=bucket_name, s3_key=s3_key,
+                                                        part_size=self.model_pusher_config.part_size,
+                                                        workers=self.model_pusher_config.workers,
+                                                        metadata={"sha256": digest})
+            return {"key": s3_key, "sha256": digest, "size": size, "version": version, "uploaded": True}
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def get_files_to_push(self) -> dict:
+        """
+        Returns the local files of the model mapped to their key in the bucket
+        """
+        files = {self.model_pusher_config.s3_model_key_path: self.model_evaluation_artifact.trained_model_path}
+        if self.model_trainer_artifact is not None and self.model_trainer_artifact.packed_model_file_path:
+            files[self.model_pusher_config.s3_packed_model_key_path] = self.model_trainer_artifact.packed_model_file_path
+        if self.data_transformation_artifact is not None:
+            files[self.model_pusher_config.s3_preprocessing_key_path] = \
+                self.data_transformation_artifact.transformed_object_file_path
+        return files
+
+    def initiate_model_pusher(self) -> ModelPusherArtifact:
+        """
+        Method Name :   initiate_model_pusher
+        Description :   This method pushes the model files to the bucket, then writes the manifest listing the
+                        version of every object. The manifest is written last, so serving processes polling it
+                        only switch once every file of the push is in place.
+
+        Output      :   Returns model pusher artifact
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        logging.info("Entered initiate_model_pusher method of ModelPusher class")
+
+        try:
+            bucket_name = self.model_pusher_config.bucket_name
+            logging.info(f"Uploading the model files to s3://{bucket_name}")
+            objects = {s3_key: self.push_file(file_path, s3_key) for s3_key, file_path in self.get_files_to_push().items()}
+
+            manifest = {"pushed_at": datetime.now(timezone.utc).isoformat(),
+                        "model_key": self.model_pusher_config.s3_model_key_path,
+                        "changed_accuracy": self.model_evaluation_artifact.changed_accuracy,
+                        "objects": objects}
+            self.s3.upload_bytes(json.dumps(manifest, indent=4).encode(), bucket_name=bucket_name,
+                                 s3_key=self.model_pusher_config.s3_manifest_key_path)
+            uploaded_bytes = sum(entry["size"] for entry in objects.values() if entry["uploaded"])
+            logging.info(f"Pushed {uploaded_bytes} bytes and the manifest s3://{bucket_name}/"
+                         f"{self.model_pusher_config.s3_manifest_key_path}")
+
+            model_pusher_artifact = ModelPusherArtifact(bucket_name=bucket_name,
+                                                        s3_model_path=self.model_pusher_config.s3_model_key_path,
+                                                        manifest_path=self.model_pusher_config.s3_manifest_key_path,
+                                                        uploaded_bytes=uploaded_bytes)
+            logging.info(f"Model pusher artifact: [{model_pusher_artifact}]")
+            logging.info("Exited initiate_model_pusher method of ModelPusher class")
+            return model_pusher_artifact
+        except Exception as e:
+            raise MyException(e, sys) from e
@@ -1,71 +1,189 @@
 import sys
-from typing import Tuple
+import shutil
+import time
+from dataclasses import asdict
+from typing import Optional, Tuple
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
 from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
 
 from src.exception import MyException
 from src.logger import logging
-from src.utils.main_utils import load_numpy_array_data, load_object, save_object
+from src.utils.main_utils import (load_numpy_array_data, save_numpy_array_data, load_object, save_object,
+                                  write_yaml_file)
+from src.utils.profiling import profile_span
 from src.entity.config_entity import ModelTrainerConfig
-from src.entity.artifact_entity import DataTransformationArtifact, ModelTrainerArtifact, ClassificationMetricArtifact
+from src.entity.artifact_entity import (DataTransformationArtifact, DataValidationArtifact, ModelTrainerArtifact,
+                                        ClassificationMetricArtifact)
 from src.entity.estimator import MyModel
+from src.entity.model_search import ModelSearch, read_model_config
+from src.entity.packed_model import save_packed_model
 
 class ModelTrainer:
 
-    def __init__(self, data_transformation_artifact: DataTransformationArtifact, model_trainer_config: ModelTrainerConfig):
+    def __init__(self, data_transformation_artifact: DataTransformationArtifact, model_trainer_config: ModelTrainerConfig,
+                 data_validation_artifact: Optional[DataValidationArtifact] = None):
         """
         :param data_transformation_artifact: Output reference of data transformation artifact stage
         :param model_trainer_config: Configuration for model training
+        :param data_validation_artifact: Output reference of data validation artifact stage, its drift reference
+                                         sketch is saved with the trained model
         """
         self.data_transformation_artifact = data_transformation_artifact
         self.model_trainer_config = model_trainer_config
+        self.data_validation_artifact = data_validation_artifact
+        # Filled by the model search and by incremental training
+        self.leaderboard: Optional[list] = None
+        self.incremental_report: Optional[dict] = None
 
-    def get_model_object_and_report(self, train: np.array, test: np.array) -> Tuple[object, object]:
+    def get_model_object_and_report(self, train: np.array, test: np.array,
+                                    validation: Optional[np.array] = None) -> Tuple[object, object]:
         """
         Method Name :   get_model_object_and_report
-        Description :   This function trains a RandomForestClassifier with specified parameters
+        Description :   This function selects the model with the search of config/model.yaml, scoring the candidates
+                        on the validation rows, or trains a RandomForestClassifier with specified parameters when
+                        no candidates are configured
         
         Output      :   Returns metric artifact object and trained model object
         On Failure  :   Write an exception log and then raise an exception
         """
         try:
-            logging.info("Training RandomForestClassifier with specified parameters")
-
             # Splitting the train and test data into features and target variables
 
             X_train, X_test, y_train, y_test = train[:, :-1], test[:, :-1], train[:, -1], test[:, -1]
             logging.info("Completed Train-Test Split")
 
-            # Initialize RandomForestClassifier with specified parameters
-            model = RandomForestClassifier(
-                n_estimators = self.model_trainer_config._n_estimators,
-                min_samples_split = self.model_trainer_config._min_samples_split,
-                min_samples_leaf = self.model_trainer_config._min_samples_leaf,
-                max_depth = self.model_trainer_config._max_depth,
-                criterion = self.model_trainer_config._criterion,
-                random_state = self.model_trainer_config._random_state
-            )
-
-            # Fit the model
-            logging.info("Model training started...")
-            model.fit(X_train, y_train)
-            logging.info("Model training completed")
-
-            # Predictions and evaluation metrics
-            y_pred = model.predict(X_test)
-            accuracy = accuracy_score(y_test, y_pred)
-            f1 = f1_score(y_test, y_pred)
-            precision = precision_score(y_test, y_pred)
-            recall = recall_score(y_test, y_pred)
-
-            # Creating metric artifact
-            metric_artifact = ClassificationMetricArtifact(f1_score=f1, precision_score=precision, recall_score=recall)
+            model_config = self._read_model_config()
+            if model_config.get("candidates"):
+                logging.info("Searching the model with the candidates of the model config")
+                with profile_span("model_search", rows=len(train)):
+                    search_result = ModelSearch(model_config).search(train, validation)
+                model = search_result.best_model
+                self.leaderboard = search_result.leaderboard
+                logging.info(f"Model search selected {search_result.best_candidate} with validation "
+                             f"score {search_result.best_score}")
+            else:
+                logging.info("Training RandomForestClassifier with specified parameters")
 
-            return model, metric_artifact
+                # Initialize RandomForestClassifier with specified parameters
+                model = RandomForestClassifier(
+                    n_estimators = self.model_trainer_config._n_estimators,
+                    min_samples_split = self.model_trainer_config._min_samples_split,
+                    min_samples_leaf = self.model_trainer_config._min_samples_leaf,
+                    max_depth = self.model_trainer_config._max_depth,
+                    criterion = self.model_trainer_config._criterion,
+                    random_state = self.model_trainer_config._random_state
+                )
+
+                # Fit the model
+                logging.info("Model training started...")
+                with profile_span("model_fit", rows=len(X_train)):
+                    model.fit(X_train, y_train)
+                logging.info("Model training completed")
+
+            return model, self.get_metric_artifact(model, X_test, y_test)
         
         except Exception as e:
             raise MyException(e, sys) from e
+
+    @staticmethod
+    def get_metric_artifact(model: object, X_test: np.array, y_test: np.array) -> ClassificationMetricArtifact:
+        """
+        Returns the classification metrics of a fitted model on the test data
+        """
+        # Predictions and evaluation metrics
+        y_pred = model.predict(X_test)
+        f1 = f1_score(y_test, y_pred)
+        precision = precision_score(y_test, y_pred)
+        recall = recall_score(y_test, y_pred)
+
+        # Creating metric artifact
+        return ClassificationMetricArtifact(f1_score=f1, precision_score=precision, recall_score=recall)
+
+    @staticmethod
+    def _metrics_to_dict(metric_artifact: ClassificationMetricArtifact) -> dict:
+        return {name: round(float(value), 6) for name, value in asdict(metric_artifact).items()}
+
+    def warm_start_forest(self, model: object, X_new: np.array, y_new: np.array) -> object:
+        """
+        Adds incremental_n_estimators trees fitted on the new rows to a fitted forest and retires its oldest trees
+        beyond incremental_max_estimators. The trees already in the forest are kept as they are.
+        """
+        n_previous = len(model.estimators_)
+        model.set_params(warm_start=True, n_estimators=n_previous + self.model_trainer_config.incremental_n_estimators)
+        with profile_span("model_fit", rows=len(X_new), warm_start=True):
+            model.fit(X_new, y_new)
+        # Trees are appended, so the oldest come first
+        model.estimators_ = model.estimators_[-self.model_trainer_config.incremental_max_estimators:]
+        model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+        logging.info(f"Warm-started the forest: {n_previous} trees, {self.model_trainer_config.incremental_n_estimators} "
+                     f"added, {n_previous + self.model_trainer_config.incremental_n_estimators - len(model.estimators_)} retired")
+        return model
+
+    def get_incremental_model_and_report(self, train: np.array, test: np.array,
+                                         history: Optional[np.array] = None) -> Tuple[object, object]:
+        """
+        Method Name :   get_incremental_model_and_report
+        Description :   This function warm-starts the forest of the previous model on the new training rows. When the
+                        training rows of the previous model are given, a forest of the same size is also fitted from
+                        scratch on all the rows and both are compared in the incremental report. New rows without
+                        the classes of the previous model are not warm-started: the full refit is returned when
+                        there is one, the previous model otherwise
+
+        Output      :   Returns metric artifact object and trained model object
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            X_train, X_test, y_train, y_test = train[:, :-1], test[:, :-1], train[:, -1], test[:, -1]
+            previous_model = load_object(file_path=self.model_trainer_config.previous_model_file_path).trained_model_object
+            if not isinstance(previous_model, (RandomForestClassifier, ExtraTreesClassifier)):
+                raise Exception(f"Only forests can be warm-started, the previous model is a {type(previous_model).__name__}")
+
+            self.incremental_report = {"previous_model_file_path": self.model_trainer_config.previous_model_file_path}
+            # A warm-started fit on rows of fewer classes resets classes_ and breaks predict_proba of the forest
+            new_classes = np.unique(y_train)
+            if not np.array_equal(new_classes, previous_model.classes_):
+                reason = (f"the new rows hold the classes {new_classes.tolist()}, "
+                          f"the previous model {previous_model.classes_.tolist()}")
+                logging.info(f"Skipping the warm start: {reason}")
+                self.incremental_report["incremental"] = {"train_rows": len(train), "skipped": reason}
+                model = previous_model
+                metric_artifact = self.get_metric_artifact(model, X_test, y_test)
+            else:
+                start = time.perf_counter()
+                model = self.warm_start_forest(previous_model, X_train, y_train)
+                fit_time = time.perf_counter() - start
+                metric_artifact = self.get_metric_artifact(model, X_test, y_test)
+                self.incremental_report["incremental"] = {"train_rows": len(train), "fit_time_s": round(fit_time, 3),
+                                                          **self._metrics_to_dict(metric_artifact)}
+            self.incremental_report["n_estimators"] = len(model.estimators_)
+
+            if history is not None:
+                full_train = np.vstack((history, train))
+                full_model = clone(model).set_params(warm_start=False, n_estimators=len(model.estimators_))
+                start = time.perf_counter()
+                with profile_span("model_fit", rows=len(full_train), full_refit=True):
+                    full_model.fit(full_train[:, :-1], full_train[:, -1])
+                fit_time = time.perf_counter() - start
+                full_metric_artifact = self.get_metric_artifact(full_model, X_test, y_test)
+                self.incremental_report["full_refit"] = {"train_rows": len(full_train), "fit_time_s": round(fit_time, 3),
+                                                         **self._metrics_to_dict(full_metric_artifact)}
+                # Without a warm start the full refit is the only model trained on the new rows
+                if "skipped" in self.incremental_report["incremental"]:
+                    logging.info("Using the full refit on all the rows instead of the warm-started forest")
+                    model, metric_artifact = full_model, full_metric_artifact
+            logging.info(f"Incremental training report: {self.incremental_report}")
+
+            return model, metric_artifact
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def _read_model_config(self) -> dict:
+        """
+        Returns the content of the model config file, empty when the file is missing or empty
+        """
+        return read_model_config(self.model_trainer_config.model_config_file_path)
         
     def initiate_model_trainer(self) -> ModelTrainerArtifact:
         logging.info("Entered initiate_model_trainer method of ModelTrainer class")
@@ -77,20 +195,33 @@ class ModelTrainer:
         On Failure  :   Write an exception log and then raise an exception
         """
         try:
-            print("------------------------------------------------------------------------------------------------")
-            print("Starting the Model Trainer Component")
+            logging.info("Starting the Model Trainer Component")
             
-            # Loads transformed train and test data
-            train_arr = load_numpy_array_data(file_path=self.data_transformation_artifact.transformed_train_file_path)
-            test_arr = load_numpy_array_data(file_path=self.data_transformation_artifact.transformed_test_file_path)
+            # Uses the transformed train and test data handed over in memory and falls back to the files
+            train_arr, test_arr = self.data_transformation_artifact.train_arr, self.data_transformation_artifact.test_arr
+            if train_arr is None:
+                train_arr = load_numpy_array_data(file_path=self.data_transformation_artifact.transformed_train_file_path)
+            if test_arr is None:
+                test_arr = load_numpy_array_data(file_path=self.data_transformation_artifact.transformed_test_file_path)
             logging.info("train-test data loaded")
 
-            # Train the model and get metrics
-            trained_model, metric_artifact = self.get_model_object_and_report(train=train_arr, test=test_arr)
+            # Train the model and get metrics, warm-starting the previous model on the new rows in incremental runs
+            if self.data_transformation_artifact.incremental:
+                trained_model, metric_artifact = self.get_incremental_model_and_report(
+                    train=train_arr, test=test_arr, history=self.data_transformation_artifact.history_train_arr)
+            else:
+                validation_arr = self.data_transformation_artifact.validation_arr
+                validation_file_path = self.data_transformation_artifact.transformed_validation_file_path
+                if validation_arr is None and validation_file_path is not None:
+                    validation_arr = load_numpy_array_data(file_path=validation_file_path)
+                trained_model, metric_artifact = self.get_model_object_and_report(train=train_arr, test=test_arr,
+                                                                                  validation=validation_arr)
             logging.info("Model object and artifact loaded")
 
             # Load preprocessing object
-            preprocessing_obj = load_object(file_path=self.data_transformation_artifact.transformed_object_file_path)
+            preprocessing_obj = self.data_transformation_artifact.preprocessing_object
+            if preprocessing_obj is None:
+                preprocessing_obj = load_object(file_path=self.data_transformation_artifact.transformed_object_file_path)
             logging.info("Preprocessing obj loaded")
 
             # Check if the model's accuracy meets the expected threshold
@@ -104,8 +235,48 @@ class ModelTrainer:
             save_object(self.model_trainer_config.trained_model_file_path, my_model)
             logging.info("Saved the final model object that includes both preprocessing and the trained model")
 
+            # Memory-mappable copy of the model, loaded by serving workers without unpickling
+            packed_model_file_path = None
+            if self.model_trainer_config.save_packed_model and my_model._get_fast_path()["trees"] is None:
+                logging.info(f"The packed model is not saved, {type(trained_model).__name__} can not be packed")
+            elif self.model_trainer_config.save_packed_model:
+                packed_model_file_path = self.model_trainer_config.packed_model_file_path
+                save_packed_model(packed_model_file_path, my_model)
+                logging.info(f"Saved the packed model to {packed_model_file_path}")
+
+            # Keep the drift reference sketch of the training data next to the model
+            reference_sketch_file_path = None
+            if self.data_validation_artifact is not None and self.data_validation_artifact.drift_reference_file_path:
+                reference_sketch_file_path = self.model_trainer_config.reference_sketch_file_path
+                shutil.copyfile(self.data_validation_artifact.drift_reference_file_path, reference_sketch_file_path)
+                logging.info(f"Saved the drift reference sketch to {reference_sketch_file_path}")
+
+            # Rows the model has been trained on, so the next incremental run only fits trees on new rows
+            training_rows_file_path = None
+            if self.data_transformation_artifact.training_row_hashes is not None:
+                training_rows_file_path = self.model_trainer_config.training_rows_file_path
+                save_numpy_array_data(training_rows_file_path, self.data_transformation_artifact.training_row_hashes)
+
+            incremental_report_file_path = None
+            if self.incremental_report is not None:
+                incremental_report_file_path = self.model_trainer_config.incremental_report_file_path
+                write_yaml_file(incremental_report_file_path, self.incremental_report, replace=True)
+                logging.info(f"Saved the incremental training report to {incremental_report_file_path}")
+
+            leaderboard_file_path = None
+            if self.leaderboard is not None:
+                leaderboard_file_path = self.model_trainer_config.leaderboard_file_path
+                write_yaml_file(leaderboard_file_path, self.leaderboard, replace=True)
+                logging.info(f"Saved the model search leaderboard to {leaderboard_file_path}")
+
             # Create and return the ModelTrainerArtifact
-            model_trainer_artifact = ModelTrainerArtifact(trained_model_file_path=self.model_trainer_config.trained_model_file_path, metric_artifact=metric_artifact)
+            model_trainer_artifact = ModelTrainerArtifact(trained_model_file_path=self.model_trainer_config.trained_model_file_path,
+                                                          metric_artifact=metric_artifact,
+                                                          reference_sketch_file_path=reference_sketch_file_path,
+                                                          packed_model_file_path=packed_model_file_path,
+                                                          leaderboard_file_path=leaderboard_file_path,
+                                                          training_rows_file_path=training_rows_file_path,
+                                                          incremental_report_file_path=incremental_report_file_path)
             logging.info(f"Model trainer artifact: {model_trainer_artifact}")
 
             return model_trainer_artifact
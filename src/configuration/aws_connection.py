@@ -0,0 +1,29 @@
+import boto3
+import os
+from src.constants import AWS_SECRET_ACCESS_KEY_ENV_KEY, AWS_ACCESS_KEY_ID_ENV_KEY, AWS_ENDPOINT_URL_ENV_KEY, REGION_NAME
+
+
+class S3Client:
+
+    s3_client = None
+    s3_resource = None
+
+    def __init__(self, region_name=REGION_NAME):
+        """
+        This Class gets aws credentials from env_variable and creates a connection with s3 bucket.
+        When the credentials are not set, boto3 falls back to its default credential chain (profile, IAM role),
+        and AWS_ENDPOINT_URL points the client to an S3 compatible store such as MinIO or a moto server.
+        """
+        if S3Client.s3_resource is None or S3Client.s3_client is None:
+            session_kwargs = dict(
+                aws_access_key_id=os.getenv(AWS_ACCESS_KEY_ID_ENV_KEY),
+                aws_secret_access_key=os.getenv(AWS_SECRET_ACCESS_KEY_ENV_KEY),
+                region_name=region_name,
+                endpoint_url=os.getenv(AWS_ENDPOINT_URL_ENV_KEY)
+            )
+
+            S3Client.s3_resource = boto3.resource('s3', **session_kwargs)
+            S3Client.s3_client = boto3.client('s3', **session_kwargs)
+
+        self.s3_resource = S3Client.s3_resource
+        self.s3_client = S3Client.s3_client
@@ -1,15 +1,10 @@
 import os
 import sys
-import pymongo
-import certifi
 
 from src.exception import MyException
 from src.logger import logging
 from src.constants import DATABASE_NAME, MONGODB_URL_KEY
 
-# Load the certificate authority file to avoid timeout errors when connecting to MongoDB
-ca = certifi.where()
-
 class MongoDBClient:
     """
     MongoDBClient is responsible for establishing a connection to the MongoDB database.
@@ -51,8 +46,13 @@ class MongoDBClient:
                 if mongo_db_url is None:
                     raise Exception(f"Environment variable '{MONGODB_URL_KEY}' is not set.")
 
-                # Establishes a new MongoDB client connection
-                MongoDBClient.client = pymongo.MongoClient(mongo_db_url, tlsCAFile=ca)
+                # pymongo and certifi are only imported when a connection is made, a run with cached ingestion needs neither
+                import certifi
+                import pymongo
+
+                # Establishes a new MongoDB client connection, with the certificate authority file of certifi
+                # to avoid timeout errors when connecting to MongoDB
+                MongoDBClient.client = pymongo.MongoClient(mongo_db_url, tlsCAFile=certifi.where())
 
             # Uses the shared MongoClient for this instance
             self.client = MongoDBClient.client
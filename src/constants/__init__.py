@@ -1,5 +1,6 @@
 import os
 from datetime import date
+from typing import Optional
 
 # For MongoDB Connection
 DATABASE_NAME = 'Vehicle_DB'
@@ -8,6 +9,27 @@ MONGODB_URL_KEY = "MONGODB_URL"
 
 PIPELINE_NAME: str = ""
 ARTIFACT_DIR: str = "artifact"
+# Hands DataFrames/arrays to the next stage in memory and writes the artifact files in the background
+PIPELINE_IN_MEMORY_HANDOFF: bool = True
+# Stage cache: a stage whose inputs (data fingerprint, config, schema sections and code) match those of a previous
+# run reuses its artifact instead of running again. Only the artifact directories of the most recently used
+# runs are kept, older ones are deleted.
+# Opt-in: the data fingerprint is the document count and the largest '_id' of the collection, so documents
+# updated in place go unnoticed and the stages would reuse artifacts built from the old values. Only enable
+# it for collections that are append-only or whose updates go through inserts.
+PIPELINE_STAGE_CACHE: bool = False
+PIPELINE_STAGE_CACHE_DIR_NAME: str = "stage_cache"
+PIPELINE_STAGE_CACHE_MAX_ARTIFACT_DIRS: int = 5
+# Tasks of the training pipeline DAG running at the same time, and the timeline of the tasks of a run
+PIPELINE_MAX_WORKERS: int = 4
+PIPELINE_TIMELINE_FILE_NAME: str = "timeline.json"
+# Timings, peak RSS and row counts of the instrumented steps of a run, compared with those of the previous run:
+# steps whose wall time or peak RSS grew by more than the tolerance are reported as regressions.
+# PIPELINE_PROFILE also saves a cProfile profile of the run.
+PIPELINE_METRICS_FILE_NAME: str = "metrics.json"
+PIPELINE_REGRESSION_TOLERANCE: float = 0.25
+PIPELINE_PROFILE: bool = False
+PIPELINE_PROFILE_FILE_NAME: str = "profile.prof"
 
 MODEL_FILE_NAME = "model.pkl"
 
@@ -23,6 +45,8 @@ SCHEMA_FILE_PATH  = os.path.join("config", "schema.yaml")
 AWS_ACCESS_KEY_ID_ENV_KEY = "AWS_ACCESS_KEY_ID"
 AWS_SECRET_ACCESS_KEY_ENV_KEY = "AWS_SECRET_ACCESS_KEY"
 REGION_NAME = "us-east-1"
+# Optional S3 compatible endpoint (MinIO, moto server), AWS is used when it is not set
+AWS_ENDPOINT_URL_ENV_KEY = "AWS_ENDPOINT_URL"
 
 # ----------------------Data Ingestion Starts----------------------------
 
@@ -34,6 +58,19 @@ DATA_INGESTION_DIR_NAME: str = "data_ingestion"
 DATA_INGESTION_FEATURE_STORE_DIR: str = "feature_store"
 DATA_INGESTION_INGESTED_DIR: str = "ingested"
 DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO: float = 0.25
+# A document is in the test split when the hash of its split key falls below the ratio, so every run holds out
+# the same documents and the models of earlier runs never trained on the holdout the evaluation scores them on
+DATA_INGESTION_SPLIT_KEY: str = "_id"
+DATA_INGESTION_FEATURE_STORE_FORMAT: str = "parquet"
+DATA_INGESTION_EXPORT_MODE: str = "streaming"
+DATA_INGESTION_EXPORT_BATCH_SIZE: int = 50_000
+DATA_INGESTION_EXPORT_WORKERS: int = 4
+DATA_INGESTION_EXPORT_PARTITIONS: int = 8
+DATA_INGESTION_EXPORT_PARTITION_KEY: str = "_id"
+DATA_INGESTION_INCREMENTAL: bool = False
+DATA_INGESTION_INCREMENTAL_KEY: str = "_id"
+DATA_INGESTION_CONSOLIDATED_DIR: str = "consolidated_store"
+DATA_INGESTION_HIGH_WATER_MARK_FILE_NAME: str = "high_water_mark.json"
 
 # -----------------------Data Ingestion Ends-----------------------------
 
@@ -43,6 +80,10 @@ Data Validation related constants
 """
 DATA_VALIDATION_DIR_NAME: str = "data_validation"
 DATA_VALIDATION_REPORT_FILE_NAME: str = "report.yaml"
+DATA_VALIDATION_DRIFT_REFERENCE_FILE_NAME: str = "drift_reference.json"
+DATA_VALIDATION_DRIFT_PSI_THRESHOLD: float = 0.2
+DATA_VALIDATION_DRIFT_KS_THRESHOLD: float = 0.1
+DATA_VALIDATION_FAIL_ON_DRIFT: bool = False
 
 # -----------------------Data Validation Ends-----------------------------
 
@@ -54,6 +95,19 @@ Data Transformation related constants
 DATA_TRANSFORMATION_DIR_NAME: str = "data_transformation"
 DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR: str = "transformed"
 DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR: str = "transformed_object"
+DATA_TRANSFORMATION_VALIDATION_FILE_NAME: str = "validation.npy"
+# SMOTEENN resampling: neighbour searches on DATA_TRANSFORMATION_RESAMPLING_N_JOBS threads (-1 for all cores)
+# with the given NearestNeighbors algorithm, on float32 features. Every stratum of the stratify column is
+# resampled on its own, strata smaller than the min rows are pooled together; None (the default) resamples all rows
+# at once, like SMOTEENN on the whole training set. Per-stratum resampling bounds memory but changes which
+# neighbours ENN and SMOTE see, so the resampled rows differ; set a column such as "Region_Code" to opt in.
+# kd_tree and ball_tree searches work on a float64 copy, so float32 only saves memory on small strata or "brute"
+DATA_TRANSFORMATION_RESAMPLING_N_JOBS: int = -1
+DATA_TRANSFORMATION_RESAMPLING_ALGORITHM: str = "auto"
+DATA_TRANSFORMATION_RESAMPLING_DTYPE: str = "float32"
+DATA_TRANSFORMATION_RESAMPLING_STRATIFY_COLUMN: Optional[str] = None
+DATA_TRANSFORMATION_RESAMPLING_MIN_STRATUM_ROWS: int = 1000
+DATA_TRANSFORMATION_RESAMPLING_RANDOM_STATE: int = 42
 
 # -----------------------Data Transformation Ends---------------------------
 
@@ -65,6 +119,13 @@ Model Training related constants
 MODEL_TRAINER_DIR_NAME: str = "model_trainer"
 MODEL_TRAINER_TRAINED_MODEL_DIR: str = "trained_model"
 MODEL_TRAINER_TRAINED_MODEL_NAME: str = "model.pkl"
+MODEL_TRAINER_REFERENCE_SKETCH_NAME: str = "reference_sketch.json"
+# Metrics and fit times of every candidate of the model search
+MODEL_TRAINER_LEADERBOARD_NAME: str = "leaderboard.yaml"
+# Also saves the model as a memory-mappable packed file next to model.pkl
+MODEL_TRAINER_SAVE_PACKED_MODEL: bool = True
+MODEL_TRAINER_PACKED_MODEL_NAME: str = "model.packed"
+PACKED_MODEL_FILE_EXTENSION: str = ".packed"
 MODEL_TRAINER_EXPECTED_SCORE: float = 0.6
 MODEL_TRAINER_MODEL_CONFIG_FILE_PATH: str = os.path.join("config", "model.yaml")
 MODEL_TRAINER_N_ESTIMATORS=200
@@ -73,9 +134,81 @@ MODEL_TRAINER_MIN_SAMPLES_LEAF: int = 6
 MIN_SAMPLES_SPLIT_MAX_DEPTH: int = 10
 MIN_SAMPLES_SPLIT_CRITERION: str = 'entropy'
 MIN_SAMPLES_SPLIT_RANDOM_STATE: int = 101
+# Incremental training warm-starts the forest of the latest model under ARTIFACT_DIR: new trees are fitted on the
+# training rows it has not seen and the oldest trees are retired beyond the max, reusing its preprocessing
+# pipeline. Runs without a previous model, or with drift against its reference sketch, are full retrains
+MODEL_TRAINER_INCREMENTAL: bool = False
+MODEL_TRAINER_INCREMENTAL_N_ESTIMATORS: int = 50
+MODEL_TRAINER_INCREMENTAL_MAX_ESTIMATORS: int = 200
+# Also fits the model from scratch on all the training rows and reports both metrics
+MODEL_TRAINER_INCREMENTAL_COMPARE_FULL_REFIT: bool = True
+# Hashes of the raw training rows a model has been trained on, saved next to it
+MODEL_TRAINER_TRAINING_ROWS_NAME: str = "training_rows.npy"
+MODEL_TRAINER_INCREMENTAL_REPORT_NAME: str = "incremental_report.yaml"
+# Forest evaluation of MyModel: "flat" evaluates all trees level by level on a flattened node table,
+# "sklearn" uses the trees of the RandomForestClassifier and "auto" uses the flat evaluator for batches of
+# at most MODEL_INFERENCE_FLAT_MAX_ROWS rows on a single thread, where it beats the per-tree sklearn calls.
+# Batches above MODEL_INFERENCE_CHUNK_ROWS are split into chunks, evaluated on MODEL_INFERENCE_N_JOBS threads
+MODEL_INFERENCE_BACKEND: str = "auto"
+MODEL_INFERENCE_FLAT_MAX_ROWS: int = 256
+MODEL_INFERENCE_N_JOBS: int = 1
+MODEL_INFERENCE_CHUNK_ROWS: int = 256
 
 # -----------------------Model Training Ends-----------------------------------
 
 
+# -----------------------Prediction Service Starts-----------------------------------
+APP_HOST = "0.0.0.0"
+APP_PORT = 5000
+# Model served by the prediction service, defaults to the latest model trained under the artifact directory
+PREDICTION_MODEL_FILE_PATH_ENV_KEY = "PREDICTION_MODEL_FILE_PATH"
+# Concurrent requests are scored together in micro-batches of at most this size,
+# a batch is dispatched once it is full or the oldest request waited PREDICTION_MAX_BATCH_DELAY_MS
+PREDICTION_MAX_BATCH_SIZE: int = 64
+PREDICTION_MAX_BATCH_DELAY_MS: float = 5.0
+PREDICTION_WORKERS: int = 2
+# Bucket of the model registry the service loads from and hot reloads, the model is read locally when it is not set
+PREDICTION_MODEL_BUCKET_ENV_KEY = "PREDICTION_MODEL_BUCKET"
+PREDICTION_MODEL_REFRESH_INTERVAL_SECONDS: float = 60.0
+
+# -----------------------Model Registry Starts-----------------------------------
+MODEL_BUCKET_NAME = "my-model-mlopsproj"
+MODEL_PUSHER_S3_KEY = "model-registry"
+# Local copies of downloaded models, one file per object version
+MODEL_CACHE_DIR: str = "model_cache"
+MODEL_CACHE_MAX_FILES: int = 5
+MODEL_CACHE_MAX_IN_MEMORY: int = 2
+# Directory standing in for the bucket of the model registry (one sub-directory per bucket), S3 is used when it is not set
+MODEL_REGISTRY_LOCAL_DIR_ENV_KEY = "MODEL_REGISTRY_LOCAL_DIR"
+# Objects of the last push with their sha256 and version, read by serving processes to find the current model
+MODEL_REGISTRY_MANIFEST_KEY: str = "manifest.json"
+
+# -----------------------Model Evaluation Starts-----------------------------------
 
+"""
+Model Evaluation related constants
+"""
+MODEL_EVALUATION_DIR_NAME: str = "model_evaluation"
+MODEL_EVALUATION_REPORT_FILE_NAME: str = "report.yaml"
+# The trained model replaces the production model when its F1 score on the holdout is higher by more than this
+MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE: float = 0.02
+# The engineered features of the holdout are cached under ARTIFACT_DIR as memory-mapped arrays, one file per holdout
+# and feature layout, and both models are scored on chunks of MODEL_EVALUATION_CHUNK_ROWS rows. The ROC AUC comes
+# from score histograms of MODEL_EVALUATION_AUC_BINS bins, its error is at most half the fraction of positive and
+# negative pairs whose scores share a bin (reported as roc_auc_error_bound)
+MODEL_EVALUATION_HOLDOUT_CACHE_DIR: str = "holdout_cache"
+MODEL_EVALUATION_HOLDOUT_CACHE_MAX_FILES: int = 4
+MODEL_EVALUATION_CHUNK_ROWS: int = 65_536
+MODEL_EVALUATION_AUC_BINS: int = 10_000
+
+# -----------------------Model Pusher Starts-----------------------------------
 
+"""
+Model Pusher related constants
+"""
+MODEL_PUSHER_PACKED_MODEL_KEY: str = MODEL_TRAINER_PACKED_MODEL_NAME
+MODEL_PUSHER_PREPROCESSING_KEY: str = PREPROCESSING_OBJECT_FILE_NAME
+# Files are uploaded in parts of MODEL_PUSHER_PART_SIZE bytes (5 MiB at least for S3), MODEL_PUSHER_WORKERS at a time.
+# A file whose sha256 matches the one recorded on the object of its key is not uploaded again
+MODEL_PUSHER_PART_SIZE: int = 16 * 2**20
+MODEL_PUSHER_WORKERS: int = 8
@@ -1,11 +1,18 @@
 import sys
+import time
 import pandas as pd
 import numpy as np
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
 
 from src.configuration.mongo_db_connection import MongoDBClient
-from src.constants import DATABASE_NAME
+from src.constants import (DATABASE_NAME, SCHEMA_FILE_PATH, DATA_INGESTION_EXPORT_BATCH_SIZE,
+                           DATA_INGESTION_EXPORT_WORKERS, DATA_INGESTION_EXPORT_PARTITIONS,
+                           DATA_INGESTION_EXPORT_PARTITION_KEY)
 from src.exception import MyException
+from src.logger import logging
+from src.utils.main_utils import (read_yaml_file, get_schema_dtypes, cast_to_schema_dtype, concat_dataframes,
+                                  apply_schema_dtypes)
 
 class Vehicle_Data:
     """A class to export MongoDB records as a pandas DataFrame"""
@@ -13,12 +20,240 @@ class Vehicle_Data:
     def __init__(self) -> None:
         """
         Initializes the MongoDB client connection
-        """        
+        """
         try:
             self.mongo_client = MongoDBClient(database_name=DATABASE_NAME)
+            self._schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
+            # Rows/s of every partition read by the last parallel export
+            self.partition_throughput = {}
+        except Exception as e:
+            raise MyException(e, sys)
+
+    def _get_collection(self, collection_name: str, database_name: Optional[str] = None):
+        """
+        Returns the collection from the default or specified database
+        """
+        if database_name is None:
+            return self.mongo_client.database[collection_name]
+        return self.mongo_client.client[database_name][collection_name]
+
+    def get_exported_columns(self) -> list:
+        """
+        Returns the columns of the exported data, '_id' first
+        """
+        return list(self._get_schema_dtypes())
+
+    def _get_schema_dtypes(self) -> dict:
+        """
+        Returns the columns exported from MongoDB mapped to their schema dtype, '_id' first as strings.
+        The 'id' column is left out as it is dropped from the exported data anyway.
+        """
+        dtypes = {"_id": "str"}
+        dtypes.update({name: dtype for name, dtype in get_schema_dtypes(self._schema_config).items() if name != "id"})
+        return dtypes
+
+    @staticmethod
+    def _build_chunk(buffers: dict, dtypes: dict, categories: Optional[dict] = None) -> pd.DataFrame:
+        """
+        Builds a DataFrame from per-column value buffers, converting each buffer straight to its schema dtype:
+        the compact numeric dtypes and pandas categoricals starting with the given categories of the column.
+        'na' markers and missing fields become NaN, numeric columns holding them fall back to float.
+        Objects like the ObjectIds of '_id' are converted to strings chunk by chunk, so they are freed with the buffers.
+        """
+        categories = categories or {}
+        data = {}
+        for name, values in buffers.items():
+            dtype = dtypes[name]
+            if isinstance(dtype, str) or dtype == object:
+                series = pd.Series(values, dtype=object).replace({"na": np.nan})
+                data[name] = series.astype(str) if dtype == "str" else cast_to_schema_dtype(series, dtype,
+                                                                                           categories.get(name))
+                continue
+            try:
+                array = np.asarray(values, dtype=np.int64 if dtype.kind in "iu" else np.float64)
+            except (TypeError, ValueError, OverflowError):
+                array = pd.to_numeric(pd.Series(values).replace({"na": np.nan}), errors="coerce").to_numpy()
+            data[name] = cast_to_schema_dtype(pd.Series(array, copy=False), dtype)
+        # Every column keeps a block of its own, so concat_dataframes(release=True) frees chunks column by column
+        return pd.DataFrame(data, copy=False)
+
+    def export_collection_in_chunks(self, collection_name: str, database_name: Optional[str] = None,
+                                    batch_size: int = DATA_INGESTION_EXPORT_BATCH_SIZE,
+                                    query: Optional[dict] = None, sort_key: Optional[str] = None,
+                                    extra_columns: Optional[list] = None) -> Iterator[pd.DataFrame]:
+        """
+        Streams a MongoDB collection as pandas DataFrame chunks of at most `batch_size` rows.
+
+        Parameters:
+        ----------
+        collection_name : str
+            The name of the MongoDB collection to export.
+        database_name : Optional[str]
+            Name of the database (optional). Defaults to DATABASE_NAME.
+        batch_size : int
+            Number of documents fetched per cursor batch and rows per yielded chunk.
+        query : Optional[dict]
+            Filter applied to the collection (optional). Defaults to all documents.
+        sort_key : Optional[str]
+            Field to sort the cursor on in ascending order (optional).
+        extra_columns : Optional[list]
+            Fields fetched in addition to the exported columns (optional), like the 'id' left out of the export.
+
+        Yields:
+        -------
+        pd.DataFrame
+            Chunks with the schema columns only, in the dtypes of schema.yaml and 'na' values replaced with NaN.
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            dtypes = self._get_schema_dtypes()
+            schema_dtypes = get_schema_dtypes(self._schema_config)
+            for name in extra_columns or []:
+                dtypes.setdefault(name, schema_dtypes.get(name, object))
+            categories = self._schema_config.get("allowed_categories", {})
+            # Only the schema columns are fetched, '_id' is returned by MongoDB by default
+            projection = {name: 1 for name in dtypes if name != "_id"}
+
+            cursor = collection.find(query or {}, projection, batch_size=batch_size)
+            if sort_key is not None:
+                cursor = cursor.sort(sort_key, 1)
+
+            buffers = {name: [] for name in dtypes}
+            rows = 0
+            for document in cursor:
+                for name, values in buffers.items():
+                    values.append(document.get(name, np.nan))
+                rows += 1
+                if rows == batch_size:
+                    yield self._build_chunk(buffers, dtypes, categories)
+                    buffers = {name: [] for name in dtypes}
+                    rows = 0
+
+            if rows:
+                yield self._build_chunk(buffers, dtypes, categories)
+        except Exception as e:
+            raise MyException(e, sys)
+
+    def get_max_key(self, collection_name: str, key: str, database_name: Optional[str] = None):
+        """
+        Returns the largest value of `key` in the collection, or None when the collection is empty.
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            document = next(collection.find({}, {key: 1}).sort(key, -1).limit(1), None)
+            return None if document is None else document[key]
         except Exception as e:
             raise MyException(e, sys)
-        
+
+    def get_collection_fingerprint(self, collection_name: str, key: str = "_id", database_name: Optional[str] = None) -> dict:
+        """
+        Returns the document count and the largest `key` of the collection, which change whenever documents
+        are inserted or deleted. Documents updated in place keep the same fingerprint.
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            max_key = self.get_max_key(collection_name, key, database_name)
+            return {"documents": collection.count_documents({}), "max_key": None if max_key is None else str(max_key)}
+        except Exception as e:
+            raise MyException(e, sys)
+
+    def _get_partition_bounds(self, collection, partitions: int, key: str) -> list:
+        """
+        Splits the collection into `partitions` contiguous ranges of roughly equal size on `key`.
+        Returns a list of (lower, upper) tuples where None stands for an open bound.
+        """
+        total = collection.count_documents({})
+        partitions = max(1, min(partitions, total))
+        boundaries = []
+        if partitions > 1:
+            # A single sorted pass over the key only, instead of one skip scan per boundary
+            positions = iter([index * total // partitions for index in range(1, partitions)])
+            position = next(positions)
+            cursor = collection.find({}, {key: 1, "_id": 1 if key == "_id" else 0}).sort(key, 1)
+            for index, document in enumerate(cursor.batch_size(DATA_INGESTION_EXPORT_BATCH_SIZE)):
+                if index < position:
+                    continue
+                if not boundaries or document[key] != boundaries[-1]:
+                    boundaries.append(document[key])
+                position = next(positions, None)
+                if position is None:
+                    break
+        edges = [None] + boundaries + [None]
+        return list(zip(edges[:-1], edges[1:]))
+
+    def _export_partition(self, collection_name: str, database_name: Optional[str], batch_size: int,
+                          key: str, partition: int, bounds: tuple) -> pd.DataFrame:
+        """
+        Reads one key range of the collection and logs its throughput in rows/s.
+        """
+        lower, upper = bounds
+        key_range = {}
+        if lower is not None:
+            key_range["$gte"] = lower
+        if upper is not None:
+            key_range["$lt"] = upper
+        query = {key: key_range} if key_range else {}
+
+        start = time.perf_counter()
+        chunks = list(self.export_collection_in_chunks(collection_name=collection_name, database_name=database_name,
+                                                       batch_size=batch_size, query=query, sort_key=key))
+        elapsed = time.perf_counter() - start
+        rows = sum(len(chunk) for chunk in chunks)
+        throughput = rows / elapsed if elapsed > 0 else float("inf")
+        self.partition_throughput[partition] = throughput
+        logging.info(f"Partition {partition} fetched {rows} rows in {elapsed:.2f}s ({throughput:,.0f} rows/s)")
+        return concat_dataframes(chunks, release=True) if chunks else None
+
+    def export_collection_in_partitions(self, collection_name: str, database_name: Optional[str] = None,
+                                        partitions: int = DATA_INGESTION_EXPORT_PARTITIONS,
+                                        workers: int = DATA_INGESTION_EXPORT_WORKERS,
+                                        batch_size: int = DATA_INGESTION_EXPORT_BATCH_SIZE,
+                                        key: str = DATA_INGESTION_EXPORT_PARTITION_KEY) -> pd.DataFrame:
+        """
+        Exports a MongoDB collection by reading contiguous ranges of `key` concurrently.
+
+        All workers share the connection pool of MongoDBClient.client. The partitions are concatenated
+        in key order, which is the order the serial export returns whenever the natural order of the
+        collection follows `key` (as it does for documents loaded with insert_many and generated '_id's).
+
+        Parameters:
+        ----------
+        collection_name : str
+            The name of the MongoDB collection to export.
+        database_name : Optional[str]
+            Name of the database (optional). Defaults to DATABASE_NAME.
+        partitions : int
+            Number of key ranges the collection is split into.
+        workers : int
+            Number of threads reading partitions at the same time.
+        batch_size : int
+            Number of documents fetched per cursor batch.
+        key : str
+            Indexed field the ranges are built on, '_id' or 'id'.
+
+        Returns:
+        -------
+        pd.DataFrame
+            DataFrame with the same columns and dtypes as the streaming export.
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            bounds = self._get_partition_bounds(collection, partitions, key)
+            logging.info(f"Reading {len(bounds)} partitions of '{collection_name}' on '{key}' with {workers} workers")
+
+            self.partition_throughput = {}
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                frames = list(executor.map(
+                    lambda item: self._export_partition(collection_name, database_name, batch_size, key, *item),
+                    enumerate(bounds)))
+
+            frames = [frame for frame in frames if frame is not None]
+            if not frames:
+                return pd.DataFrame(columns=list(self._get_schema_dtypes()))
+            return concat_dataframes(frames, release=True)
+        except Exception as e:
+            raise MyException(e, sys)
+
     def export_collection_as_dataframe(self, collection_name:str, database_name: Optional[str] = None) -> pd.DataFrame:
         """
         Exports an entire MongoDB collection as a pandas DataFrame.
@@ -33,24 +268,27 @@ class Vehicle_Data:
         Returns:
         -------
         pd.DataFrame
-            DataFrame containing the collection data, with '_id' column removed and 'na' values replaced with NaN.
+            DataFrame containing the collection data, with 'id' column removed, 'na' values replaced with NaN
+            and the schema columns in their schema dtypes.
         """
         try:
             # Access specified collection from the default or specified database
-            if database_name is None:
-                collection = self.mongo_client.database[collection_name]
-            else:
-                collection = self.mongo_client[database_name][collection_name]
-            
+            collection = self._get_collection(collection_name, database_name)
+
             # Converts the collection data to DataFrame and preprocesses it
-            print("Fetching the data from mongoDB")
+            logging.info("Fetching the data from mongoDB")
             df = pd.DataFrame(list(collection.find()))
-            print(f"Data fecthed with len: {len(df)}")
+            logging.info(f"Data fetched with len: {len(df)}")
 
             if "id" in df.columns.to_list():
-                df = df.drop(columns=["id"], axis=1)
-            
+                df = df.drop(columns=["id"])
+
             df.replace({"na": np.nan}, inplace=True)
-            return df
+            # Numeric columns holding other values are coerced like the chunks of the other export modes,
+            # which would otherwise stay object columns that apply_schema_dtypes leaves as they are
+            for name, dtype in self._get_schema_dtypes().items():
+                if name in df.columns and not isinstance(dtype, str) and dtype != object and df[name].dtype == object:
+                    df[name] = pd.to_numeric(df[name], errors="coerce")
+            return apply_schema_dtypes(df, self._schema_config)
         except Exception as e:
-            raise MyException(e, sys)
\ No newline at end of file
+            raise MyException(e, sys)
@@ -12,13 +12,22 @@ and maintain a structured workflow.
 """
 
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+    from pandas import DataFrame
+    from sklearn.pipeline import Pipeline
 
 # Stores paths related to split data
 @dataclass
 class DataIngestionArtifact:
     trained_file_path: str
     test_file_path: str
+    # In-memory copies of the split data for the next stages of the same process
+    train_df: Optional["DataFrame"] = field(default=None, repr=False, compare=False)
+    test_df: Optional["DataFrame"] = field(default=None, repr=False, compare=False)
 
 # Stores validation reports or schema files
 @dataclass
@@ -26,12 +35,28 @@ class DataValidationArtifact:
     validation_status:bool
     message: str
     validation_report_file_path: str
+    drift_reference_file_path: Optional[str] = None
+    drift_detected: bool = False
     
 @dataclass
 class DataTransformationArtifact:
     transformed_object_file_path:str 
     transformed_train_file_path:str
     transformed_test_file_path:str
+    # In-memory copies of the transformed arrays and fitted preprocessor for the model trainer
+    train_arr: Optional["np.ndarray"] = field(default=None, repr=False, compare=False)
+    test_arr: Optional["np.ndarray"] = field(default=None, repr=False, compare=False)
+    preprocessing_object: Optional["Pipeline"] = field(default=None, repr=False, compare=False)
+    # Unresampled training rows the model search scores its candidates on, when it compares several
+    transformed_validation_file_path: Optional[str] = None
+    validation_arr: Optional["np.ndarray"] = field(default=None, repr=False, compare=False)
+    # Hashes of the raw training rows the trained model will have seen, its own and those of the previous model.
+    # No artifact file holds them, so the stage cache keeps them with the artifact.
+    training_row_hashes: Optional["np.ndarray"] = field(default=None, repr=False, compare=False,
+                                                         metadata={"stage_cache": True})
+    # Incremental runs: train_arr only holds the new rows, history_train_arr the rows of the previous model
+    incremental: bool = False
+    history_train_arr: Optional["np.ndarray"] = field(default=None, repr=False, compare=False)
 
 @dataclass
 class ClassificationMetricArtifact:
@@ -43,4 +68,25 @@ class ClassificationMetricArtifact:
 class ModelTrainerArtifact:
     trained_model_file_path:str 
     metric_artifact:ClassificationMetricArtifact
+    reference_sketch_file_path: Optional[str] = None
+    packed_model_file_path: Optional[str] = None
+    leaderboard_file_path: Optional[str] = None
+    training_rows_file_path: Optional[str] = None
+    incremental_report_file_path: Optional[str] = None
+
+@dataclass
+class ModelEvaluationArtifact:
+    is_model_accepted: bool
+    # F1 score of the trained model on the holdout minus the one of the production model
+    changed_accuracy: float
+    s3_model_path: str
+    trained_model_path: str
+    report_file_path: Optional[str] = None
 
+@dataclass
+class ModelPusherArtifact:
+    bucket_name: str
+    s3_model_path: str
+    manifest_path: Optional[str] = None
+    # Bytes sent to the bucket, files already there with the same content are skipped
+    uploaded_bytes: int = 0
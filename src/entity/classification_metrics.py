@@ -0,0 +1,84 @@
+import sys
+from typing import Optional
+
+import numpy as np
+
+from src.constants import MODEL_EVALUATION_AUC_BINS
+from src.exception import MyException
+
+class ClassificationMetricsAccumulator:
+    """
+    Streaming F1, precision, recall and ROC AUC of a binary classifier.
+
+    Every chunk of labels, predictions and positive class scores updates a confusion matrix and one score
+    histogram per class with a few bincounts, so any number of rows is scored in constant memory. The AUC is
+    computed from the histograms, counting the pairs of scores in the same bin as ties: it is exact when the
+    scores of the two classes never share a bin, and otherwise off by at most half the fraction of positive and
+    negative pairs sharing a bin, reported as roc_auc_error_bound. Forest scores cluster on a few values, so the
+    bound is not necessarily small.
+    """
+
+    def __init__(self, bins: int = MODEL_EVALUATION_AUC_BINS, positive_label: int = 1):
+        """
+        :param bins: number of score histogram bins over [0, 1]
+        :param positive_label: label of the positive class
+        """
+        self.bins = bins
+        self.positive_label = positive_label
+        # True negatives, false positives, false negatives, true positives
+        self.confusion = np.zeros(4, dtype=np.int64)
+        self.positive_histogram = np.zeros(bins, dtype=np.int64)
+        self.negative_histogram = np.zeros(bins, dtype=np.int64)
+
+    def update(self, y_true: np.ndarray, y_pred: np.ndarray, scores: np.ndarray) -> None:
+        """
+        Adds a chunk of rows
+        :param y_true: true labels
+        :param y_pred: predicted labels
+        :param scores: probabilities of the positive class
+        """
+        try:
+            actual = np.asarray(y_true) == self.positive_label
+            predicted = np.asarray(y_pred) == self.positive_label
+            self.confusion += np.bincount(2 * actual + predicted, minlength=4)
+            bin_index = np.clip((np.asarray(scores, dtype=np.float64) * self.bins).astype(np.intp), 0, self.bins - 1)
+            self.positive_histogram += np.bincount(bin_index[actual], minlength=self.bins)
+            self.negative_histogram += np.bincount(bin_index[~actual], minlength=self.bins)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    @property
+    def rows(self) -> int:
+        return int(self.confusion.sum())
+
+    def roc_auc(self) -> Optional[float]:
+        """
+        Probability that a positive row scores above a negative one, None without rows of both classes
+        """
+        positives, negatives = self.positive_histogram.sum(), self.negative_histogram.sum()
+        if positives == 0 or negatives == 0:
+            return None
+        negatives_below = np.cumsum(self.negative_histogram) - self.negative_histogram
+        pairs = self.positive_histogram * (negatives_below + 0.5 * self.negative_histogram)
+        return float(pairs.sum() / (positives * negatives))
+
+    def roc_auc_error_bound(self) -> Optional[float]:
+        """
+        Largest difference between roc_auc and the exact ROC AUC: the pairs sharing a bin count for half
+        """
+        positives, negatives = self.positive_histogram.sum(), self.negative_histogram.sum()
+        if positives == 0 or negatives == 0:
+            return None
+        return float(0.5 * np.dot(self.positive_histogram, self.negative_histogram) / (positives * negatives))
+
+    def result(self) -> dict:
+        """
+        Returns the metrics of all the rows added, precision and recall are 0 when undefined like in sklearn
+        """
+        true_negatives, false_positives, false_negatives, true_positives = (int(count) for count in self.confusion)
+        precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 0.0
+        recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        return {"rows": self.rows, "f1_score": f1, "precision_score": precision, "recall_score": recall,
+                "roc_auc": self.roc_auc(), "roc_auc_error_bound": self.roc_auc_error_bound(), "true_positives": true_positives, "false_positives": false_positives,
+                "false_negatives": false_negatives, "true_negatives": true_negatives}
@@ -2,6 +2,7 @@ import os
 from src.constants import *
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
 
 TIMESTAMP: str = datetime.now().strftime('%m_%d_%Y_%H_%M_%S')
 
@@ -11,6 +12,17 @@ class TrainingPipelineConfig:
     # Creates a folder named artifact with timestamp
     artifact_dir: str = os.path.join(ARTIFACT_DIR, TIMESTAMP)
     timestamp:str = TIMESTAMP
+    in_memory_handoff: bool = PIPELINE_IN_MEMORY_HANDOFF
+    incremental_training: bool = MODEL_TRAINER_INCREMENTAL
+    stage_cache: bool = PIPELINE_STAGE_CACHE
+    stage_cache_dir: str = os.path.join(ARTIFACT_DIR, PIPELINE_STAGE_CACHE_DIR_NAME)
+    stage_cache_max_artifact_dirs: int = PIPELINE_STAGE_CACHE_MAX_ARTIFACT_DIRS
+    max_workers: int = PIPELINE_MAX_WORKERS
+    timeline_file_path: str = os.path.join(artifact_dir, PIPELINE_TIMELINE_FILE_NAME)
+    metrics_file_path: str = os.path.join(artifact_dir, PIPELINE_METRICS_FILE_NAME)
+    regression_tolerance: float = PIPELINE_REGRESSION_TOLERANCE
+    profile: bool = PIPELINE_PROFILE
+    profile_file_path: str = os.path.join(artifact_dir, PIPELINE_PROFILE_FILE_NAME)
 
 # Object of TrainingPipelineConfig class
 training_pipeline_config : TrainingPipelineConfig = TrainingPipelineConfig()
@@ -23,12 +35,40 @@ class DataIngestionConfig:
     training_file_path: str = os.path.join(data_ingestion_dir, DATA_INGESTION_INGESTED_DIR, TRAIN_FILE_NAME)
     testing_file_path: str = os.path.join(data_ingestion_dir, DATA_INGESTION_INGESTED_DIR, TEST_FILE_NAME)
     train_test_split_ratio: float = DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO
+    split_key: str = DATA_INGESTION_SPLIT_KEY
+    in_memory_handoff: bool = training_pipeline_config.in_memory_handoff
     collection_name:str = DATA_INGESTION_COLLECTION_NAME
+    # "streaming" reads the collection in typed chunks; "parallel" reads key ranges concurrently;
+    # "full" materializes every document first
+    export_mode: str = DATA_INGESTION_EXPORT_MODE
+    export_batch_size: int = DATA_INGESTION_EXPORT_BATCH_SIZE
+    export_workers: int = DATA_INGESTION_EXPORT_WORKERS
+    export_partitions: int = DATA_INGESTION_EXPORT_PARTITIONS
+    export_partition_key: str = DATA_INGESTION_EXPORT_PARTITION_KEY
+    # Incremental ingestion appends new documents to a store shared by all runs instead of re-exporting
+    incremental: bool = DATA_INGESTION_INCREMENTAL
+    incremental_key: str = DATA_INGESTION_INCREMENTAL_KEY
+    consolidated_store_file_path: str = os.path.join(ARTIFACT_DIR, DATA_INGESTION_DIR_NAME, DATA_INGESTION_CONSOLIDATED_DIR, FILE_NAME)
+    high_water_mark_file_path: str = os.path.join(ARTIFACT_DIR, DATA_INGESTION_DIR_NAME, DATA_INGESTION_CONSOLIDATED_DIR,
+                                                  DATA_INGESTION_HIGH_WATER_MARK_FILE_NAME)
+    # Format of the feature store and train/test files: "parquet", "feather" or "csv"
+    feature_store_format: str = DATA_INGESTION_FEATURE_STORE_FORMAT
+
+    def __post_init__(self):
+        # The data file extensions follow the selected feature store format
+        for name in ("feature_store_file_path", "training_file_path", "testing_file_path", "consolidated_store_file_path"):
+            setattr(self, name, f"{os.path.splitext(getattr(self, name))[0]}.{self.feature_store_format}")
 
 @dataclass
 class DataValidationConfig:
     data_validation_dir: str = os.path.join(training_pipeline_config.artifact_dir, DATA_VALIDATION_DIR_NAME)
     validation_report_file_path: str = os.path.join(data_validation_dir, DATA_VALIDATION_REPORT_FILE_NAME)
+    drift_reference_file_path: str = os.path.join(data_validation_dir, DATA_VALIDATION_DRIFT_REFERENCE_FILE_NAME)
+    # Reference sketch saved with a previous model, the training data is scored against it when set
+    baseline_drift_reference_file_path: Optional[str] = None
+    drift_psi_threshold: float = DATA_VALIDATION_DRIFT_PSI_THRESHOLD
+    drift_ks_threshold: float = DATA_VALIDATION_DRIFT_KS_THRESHOLD
+    fail_on_drift: bool = DATA_VALIDATION_FAIL_ON_DRIFT
 
 @dataclass
 class DataTransformationConfig:
@@ -37,19 +77,83 @@ class DataTransformationConfig:
                                                     TRAIN_FILE_NAME.replace("csv", "npy"))
     transformed_test_file_path: str = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
                                                    TEST_FILE_NAME.replace("csv", "npy"))
+    # Training rows held out before the resampling to score the candidates of the model search
+    transformed_validation_file_path: str = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+                                                         DATA_TRANSFORMATION_VALIDATION_FILE_NAME)
+    model_config_file_path: str = MODEL_TRAINER_MODEL_CONFIG_FILE_PATH
     transformed_object_file_path: str = os.path.join(data_transformation_dir,
                                                      DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,
                                                      PREPROCESSING_OBJECT_FILE_NAME)
+    in_memory_handoff: bool = training_pipeline_config.in_memory_handoff
+    resampling_n_jobs: int = DATA_TRANSFORMATION_RESAMPLING_N_JOBS
+    resampling_algorithm: str = DATA_TRANSFORMATION_RESAMPLING_ALGORITHM
+    resampling_dtype: str = DATA_TRANSFORMATION_RESAMPLING_DTYPE
+    # Column of the raw data whose values are resampled separately, None resamples all rows at once
+    resampling_stratify_column: Optional[str] = DATA_TRANSFORMATION_RESAMPLING_STRATIFY_COLUMN
+    resampling_min_stratum_rows: int = DATA_TRANSFORMATION_RESAMPLING_MIN_STRATUM_ROWS
+    resampling_random_state: Optional[int] = DATA_TRANSFORMATION_RESAMPLING_RANDOM_STATE
+    # Model warm-started by an incremental training run, set by the training pipeline
+    incremental_training: bool = training_pipeline_config.incremental_training
+    previous_model_file_path: Optional[str] = None
+    compare_full_refit: bool = MODEL_TRAINER_INCREMENTAL_COMPARE_FULL_REFIT
     
 @dataclass
 class ModelTrainerConfig:
     model_trainer_dir: str = os.path.join(training_pipeline_config.artifact_dir, MODEL_TRAINER_DIR_NAME)
     trained_model_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_FILE_NAME)
+    reference_sketch_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_TRAINER_REFERENCE_SKETCH_NAME)
+    packed_model_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_TRAINER_PACKED_MODEL_NAME)
+    leaderboard_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_LEADERBOARD_NAME)
+    training_rows_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_TRAINER_TRAINING_ROWS_NAME)
+    incremental_report_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_INCREMENTAL_REPORT_NAME)
+    # Model warm-started by an incremental training run, set by the training pipeline
+    previous_model_file_path: Optional[str] = None
+    incremental_n_estimators: int = MODEL_TRAINER_INCREMENTAL_N_ESTIMATORS
+    incremental_max_estimators: int = MODEL_TRAINER_INCREMENTAL_MAX_ESTIMATORS
+    save_packed_model: bool = MODEL_TRAINER_SAVE_PACKED_MODEL
     expected_accuracy: float = MODEL_TRAINER_EXPECTED_SCORE
+    # Candidates of the model search, the RandomForestClassifier parameters below are used when it has none
     model_config_file_path: str = MODEL_TRAINER_MODEL_CONFIG_FILE_PATH
     _n_estimators = MODEL_TRAINER_N_ESTIMATORS
     _min_samples_split = MODEL_TRAINER_MIN_SAMPLES_SPLIT
     _min_samples_leaf = MODEL_TRAINER_MIN_SAMPLES_LEAF
     _max_depth = MIN_SAMPLES_SPLIT_MAX_DEPTH
     _criterion = MIN_SAMPLES_SPLIT_CRITERION
-    _random_state = MIN_SAMPLES_SPLIT_RANDOM_STATE
\ No newline at end of file
+    _random_state = MIN_SAMPLES_SPLIT_RANDOM_STATE
+
+@dataclass
+class ModelEvaluationConfig:
+    model_evaluation_dir: str = os.path.join(training_pipeline_config.artifact_dir, MODEL_EVALUATION_DIR_NAME)
+    report_file_path: str = os.path.join(model_evaluation_dir, MODEL_EVALUATION_REPORT_FILE_NAME)
+    # Engineered holdout features shared by all runs
+    holdout_cache_dir: str = os.path.join(ARTIFACT_DIR, MODEL_EVALUATION_DIR_NAME, MODEL_EVALUATION_HOLDOUT_CACHE_DIR)
+    holdout_cache_max_files: int = MODEL_EVALUATION_HOLDOUT_CACHE_MAX_FILES
+    changed_threshold_score: float = MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE
+    chunk_rows: int = MODEL_EVALUATION_CHUNK_ROWS
+    auc_bins: int = MODEL_EVALUATION_AUC_BINS
+    # Production model of the model registry
+    bucket_name: str = MODEL_BUCKET_NAME
+    s3_model_key_path: str = MODEL_FILE_NAME
+    local_registry_dir: Optional[str] = os.getenv(MODEL_REGISTRY_LOCAL_DIR_ENV_KEY)
+
+@dataclass
+class ModelPusherConfig:
+    bucket_name: str = MODEL_BUCKET_NAME
+    s3_model_key_path: str = MODEL_FILE_NAME
+    s3_packed_model_key_path: str = MODEL_PUSHER_PACKED_MODEL_KEY
+    s3_preprocessing_key_path: str = MODEL_PUSHER_PREPROCESSING_KEY
+    s3_manifest_key_path: str = MODEL_REGISTRY_MANIFEST_KEY
+    part_size: int = MODEL_PUSHER_PART_SIZE
+    workers: int = MODEL_PUSHER_WORKERS
+    local_registry_dir: Optional[str] = os.getenv(MODEL_REGISTRY_LOCAL_DIR_ENV_KEY)
+
+@dataclass
+class VehiclePredictorConfig:
+    model_file_path: Optional[str] = os.getenv(PREDICTION_MODEL_FILE_PATH_ENV_KEY)
+    model_bucket_name: Optional[str] = os.getenv(PREDICTION_MODEL_BUCKET_ENV_KEY)
+    s3_model_key_path: str = MODEL_FILE_NAME
+    s3_manifest_key_path: Optional[str] = MODEL_REGISTRY_MANIFEST_KEY
+    model_refresh_interval: float = PREDICTION_MODEL_REFRESH_INTERVAL_SECONDS
+    max_batch_size: int = PREDICTION_MAX_BATCH_SIZE
+    max_batch_delay_ms: float = PREDICTION_MAX_BATCH_DELAY_MS
+    workers: int = PREDICTION_WORKERS
@@ -0,0 +1,162 @@
+import json
+import os
+import sys
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.constants import DATA_VALIDATION_DRIFT_PSI_THRESHOLD, DATA_VALIDATION_DRIFT_KS_THRESHOLD
+from src.exception import MyException
+
+# Smallest proportion used in the PSI, so empty bins do not produce infinite values
+PSI_EPSILON = 1e-6
+
+class ReferenceSketch:
+    """
+    Compact summary of a dataset used for drift detection.
+
+    Numerical columns are summarized by histograms whose edges are fixed in schema.yaml, either evenly spaced
+    or listed explicitly for skewed columns, so a sketch is built in a single streaming pass and sketches of
+    different datasets are always comparable.
+    Categorical columns are summarized by frequency tables. A sketch serializes to a small JSON file.
+    """
+
+    def __init__(self, numerical_columns: dict, categorical_columns: list):
+        """
+        :param numerical_columns: column name mapped to its histogram spec, {"min", "max", "bins"} for evenly
+                                  spaced bins or {"edges"} for the increasing bin edges
+        :param categorical_columns: names of the columns summarized by frequency tables
+        """
+        self.numerical_columns = numerical_columns
+        self.categorical_columns = list(categorical_columns)
+        self.rows = 0
+        self.bin_edges = {column: self._bin_edges(spec) for column, spec in numerical_columns.items()}
+        self.histograms = {column: np.zeros(len(edges) - 1, dtype=np.int64) for column, edges in self.bin_edges.items()}
+        self.frequencies = {column: {} for column in self.categorical_columns}
+
+    @classmethod
+    def from_schema(cls, schema_config: dict) -> "ReferenceSketch":
+        """
+        Creates an empty sketch for the drift columns declared in schema.yaml
+        """
+        return cls(numerical_columns=schema_config["drift_numerical_columns"],
+                   categorical_columns=schema_config["drift_categorical_columns"])
+
+    @staticmethod
+    def _bin_edges(spec: dict) -> np.ndarray:
+        if "edges" not in spec:
+            return np.linspace(spec["min"], spec["max"], spec["bins"] + 1)
+        edges = np.asarray(spec["edges"], dtype=np.float64)
+        if len(edges) < 2 or np.any(np.diff(edges) <= 0):
+            raise ValueError(f"Histogram edges must be at least two increasing values: {spec['edges']}")
+        return edges
+
+    def update(self, dataframe: DataFrame) -> "ReferenceSketch":
+        """
+        Adds one DataFrame or chunk to the sketch
+        """
+        try:
+            self.rows += len(dataframe)
+            for column, histogram in self.histograms.items():
+                values = dataframe[column].to_numpy(dtype=np.float64, na_value=np.nan)
+                values = values[~np.isnan(values)]
+                # Inner edges only: values outside [min, max] fall into the first and last bins
+                bins = np.searchsorted(self.bin_edges[column][1:-1], values, side="right")
+                histogram += np.bincount(bins, minlength=len(histogram))
+            for column, frequency in self.frequencies.items():
+                for value, count in dataframe[column].value_counts(dropna=False).items():
+                    key = "null" if pd.isna(value) else str(value)
+                    frequency[key] = frequency.get(key, 0) + int(count)
+            return self
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def update_chunks(self, chunks: Iterable[DataFrame]) -> "ReferenceSketch":
+        """
+        Adds every chunk of a stream to the sketch
+        """
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    @staticmethod
+    def _psi(expected: np.ndarray, actual: np.ndarray) -> float:
+        expected = np.clip(expected / max(expected.sum(), 1), PSI_EPSILON, None)
+        actual = np.clip(actual / max(actual.sum(), 1), PSI_EPSILON, None)
+        return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+    @staticmethod
+    def _ks(expected: np.ndarray, actual: np.ndarray) -> float:
+        # KS statistic evaluated on the bin edges of the histograms
+        expected_cdf = np.cumsum(expected) / max(expected.sum(), 1)
+        actual_cdf = np.cumsum(actual) / max(actual.sum(), 1)
+        return float(np.max(np.abs(expected_cdf - actual_cdf)))
+
+    def compare(self, other: "ReferenceSketch", psi_threshold: float = DATA_VALIDATION_DRIFT_PSI_THRESHOLD,
+                ks_threshold: float = DATA_VALIDATION_DRIFT_KS_THRESHOLD) -> dict:
+        """
+        Scores the sketch of a new batch (`other`) against this reference sketch.
+        Numerical columns get a PSI and a KS statistic, categorical columns a PSI over the union of categories.
+        """
+        try:
+            columns = {}
+            for column, histogram in self.histograms.items():
+                psi = self._psi(histogram, other.histograms[column])
+                ks = self._ks(histogram, other.histograms[column])
+                columns[column] = {"psi": round(psi, 6), "ks": round(ks, 6),
+                                   "drift": psi > psi_threshold or ks > ks_threshold}
+            for column, frequency in self.frequencies.items():
+                categories = sorted(set(frequency) | set(other.frequencies[column]))
+                expected = np.array([frequency.get(category, 0) for category in categories], dtype=np.float64)
+                actual = np.array([other.frequencies[column].get(category, 0) for category in categories], dtype=np.float64)
+                psi = self._psi(expected, actual)
+                columns[column] = {"psi": round(psi, 6), "drift": psi > psi_threshold,
+                                   "new_categories": [category for category in categories if category not in frequency]}
+
+            drifted_columns = [column for column, result in columns.items() if result["drift"]]
+            return {"drift_detected": bool(drifted_columns), "drifted_columns": drifted_columns,
+                    "reference_rows": self.rows, "batch_rows": other.rows, "columns": columns}
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def score(self, dataframe: DataFrame, **thresholds) -> dict:
+        """
+        Sketches a new batch and scores it against this reference sketch
+        """
+        batch = ReferenceSketch(numerical_columns=self.numerical_columns, categorical_columns=self.categorical_columns)
+        return self.compare(batch.update(dataframe), **thresholds)
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "numerical_columns": self.numerical_columns,
+            "categorical_columns": self.categorical_columns,
+            "histograms": {column: histogram.tolist() for column, histogram in self.histograms.items()},
+            "frequencies": self.frequencies
+        }
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "ReferenceSketch":
+        sketch = cls(numerical_columns=content["numerical_columns"], categorical_columns=content["categorical_columns"])
+        sketch.rows = content["rows"]
+        sketch.histograms = {column: np.asarray(histogram, dtype=np.int64) for column, histogram in content["histograms"].items()}
+        sketch.frequencies = content["frequencies"]
+        return sketch
+
+    def save(self, file_path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w") as file:
+                json.dump(self.to_dict(), file)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    @classmethod
+    def load(cls, file_path: str) -> "ReferenceSketch":
+        try:
+            with open(file_path, "r") as file:
+                return cls.from_dict(json.load(file))
+        except Exception as e:
+            raise MyException(e, sys) from e
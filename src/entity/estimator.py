@@ -1,12 +1,41 @@
 import sys
+from typing import TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
-from sklearn.pipeline import Pipeline
 
+from src.constants import (MODEL_INFERENCE_BACKEND, MODEL_INFERENCE_N_JOBS, MODEL_INFERENCE_CHUNK_ROWS,
+                           MODEL_INFERENCE_FLAT_MAX_ROWS)
+from src.entity.forest_evaluator import FlatForest
 from src.exception import MyException
 from src.logger import logging
 
+# sklearn is imported when a pickled model is loaded or compiled, serving a packed model never imports it
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+def scale_features(features: np.ndarray, coefficients: dict) -> np.ndarray:
+    """
+    Applies the compiled ColumnTransformer of a model to engineered feature rows: reorders the columns
+    like the ColumnTransformer output and computes ((x - subtract) / divide) * multiply + add per column,
+    in the dtype of the coefficients, which is the dtype of the engineered features the scalers were fitted on.
+    Returns a contiguous float32 array, the input dtype the forest evaluates.
+    """
+    features = np.asarray(features, dtype=coefficients["subtract"].dtype)
+    if features.ndim == 1:
+        features = features.reshape(1, -1)
+    if features.shape[1] != coefficients["n_features"]:
+        raise ValueError(f"Expected {coefficients['n_features']} features, got {features.shape[1]}")
+
+    scaled = features[:, coefficients["order"]]
+    scaled -= coefficients["subtract"]
+    scaled /= coefficients["divide"]
+    scaled *= coefficients["multiply"]
+    scaled += coefficients["add"]
+    # The forest evaluates float32 inputs, the conversion sklearn would otherwise do on every call
+    return np.ascontiguousarray(scaled, dtype=np.float32)
+
 class TargetValueMapping:
     def __init__(self):
         self.yes:int = 0
@@ -18,28 +47,48 @@ class TargetValueMapping:
         return dict(zip(mapping_response.values(),mapping_response.keys()))
 
 class MyModel:
-    def __init__(self, preprocessing_object: Pipeline, trained_model_object: object):
+    def __init__(self, preprocessing_object: "Pipeline", trained_model_object: object,
+                 inference_backend: str = MODEL_INFERENCE_BACKEND, inference_n_jobs: int = MODEL_INFERENCE_N_JOBS,
+                 inference_chunk_rows: int = MODEL_INFERENCE_CHUNK_ROWS):
         """
         :param preprocessing_object: Input Object of preprocesser
         :param trained_model_object: Input Object of trained model 
+        :param inference_backend: "flat" to evaluate a RandomForestClassifier with the FlatForest evaluator,
+                                  "sklearn" to use its own trees, "auto" for the flat evaluator on batches of
+                                  at most MODEL_INFERENCE_FLAT_MAX_ROWS rows and the sklearn trees above
+        :param inference_n_jobs: threads of the flat evaluator for batches above inference_chunk_rows
+        :param inference_chunk_rows: rows per chunk of the flat evaluator
         """
         self.preprocessing_object = preprocessing_object
         self.trained_model_object = trained_model_object
+        self.inference_backend = inference_backend
+        self.inference_n_jobs = inference_n_jobs
+        self.inference_chunk_rows = inference_chunk_rows
+        self._fast_path = None
+
+    def __getstate__(self):
+        # The compiled fast path duplicates the forest, it is rebuilt after loading instead of being pickled
+        return {**self.__dict__, "_fast_path": None}
 
     def predict(self, dataframe: pd.DataFrame) -> DataFrame:
         """
-        Function accepts preprocessed inputs (with all custom transformations already applied),
-        applies scaling using preprocessing_object, and performs prediction on transformed features.
+        Function accepts raw inputs with the schema columns, applies the feature engineering and scaling
+        using preprocessing_object, and performs prediction on transformed features.
         """
         try:
             logging.info("Starting prediction process")
 
-            # Step 1: Apply scaling transformations using the pre-trained preprocessing object
+            # Step 1: Apply feature engineering and scaling using the pre-trained preprocessing object
             transformed_feature = self.preprocessing_object.transform(dataframe)
 
             # Step 2: Performs prediction using the trained model
             logging.info("Using the trained model to get predictions")
-            predictions = self.trained_model_object.predict(transformed_feature)
+            flat_forest = self._get_flat_forest(len(transformed_feature))
+            if flat_forest is not None:
+                predictions = flat_forest.predict(transformed_feature, n_jobs=self.inference_n_jobs,
+                                                  chunk_rows=self.inference_chunk_rows)
+            else:
+                predictions = self.trained_model_object.predict(transformed_feature)
 
             return predictions
 
@@ -48,6 +97,169 @@ class MyModel:
             raise MyException(e, sys) from e
 
 
+    def _compile_fast_path(self) -> dict:
+        """
+        Precomputes everything the fast path needs from the fitted pipeline: the feature engineering step,
+        the column order produced by the ColumnTransformer and one (subtract, divide, multiply, add)
+        coefficient per output column. StandardScaler columns use (x - mean) / scale and MinMaxScaler
+        columns x * scale + min, the same floating point operations sklearn applies, in the dtype of the engineered
+        features like sklearn does, so results are identical.
+        """
+        from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+        from sklearn.preprocessing import StandardScaler, MinMaxScaler, FunctionTransformer
+
+        steps = dict(self.preprocessing_object.steps)
+        column_transformer = steps["preprocessor"]
+        input_columns = list(column_transformer.feature_names_in_)
+
+        order, subtract, divide, multiply, add = [], [], [], [], []
+        for name, transformer, columns in column_transformer.transformers_:
+            if transformer == "drop" or len(columns) == 0:
+                continue
+            indices = [input_columns.index(column) if isinstance(column, str) else int(column) for column in columns]
+            size = len(indices)
+            order.extend(indices)
+            if isinstance(transformer, StandardScaler):
+                subtract.append(transformer.mean_ if transformer.mean_ is not None else np.zeros(size))
+                divide.append(transformer.scale_ if transformer.scale_ is not None else np.ones(size))
+                multiply.append(np.ones(size))
+                add.append(np.zeros(size))
+            elif isinstance(transformer, MinMaxScaler):
+                subtract.append(np.zeros(size))
+                divide.append(np.ones(size))
+                multiply.append(transformer.scale_)
+                add.append(transformer.min_)
+            elif transformer == "passthrough" or (isinstance(transformer, FunctionTransformer) and transformer.func is None):
+                # A fitted ColumnTransformer holds its passthrough columns as an identity FunctionTransformer
+                subtract.append(np.zeros(size))
+                divide.append(np.ones(size))
+                multiply.append(np.ones(size))
+                add.append(np.zeros(size))
+            else:
+                raise TypeError(f"Transformer '{name}' of type {type(transformer).__name__} has no fast path")
+
+        model = self.trained_model_object
+        forest = isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)) and model.n_outputs_ == 1
+        # sklearn scales float32 features in float32, with the coefficients cast to float32
+        dtype = np.dtype(getattr(steps.get("feature_engineering"), "dtype", np.float64))
+        self._fast_path = {
+            "feature_engineering": steps.get("feature_engineering"),
+            "n_features": len(input_columns),
+            "order": np.asarray(order, dtype=np.intp),
+            "subtract": np.concatenate(subtract).astype(dtype),
+            "divide": np.concatenate(divide).astype(dtype),
+            "multiply": np.concatenate(multiply).astype(dtype),
+            "add": np.concatenate(add).astype(dtype),
+            "trees": [estimator.tree_ for estimator in model.estimators_] if forest else None,
+            "n_classes": int(model.n_classes_) if forest else None,
+            "flat_forest": FlatForest.from_forest(model) if forest and self._uses_flat_backend() else None,
+        }
+        return self._fast_path
+
+    def _uses_flat_backend(self) -> bool:
+        # Models pickled before the backends existed use sklearn
+        return getattr(self, "inference_backend", "sklearn") in ("flat", "auto")
+
+    def _get_flat_forest(self, n_rows: int):
+        """
+        Returns the FlatForest evaluating a batch of n_rows rows, None when the sklearn trees evaluate it
+        """
+        if not self._uses_flat_backend():
+            return None
+        if self.inference_backend == "auto" and n_rows > MODEL_INFERENCE_FLAT_MAX_ROWS and self.inference_n_jobs <= 1:
+            return None
+        return self._get_fast_path().get("flat_forest")
+
+    def _get_fast_path(self) -> dict:
+        # Models pickled before the fast path existed have no _fast_path attribute
+        fast_path = getattr(self, "_fast_path", None)
+        return fast_path if fast_path is not None else self._compile_fast_path()
+
+    @property
+    def feature_names(self) -> list:
+        """
+        Feature layout expected by predict_array: the columns produced by the feature engineering step
+        """
+        return list(dict(self.preprocessing_object.steps)["preprocessor"].feature_names_in_)
+
+    @property
+    def feature_engineering(self):
+        """
+        Feature engineering step of the preprocessing pipeline, producing the `feature_names` layout
+        """
+        return dict(self.preprocessing_object.steps).get("feature_engineering")
+
+    @property
+    def classes(self) -> np.ndarray:
+        """
+        Class labels, in the column order of predict_proba_array
+        """
+        return self.trained_model_object.classes_
+
+    def predict_proba_array(self, features: np.ndarray) -> np.ndarray:
+        """
+        Class probabilities of already engineered feature rows in the `feature_names` layout,
+        the probabilities `predict_array` takes the most likely class of
+        """
+        try:
+            scaled = scale_features(features, self._get_fast_path())
+            flat_forest = self._get_flat_forest(len(scaled))
+            if flat_forest is not None:
+                return flat_forest.predict_proba(scaled, n_jobs=self.inference_n_jobs, chunk_rows=self.inference_chunk_rows)
+            return self.trained_model_object.predict_proba(scaled)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def predict_array(self, features: np.ndarray) -> np.ndarray:
+        """
+        Fast path for low-latency scoring. Accepts one row or a 2D array of already engineered features
+        in the `feature_names` layout, applies the scaling coefficients as plain array arithmetic and
+        evaluates the forest on a contiguous float32 array. No DataFrame is built and nothing is logged.
+        Returns the same predictions as `predict`.
+        """
+        try:
+            fast_path = self._get_fast_path()
+            scaled = scale_features(features, fast_path)
+
+            model = self.trained_model_object
+            flat_forest = self._get_flat_forest(len(scaled))
+            if flat_forest is not None:
+                return flat_forest.predict(scaled, n_jobs=self.inference_n_jobs, chunk_rows=self.inference_chunk_rows)
+            if fast_path["trees"] is None:
+                return model.predict(scaled)
+
+            # Same accumulation order as RandomForestClassifier.predict_proba, so ties resolve identically
+            proba = np.zeros((scaled.shape[0], fast_path["n_classes"]), dtype=np.float64)
+            for tree in fast_path["trees"]:
+                proba += tree.predict(scaled)[:, :fast_path["n_classes"]]
+            proba /= len(fast_path["trees"])
+            return model.classes_.take(np.argmax(proba, axis=1), axis=0)
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def predict_records(self, records: list) -> np.ndarray:
+        """
+        Fast path for a batch of raw records given as plain dicts with the schema columns.
+        Returns the same predictions as `predict` on a DataFrame of the records.
+        """
+        try:
+            feature_engineering = self._get_fast_path()["feature_engineering"]
+            return self.predict_array(np.vstack([feature_engineering.transform_record(record) for record in records]))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def predict_record(self, record: dict):
+        """
+        Fast path for a single raw record given as a plain dict with the schema columns.
+        Returns the prediction of the record, the same value `predict` returns for it.
+        """
+        try:
+            feature_engineering = self._get_fast_path()["feature_engineering"]
+            return self.predict_array(feature_engineering.transform_record(record))[0]
+        except Exception as e:
+            raise MyException(e, sys) from e
+
     def __repr__(self):
         return f"{type(self.trained_model_object).__name__}()"
 
@@ -0,0 +1,150 @@
+import sys
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.exception import MyException
+
+class VehicleFeatureEncoder:
+    """
+    Feature engineering of the served models, without sklearn.
+
+    It maps Gender to 0/1, drops the id columns, one-hot encodes the dummy columns with the first category
+    dropped and renames the dummy columns, writing everything into a single preallocated array. The fitted
+    state round-trips through `to_dict`, so a packed model restores it with numpy and pandas only; the
+    sklearn transformer of the preprocessing Pipeline is VehicleFeatureEngineer.
+    """
+
+    def __init__(self, gender_column: str = "Gender", gender_mapping: Optional[dict] = None,
+                 dummy_columns: Optional[list] = None, categories: Optional[dict] = None,
+                 drop_columns: Optional[list] = None, rename_columns: Optional[dict] = None, dtype=np.float64):
+        """
+        :param gender_column: column mapped through gender_mapping, unknown values become NaN
+        :param gender_mapping: value of every gender category
+        :param dummy_columns: columns one-hot encoded with the first category dropped
+        :param categories: fixed categories of the dummy columns, learned from the fit data when not given
+        :param drop_columns: columns removed from the input
+        :param rename_columns: output column names to replace
+        :param dtype: dtype of the output features
+        """
+        self.gender_column = gender_column
+        self.gender_mapping = gender_mapping
+        self.dummy_columns = dummy_columns
+        self.categories = categories
+        self.drop_columns = drop_columns
+        self.rename_columns = rename_columns
+        self.dtype = dtype
+
+    def fit(self, X: DataFrame, y=None) -> "VehicleFeatureEncoder":
+        try:
+            drop_columns = set(self.drop_columns or [])
+            dummy_columns = list(self.dummy_columns or [])
+            self.feature_names_in_ = np.asarray([column for column in X.columns if column not in drop_columns], dtype=object)
+            self.n_features_in_ = len(self.feature_names_in_)
+
+            # Dummy columns follow get_dummies ordering: sorted categories, appended after the other columns
+            self.categories_ = {}
+            for column in dummy_columns:
+                if self.categories is not None and column in self.categories:
+                    self.categories_[column] = sorted(self.categories[column])
+                else:
+                    self.categories_[column] = sorted(X[column].dropna().unique().tolist())
+
+            self.passthrough_columns_ = [column for column in self.feature_names_in_ if column not in self.categories_]
+            dummy_names = [f"{column}_{category}" for column in self.feature_names_in_ if column in self.categories_
+                           for category in self.categories_[column][1:]]
+            rename_columns = self.rename_columns or {}
+            self.feature_names_out_ = np.asarray([rename_columns.get(name, name)
+                                                  for name in self.passthrough_columns_ + dummy_names], dtype=object)
+            return self
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def _encode_gender(self, series: pd.Series) -> np.ndarray:
+        categories = list(self.gender_mapping)
+        codes = pd.Categorical(series, categories=categories).codes
+        values = np.append(np.asarray([self.gender_mapping[category] for category in categories], dtype=self.dtype), np.nan)
+        # Code -1 (unknown or missing) picks the trailing NaN
+        return values[codes]
+
+    def transform(self, X: DataFrame) -> DataFrame:
+        try:
+            # Column-major, so every feature is written to contiguous memory
+            output = np.empty((len(X), len(self.feature_names_out_)), dtype=self.dtype, order="F")
+            position = 0
+            for column in self.passthrough_columns_:
+                if self.gender_mapping is not None and column == self.gender_column:
+                    output[:, position] = self._encode_gender(X[column])
+                else:
+                    output[:, position] = X[column].to_numpy(dtype=self.dtype, na_value=np.nan)
+                position += 1
+            for column in self.feature_names_in_:
+                if column not in self.categories_:
+                    continue
+                codes = pd.Categorical(X[column], categories=self.categories_[column]).codes
+                for code in range(1, len(self.categories_[column])):
+                    np.equal(codes, code, out=output[:, position], casting="unsafe")
+                    position += 1
+            return pd.DataFrame(output, columns=self.feature_names_out_, index=X.index, copy=False)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def transform_record(self, record: dict) -> np.ndarray:
+        """
+        Transforms a single record given as a plain dict into one feature row, without building a DataFrame.
+        Gives the same values as `transform` on a one-row DataFrame.
+        """
+        try:
+            output = np.empty(len(self.feature_names_out_), dtype=self.dtype)
+            position = 0
+            for column in self.passthrough_columns_:
+                value = record[column]
+                if self.gender_mapping is not None and column == self.gender_column:
+                    output[position] = self.gender_mapping.get(value, np.nan)
+                else:
+                    output[position] = np.nan if value is None else value
+                position += 1
+            for column in self.feature_names_in_:
+                if column not in self.categories_:
+                    continue
+                value = record[column]
+                for category in self.categories_[column][1:]:
+                    output[position] = value == category
+                    position += 1
+            return output
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def to_dict(self) -> dict:
+        """
+        Returns the parameters and the fitted state as plain JSON-serializable values
+        """
+        return {
+            "params": {"gender_column": self.gender_column, "gender_mapping": self.gender_mapping,
+                       "dummy_columns": self.dummy_columns, "categories": self.categories,
+                       "drop_columns": self.drop_columns, "rename_columns": self.rename_columns,
+                       "dtype": np.dtype(self.dtype).str},
+            "feature_names_in": self.feature_names_in_.tolist(),
+            "categories": self.categories_,
+            "passthrough_columns": self.passthrough_columns_,
+            "feature_names_out": self.feature_names_out_.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "VehicleFeatureEncoder":
+        """
+        Restores a fitted transformer from the content of `to_dict`
+        """
+        params = dict(content["params"], dtype=np.dtype(content["params"]["dtype"]).type)
+        transformer = cls(**params)
+        transformer.feature_names_in_ = np.asarray(content["feature_names_in"], dtype=object)
+        transformer.n_features_in_ = len(transformer.feature_names_in_)
+        transformer.categories_ = content["categories"]
+        transformer.passthrough_columns_ = content["passthrough_columns"]
+        transformer.feature_names_out_ = np.asarray(content["feature_names_out"], dtype=object)
+        return transformer
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return self.feature_names_out_
@@ -0,0 +1,32 @@
+import numpy as np
+
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from src.entity.feature_encoder import VehicleFeatureEncoder
+
+class VehicleFeatureEngineer(VehicleFeatureEncoder, TransformerMixin, BaseEstimator):
+    """
+    Fused feature-engineering step of the preprocessing Pipeline.
+
+    In one pass it maps Gender to 0/1, drops the id columns, one-hot encodes the dummy columns with the
+    first category dropped and renames the dummy columns, writing everything into a single preallocated
+    array. The output layout is the one `pd.get_dummies(drop_first=True)` produced on the training data,
+    but it is fixed at fit time: categories missing from a batch still get their (all zero) column and
+    unknown categories encode as all zeros. The encoding itself is VehicleFeatureEncoder, this class adds the
+    sklearn estimator interface.
+    """
+
+    @classmethod
+    def from_schema(cls, schema_config: dict, **kwargs) -> "VehicleFeatureEngineer":
+        """
+        Creates the transformer from the feature engineering sections of schema.yaml
+        """
+        drop_columns = schema_config["drop_columns"]
+        allowed_categories = schema_config.get("allowed_categories", {})
+        return cls(gender_mapping=schema_config["gender_mapping"],
+                   dummy_columns=schema_config["dummy_columns"],
+                   categories={column: allowed_categories[column] for column in schema_config["dummy_columns"]
+                               if column in allowed_categories} or None,
+                   drop_columns=[drop_columns, "id"] if isinstance(drop_columns, str) else list(drop_columns) + ["id"],
+                   rename_columns=schema_config.get("rename_columns"),
+                   **{"dtype": np.dtype(schema_config.get("feature_dtype", "float64")).type, **kwargs})
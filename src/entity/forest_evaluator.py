@@ -0,0 +1,164 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from src.constants import MODEL_INFERENCE_N_JOBS, MODEL_INFERENCE_CHUNK_ROWS
+from src.exception import MyException
+
+TREE_LEAF = -1
+
+# Thread pool shared by every FlatForest, created on first use so forests stay picklable
+_evaluator_pool: Optional[ThreadPoolExecutor] = None
+_evaluator_pool_size: int = 0
+_evaluator_pool_lock = threading.Lock()
+
+def _get_evaluator_pool(n_jobs: int) -> ThreadPoolExecutor:
+    global _evaluator_pool, _evaluator_pool_size
+    with _evaluator_pool_lock:
+        if _evaluator_pool is None or _evaluator_pool_size < n_jobs:
+            # A smaller pool may already have been handed to callers, so it is not shut down: once they release
+            # it, it is garbage collected and its idle threads exit
+            _evaluator_pool = ThreadPoolExecutor(max_workers=n_jobs, thread_name_prefix="forest-evaluator")
+            _evaluator_pool_size = n_jobs
+        return _evaluator_pool
+
+
+def _round_down_to_float32(threshold: np.ndarray) -> np.ndarray:
+    # Largest float32 <= threshold: for a float32 x, x <= float64 threshold exactly when x <= this value
+    rounded = threshold.astype(np.float32)
+    above = rounded.astype(np.float64) > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+class FlatForest:
+    """
+    Random forest compiled into one flat node table and evaluated level by level.
+
+    The nodes of all trees are concatenated with global indices and the two children of node i are stored
+    at children[2 * i] (right) and children[2 * i + 1] (left), so a step down every tree for every row is a
+    few gathers over the whole batch: feature, threshold, then children[2 * node + (x <= threshold)].
+    Leaves point to themselves, so the number of steps is the depth of the deepest tree whatever the path.
+    Thresholds are stored as the largest float32 below the float64 sklearn threshold, which gives the same
+    decisions on float32 inputs, and the leaf class fractions are summed in tree order like
+    RandomForestClassifier.predict_proba, so the probabilities are bit for bit identical.
+    """
+
+    ARRAY_NAMES = ("children", "feature", "threshold", "missing_go_to_left", "value", "roots", "classes")
+
+    def __init__(self, children: np.ndarray, feature: np.ndarray, threshold: np.ndarray,
+                 missing_go_to_left: np.ndarray, value: np.ndarray, roots: np.ndarray, classes: np.ndarray,
+                 max_depth: int):
+        """
+        :param children: global index of the right then left child of every node, the node itself for leaves
+        :param feature: feature tested by every node, 0 for leaves
+        :param threshold: float32 threshold of every node, a row goes left when its value is <= threshold
+        :param missing_go_to_left: 1 for the nodes sending missing values to the left child
+        :param value: class fractions of every node, shape (n_nodes, n_classes)
+        :param roots: global index of the root of every tree
+        :param classes: class labels
+        :param max_depth: depth of the deepest tree
+        """
+        self.children = children
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_go_to_left = missing_go_to_left
+        self.value = value
+        self.roots = roots
+        self.classes = classes
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_forest(cls, model) -> "FlatForest":
+        """
+        Compiles a fitted single-output RandomForestClassifier
+        """
+        try:
+            trees = [estimator.tree_ for estimator in model.estimators_]
+            n_classes = int(model.n_classes_)
+            offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+            children, leaves, missing_go_to_left = [], [], []
+            for tree, offset in zip(trees, offsets):
+                nodes = np.arange(tree.node_count) + offset
+                leaf = tree.children_left == TREE_LEAF
+                children.append(np.stack([np.where(leaf, nodes, tree.children_right + offset),
+                                          np.where(leaf, nodes, tree.children_left + offset)], axis=1).ravel())
+                leaves.append(leaf)
+                missing_go_to_left.append(getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8)))
+            leaf = np.concatenate(leaves)
+
+            return cls(children=np.concatenate(children).astype(np.intp),
+                       feature=np.where(leaf, 0, np.concatenate([tree.feature for tree in trees])).astype(np.intp),
+                       threshold=_round_down_to_float32(np.concatenate([tree.threshold for tree in trees])),
+                       missing_go_to_left=np.where(leaf, 0, np.concatenate(missing_go_to_left)).astype(np.uint8),
+                       # Class fractions, the values DecisionTreeClassifier.predict_proba returns for a leaf
+                       value=np.ascontiguousarray(np.concatenate([tree.value[:, 0, :n_classes] for tree in trees]),
+                                                  dtype=np.float64),
+                       roots=offsets[:-1].astype(np.intp),
+                       classes=np.asarray(model.classes_),
+                       max_depth=max(tree.max_depth for tree in trees))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def to_arrays(self) -> dict:
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    def _predict_proba_chunk(self, features: np.ndarray) -> np.ndarray:
+        n_rows, n_features = features.shape
+        n_trees = len(self.roots)
+        flat_features = features.ravel()
+        has_missing = bool(np.isnan(flat_features).any())
+
+        # One row per tree: node[t, i] is the current node of row i in tree t
+        node = np.repeat(np.asarray(self.roots, dtype=np.intp)[:, np.newaxis], n_rows, axis=1)
+        row_start = (np.arange(n_rows, dtype=np.intp) * n_features)[np.newaxis, :]
+        index = np.empty_like(node)
+        values = np.empty(node.shape, dtype=np.float32)
+        thresholds = np.empty(node.shape, dtype=np.float32)
+        go_left = np.empty(node.shape, dtype=bool)
+        for _ in range(self.max_depth):
+            np.take(self.feature, node, out=index)
+            index += row_start
+            np.take(flat_features, index, out=values)
+            np.take(self.threshold, node, out=thresholds)
+            np.less_equal(values, thresholds, out=go_left)
+            if has_missing:
+                go_left |= np.isnan(values) & self.missing_go_to_left.take(node).astype(bool)
+            node *= 2
+            node += go_left
+            np.take(self.children, node, out=node)
+
+        # Leaf fractions summed tree after tree, the order RandomForestClassifier sums them in
+        proba = np.zeros((n_rows, self.value.shape[1]))
+        for tree_nodes in node:
+            proba += self.value.take(tree_nodes, axis=0)
+        proba /= n_trees
+        return proba
+
+    def predict_proba(self, features: np.ndarray, n_jobs: int = MODEL_INFERENCE_N_JOBS,
+                      chunk_rows: int = MODEL_INFERENCE_CHUNK_ROWS) -> np.ndarray:
+        """
+        Class probabilities of float32 rows. Batches larger than chunk_rows are split into chunks,
+        evaluated on a thread pool of n_jobs threads when n_jobs > 1.
+        """
+        try:
+            features = np.ascontiguousarray(features, dtype=np.float32)
+            if features.shape[0] <= chunk_rows:
+                return self._predict_proba_chunk(features)
+            chunks = [features[start:start + chunk_rows] for start in range(0, features.shape[0], chunk_rows)]
+            if n_jobs > 1:
+                return np.concatenate(list(_get_evaluator_pool(n_jobs).map(self._predict_proba_chunk, chunks)))
+            return np.concatenate([self._predict_proba_chunk(chunk) for chunk in chunks])
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def predict(self, features: np.ndarray, n_jobs: int = MODEL_INFERENCE_N_JOBS,
+                chunk_rows: int = MODEL_INFERENCE_CHUNK_ROWS) -> np.ndarray:
+        """
+        Class labels of float32 rows, same as RandomForestClassifier.predict
+        """
+        proba = self.predict_proba(features, n_jobs=n_jobs, chunk_rows=chunk_rows)
+        return self.classes.take(np.argmax(proba, axis=1), axis=0)
@@ -0,0 +1,200 @@
+import importlib
+import itertools
+import math
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+from src.exception import MyException
+from src.logger import logging
+from src.utils.main_utils import read_yaml_file
+
+# Rows of the shuffled training features written at once to the file shared by the workers
+SEARCH_DATA_CHUNK_ROWS = 100_000
+SCORERS = {"f1": f1_score, "precision": precision_score, "recall": recall_score, "accuracy": accuracy_score}
+
+@dataclass
+class ModelCandidate:
+    name: str
+    class_path: str
+    params: dict
+
+    def create(self) -> object:
+        module_name, class_name = self.class_path.rsplit(".", 1)
+        return getattr(importlib.import_module(module_name), class_name)(**self.params)
+
+    def __str__(self):
+        return f"{self.name} {self.params}"
+
+@dataclass
+class ModelSearchResult:
+    best_model: object
+    best_candidate: ModelCandidate
+    # None when a single candidate is configured, it is fitted without being scored
+    best_score: Optional[float]
+    # One entry per candidate and rung: candidate, params, rung, n_samples, score, fit_time_s
+    leaderboard: list = field(default_factory=list)
+
+
+def read_model_config(file_path: str) -> dict:
+    """
+    Returns the content of the model config file, empty when the file is missing or empty
+    """
+    if not os.path.exists(file_path):
+        return {}
+    return read_yaml_file(file_path=file_path) or {}
+
+
+def _evaluate_candidate(candidate: ModelCandidate, data_dir: str, n_samples: int, scoring: str,
+                        return_model: bool) -> dict:
+    """
+    Fits a candidate on the first n_samples training rows of the memory-mapped data and scores it on the
+    validation rows. Runs in a worker process: the rows of a rung are a contiguous prefix of the mapped
+    features, a view sharing the pages of the file instead of a private copy.
+    """
+    def load(name: str) -> np.ndarray:
+        return np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+
+    model = candidate.create()
+    start = time.perf_counter()
+    model.fit(load("X_train")[:n_samples], load("y_train")[:n_samples])
+    fit_time = time.perf_counter() - start
+    score = SCORERS[scoring](load("y_validation"), model.predict(load("X_validation")))
+    return {"score": float(score), "fit_time_s": fit_time, "model": model if return_model else None}
+
+
+class ModelSearch:
+    """
+    Successive halving search over the candidates of config/model.yaml.
+
+    All candidates are fitted on a small sample of the training rows and scored on the validation rows;
+    only the best 1 / halving_factor go on to the next rung, fitted on halving_factor times more rows,
+    until the survivors are fitted on all the training rows, so the winner needs no refit. The validation
+    rows are held out by the data transformation before the resampling (see validation_fraction): scores
+    are measured on real rows, which SMOTEENN neither synthesized nor cleaned. Fits run in a pool of worker
+    processes that read the arrays from memory-mapped .npy files, so the workers share their pages instead
+    of receiving a pickled copy each. A single candidate is fitted on all the training rows without a search.
+    """
+
+    def __init__(self, model_config: dict):
+        """
+        :param model_config: content of config/model.yaml
+        """
+        settings = model_config.get("model_search") or {}
+        self.scoring = settings.get("scoring", "f1")
+        self.validation_fraction = float(settings.get("validation_fraction", 0.2))
+        self.halving_factor = int(settings.get("halving_factor", 3))
+        self.min_resources = int(settings.get("min_resources", 5000))
+        self.n_workers = int(settings.get("n_workers", 1))
+        self.random_state = settings.get("random_state")
+        self.candidates = self.get_candidates(model_config.get("candidates") or {})
+        # Fraction of the training rows the data transformation holds out to score the candidates, none is
+        # needed without several candidates to compare
+        if len(self.candidates) < 2:
+            self.validation_fraction = 0.0
+        if self.scoring not in SCORERS:
+            raise ValueError(f"Unknown scoring '{self.scoring}', expected one of {list(SCORERS)}")
+
+    @staticmethod
+    def get_candidates(candidates_config: dict) -> list:
+        """
+        Expands the grid of every configured estimator into one candidate per combination of values
+        """
+        candidates = []
+        for name, candidate_config in candidates_config.items():
+            grid = candidate_config.get("grid") or {}
+            for values in itertools.product(*grid.values()):
+                params = {**(candidate_config.get("params") or {}), **dict(zip(grid.keys(), values))}
+                candidates.append(ModelCandidate(name=name, class_path=candidate_config["class"], params=params))
+        return candidates
+
+    def _get_rungs(self, n_train: int) -> list:
+        """
+        Returns the number of training rows of every rung, the last one using all of them
+        """
+        n_rungs = 1 + math.ceil(math.log(len(self.candidates), self.halving_factor)) if len(self.candidates) > 1 else 1
+        rungs = [min(n_train, self.min_resources * self.halving_factor ** rung) for rung in range(n_rungs - 1)]
+        return sorted(set(rung for rung in rungs if rung < n_train)) + [n_train]
+
+    def _save_search_data(self, directory: str, train_arr: np.ndarray, validation_arr: np.ndarray) -> None:
+        """
+        Writes the features and the target of the training rows, in the order of one shuffle, and of the
+        validation rows to separate .npy files. Rungs use growing prefixes of the shuffle, so every sample
+        contains the previous one and is a contiguous slice of the features.
+        """
+        permutation = np.random.RandomState(self.random_state).permutation(len(train_arr))
+        X_train = np.lib.format.open_memmap(os.path.join(directory, "X_train.npy"), mode="w+", dtype=train_arr.dtype,
+                                            shape=(len(train_arr), train_arr.shape[1] - 1))
+        # Written in chunks, so the shuffled copy is never held in memory
+        for start in range(0, len(permutation), SEARCH_DATA_CHUNK_ROWS):
+            X_train[start:start + SEARCH_DATA_CHUNK_ROWS] = train_arr[permutation[start:start + SEARCH_DATA_CHUNK_ROWS], :-1]
+        X_train.flush()
+        del X_train
+        np.save(os.path.join(directory, "y_train.npy"), train_arr[permutation, -1])
+        np.save(os.path.join(directory, "X_validation.npy"), validation_arr[:, :-1])
+        np.save(os.path.join(directory, "y_validation.npy"), validation_arr[:, -1])
+
+    def _fit_single_candidate(self, train_arr: np.ndarray) -> ModelSearchResult:
+        candidate = self.candidates[0]
+        logging.info(f"Fitting the only model candidate {candidate} on {len(train_arr)} rows")
+        model = candidate.create()
+        start = time.perf_counter()
+        model.fit(train_arr[:, :-1], train_arr[:, -1])
+        fit_time = time.perf_counter() - start
+        leaderboard = [{"candidate": candidate.name, "params": candidate.params, "rung": 0,
+                        "n_samples": len(train_arr), "score": None, "fit_time_s": round(fit_time, 3)}]
+        return ModelSearchResult(best_model=model, best_candidate=candidate, best_score=None, leaderboard=leaderboard)
+
+    def search(self, train_arr: np.ndarray, validation_arr: Optional[np.ndarray] = None) -> ModelSearchResult:
+        """
+        Runs the search on the training array (features then target in the last column), scoring the candidates
+        on the validation array of the same layout, and returns the best model fitted on all the training rows
+        with the leaderboard
+        """
+        try:
+            if not self.candidates:
+                raise Exception("No model candidates configured")
+            if len(self.candidates) == 1:
+                return self._fit_single_candidate(train_arr)
+            if validation_arr is None or len(validation_arr) == 0:
+                raise Exception("The model search needs validation rows held out before the resampling")
+            rungs = self._get_rungs(len(train_arr))
+            logging.info(f"Model search over {len(self.candidates)} candidates with rungs of {rungs} rows")
+
+            leaderboard = []
+            survivors = list(range(len(self.candidates)))
+            with tempfile.TemporaryDirectory() as directory:
+                self._save_search_data(directory, train_arr, validation_arr)
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=max(1, self.n_workers), mp_context=context) as executor:
+                    for rung, n_samples in enumerate(rungs):
+                        last_rung = rung == len(rungs) - 1
+                        futures = {index: executor.submit(_evaluate_candidate, self.candidates[index], directory,
+                                                          n_samples, self.scoring, last_rung)
+                                   for index in survivors}
+                        results = {index: future.result() for index, future in futures.items()}
+                        for index, result in results.items():
+                            candidate = self.candidates[index]
+                            leaderboard.append({"candidate": candidate.name, "params": candidate.params, "rung": rung,
+                                                "n_samples": int(n_samples), "score": round(result["score"], 6),
+                                                "fit_time_s": round(result["fit_time_s"], 3)})
+                        survivors = sorted(survivors, key=lambda index: results[index]["score"], reverse=True)
+                        logging.info(f"Rung {rung} on {n_samples} rows: best {self.scoring} "
+                                     f"{results[survivors[0]]['score']:.4f} ({self.candidates[survivors[0]]})")
+                        if not last_rung:
+                            survivors = survivors[:max(1, math.ceil(len(survivors) / self.halving_factor))]
+
+            best = survivors[0]
+            leaderboard.sort(key=lambda entry: (-entry["rung"], -entry["score"]))
+            return ModelSearchResult(best_model=results[best]["model"], best_candidate=self.candidates[best],
+                                     best_score=results[best]["score"], leaderboard=leaderboard)
+        except Exception as e:
+            raise MyException(e, sys) from e
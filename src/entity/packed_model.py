@@ -0,0 +1,180 @@
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+from pandas import DataFrame
+
+from src.constants import PACKED_MODEL_FILE_EXTENSION
+from src.entity.estimator import MyModel, scale_features
+from src.entity.feature_encoder import VehicleFeatureEncoder
+from src.entity.forest_evaluator import FlatForest
+from src.exception import MyException
+from src.utils.main_utils import load_object
+
+# File layout: magic, little-endian uint64 header length, JSON header, then every array 64-byte aligned
+PACKED_MODEL_MAGIC = b"VEHMODEL"
+PACKED_MODEL_FORMAT_VERSION = 2
+PACKED_MODEL_ALIGNMENT = 64
+
+def _aligned(offset: int) -> int:
+    return -(-offset // PACKED_MODEL_ALIGNMENT) * PACKED_MODEL_ALIGNMENT
+
+
+def save_packed_model(file_path: str, my_model: MyModel) -> None:
+    """
+    Saves a MyModel (feature engineering, ColumnTransformer scalers and RandomForestClassifier) as a packed file:
+    a JSON header with the feature engineering state followed by flat NumPy buffers with the scaling
+    coefficients and the FlatForest node table of all trees.
+    """
+    try:
+        fast_path = my_model._get_fast_path()
+        if fast_path["trees"] is None or fast_path["feature_engineering"] is None:
+            raise Exception(f"Model {my_model} can not be packed, only RandomForestClassifier or ExtraTreesClassifier models with "
+                            f"a feature engineering step are supported")
+        flat_forest = fast_path.get("flat_forest") or FlatForest.from_forest(my_model.trained_model_object)
+
+        arrays = {
+            "scaler_order": fast_path["order"].astype(np.int64),
+            "scaler_subtract": fast_path["subtract"],
+            "scaler_divide": fast_path["divide"],
+            "scaler_multiply": fast_path["multiply"],
+            "scaler_add": fast_path["add"],
+            **flat_forest.to_arrays()
+        }
+
+        header = {
+            "format_version": PACKED_MODEL_FORMAT_VERSION,
+            "model": repr(my_model),
+            "n_features": fast_path["n_features"],
+            "max_depth": flat_forest.max_depth,
+            "feature_engineering": fast_path["feature_engineering"].to_dict(),
+            "arrays": {}
+        }
+        # Array offsets depend on the header length, so the header is sized with generous offsets first
+        for name, array in arrays.items():
+            header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": 0}
+        header_size = len(json.dumps(header).encode()) + 32 * len(arrays)
+        offset = _aligned(len(PACKED_MODEL_MAGIC) + 8 + header_size)
+        for name, array in arrays.items():
+            header["arrays"][name]["offset"] = offset
+            offset = _aligned(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode().ljust(header_size)
+
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        temp_file_path = f"{file_path}.tmp"
+        with open(temp_file_path, "wb") as file_obj:
+            file_obj.write(PACKED_MODEL_MAGIC)
+            file_obj.write(struct.pack("<Q", header_size))
+            file_obj.write(header_bytes)
+            for name, array in arrays.items():
+                file_obj.seek(header["arrays"][name]["offset"])
+                file_obj.write(np.ascontiguousarray(array).tobytes())
+            file_obj.truncate(offset)
+        os.replace(temp_file_path, file_path)
+    except Exception as e:
+        raise MyException(e, sys) from e
+
+
+class PackedModel:
+    """
+    Read-only model loaded from a packed file.
+
+    The file is memory-mapped and every array is a view on the mapping, so loading does no unpickling and
+    no copy: worker processes serving the same file share its pages through the page cache. The forest is
+    evaluated by a FlatForest over the mapped node table, predictions are identical to MyModel.predict.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        :param file_path: packed model file written by save_packed_model
+        """
+        try:
+            self.file_path = file_path
+            self._buffer = np.memmap(file_path, dtype=np.uint8, mode="r")
+            if bytes(self._buffer[:len(PACKED_MODEL_MAGIC)]) != PACKED_MODEL_MAGIC:
+                raise Exception(f"{file_path} is not a packed model file")
+            start = len(PACKED_MODEL_MAGIC)
+            (header_size,) = struct.unpack("<Q", bytes(self._buffer[start:start + 8]))
+            self.header = json.loads(bytes(self._buffer[start + 8:start + 8 + header_size]))
+            if self.header["format_version"] != PACKED_MODEL_FORMAT_VERSION:
+                raise Exception(f"Unsupported packed model format version {self.header['format_version']}")
+
+            self.arrays = {}
+            for name, spec in self.header["arrays"].items():
+                dtype = np.dtype(spec["dtype"])
+                count = int(np.prod(spec["shape"]))
+                self.arrays[name] = np.frombuffer(self._buffer, dtype=dtype, count=count,
+                                                  offset=spec["offset"]).reshape(spec["shape"])
+
+            self.feature_engineering = VehicleFeatureEncoder.from_dict(self.header["feature_engineering"])
+            self.coefficients = {"n_features": self.header["n_features"], "order": self.arrays["scaler_order"],
+                                 "subtract": self.arrays["scaler_subtract"], "divide": self.arrays["scaler_divide"],
+                                 "multiply": self.arrays["scaler_multiply"], "add": self.arrays["scaler_add"]}
+            self.flat_forest = FlatForest(max_depth=self.header["max_depth"],
+                                          **{name: self.arrays[name] for name in FlatForest.ARRAY_NAMES})
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    @property
+    def feature_names(self) -> list:
+        return self.feature_engineering.feature_names_out_.tolist()
+
+    def predict_array(self, features: np.ndarray) -> np.ndarray:
+        """
+        Predictions of already engineered feature rows in the `feature_names` layout
+        """
+        try:
+            return self.flat_forest.predict(scale_features(features, self.coefficients))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    @property
+    def classes(self) -> np.ndarray:
+        return self.flat_forest.classes
+
+    def predict_proba_array(self, features: np.ndarray) -> np.ndarray:
+        """
+        Class probabilities of already engineered feature rows in the `feature_names` layout
+        """
+        try:
+            return self.flat_forest.predict_proba(scale_features(features, self.coefficients))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def predict_records(self, records: list) -> np.ndarray:
+        """
+        Predictions of raw records given as plain dicts with the schema columns
+        """
+        try:
+            return self.predict_array(np.vstack([self.feature_engineering.transform_record(record) for record in records]))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def predict_record(self, record: dict):
+        return self.predict_records([record])[0]
+
+    def predict(self, dataframe: DataFrame) -> np.ndarray:
+        """
+        Predictions of a DataFrame with the raw schema columns, same as MyModel.predict
+        """
+        try:
+            return self.predict_array(self.feature_engineering.transform(dataframe).to_numpy())
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def __repr__(self):
+        return f"PackedModel({self.header['model']})"
+
+    def __str__(self):
+        return self.__repr__()
+
+
+def load_model_file(file_path: str):
+    """
+    Loads a served model: a PackedModel for packed files, the pickled MyModel otherwise
+    """
+    if os.path.splitext(file_path)[1] == PACKED_MODEL_FILE_EXTENSION:
+        return PackedModel(file_path)
+    return load_object(file_path=file_path)
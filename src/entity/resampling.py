@@ -0,0 +1,105 @@
+import sys
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+from sklearn.utils import check_random_state
+
+from src.exception import MyException
+from src.logger import logging
+
+# imblearn is imported by the first resampling
+if TYPE_CHECKING:
+    from imblearn.combine import SMOTEENN
+
+class StratifiedSMOTEENN:
+    """
+    SMOTEENN(sampling_strategy="minority") with control over the cost of its neighbour searches.
+
+    The SMOTE and ENN neighbour searches run on n_jobs threads with the given NearestNeighbors algorithm
+    and the features are resampled as a single dtype (float32 by default) array, so no float64 copies are
+    made. When strata are given, the rows of every stratum are resampled on their own and the results are
+    concatenated: the searches and the intermediate arrays then scale with the largest stratum instead of
+    the whole training set, and every stratum ends up balanced like the global resampling does.
+    """
+
+    def __init__(self, n_jobs: Optional[int] = None, algorithm: str = "auto", dtype="float32",
+                 min_stratum_rows: int = 1000, random_state: Optional[int] = None,
+                 k_neighbors: int = 5, enn_n_neighbors: int = 3):
+        """
+        :param n_jobs: threads of the neighbour searches, -1 for all cores
+        :param algorithm: NearestNeighbors algorithm, "auto", "kd_tree", "ball_tree" or "brute"
+        :param dtype: dtype of the resampled features
+        :param min_stratum_rows: strata with fewer rows are pooled and resampled together
+        :param random_state: seed of the SMOTE interpolation
+        :param k_neighbors: neighbours used by SMOTE to create a synthetic sample
+        :param enn_n_neighbors: neighbours used by ENN to clean a sample
+        """
+        self.n_jobs = n_jobs
+        self.algorithm = algorithm
+        self.dtype = dtype
+        self.min_stratum_rows = min_stratum_rows
+        self.random_state = random_state
+        self.k_neighbors = k_neighbors
+        self.enn_n_neighbors = enn_n_neighbors
+
+    def _make_sampler(self, random_state) -> "SMOTEENN":
+        from imblearn.combine import SMOTEENN
+        from imblearn.over_sampling import SMOTE
+        from imblearn.under_sampling import EditedNearestNeighbours
+
+        # Same neighbour counts as the SMOTEENN defaults, which add the sample itself to the search
+        smote = SMOTE(sampling_strategy="minority", random_state=random_state,
+                      k_neighbors=NearestNeighbors(n_neighbors=self.k_neighbors + 1, algorithm=self.algorithm,
+                                                   n_jobs=self.n_jobs))
+        enn = EditedNearestNeighbours(sampling_strategy="all",
+                                      n_neighbors=NearestNeighbors(n_neighbors=self.enn_n_neighbors + 1,
+                                                                   algorithm=self.algorithm, n_jobs=self.n_jobs))
+        return SMOTEENN(sampling_strategy="minority", smote=smote, enn=enn, random_state=random_state)
+
+    def _get_groups(self, strata: Optional[np.ndarray], n_rows: int) -> list:
+        """
+        Returns the row indices of every group resampled together
+        """
+        if strata is None:
+            return [np.arange(n_rows)]
+        _, codes, counts = np.unique(np.asarray(strata), return_inverse=True, return_counts=True)
+        order = np.argsort(codes, kind="stable")
+        groups = np.split(order, np.cumsum(counts)[:-1])
+        large = [group for group in groups if len(group) >= self.min_stratum_rows]
+        small = [group for group in groups if len(group) < self.min_stratum_rows]
+        if small:
+            large.append(np.sort(np.concatenate(small)))
+        return large
+
+    def _can_resample(self, y: np.ndarray) -> bool:
+        _, counts = np.unique(y, return_counts=True)
+        return len(counts) > 1 and counts.min() > self.k_neighbors and len(y) > self.enn_n_neighbors
+
+    def fit_resample(self, X: np.ndarray, y: np.ndarray, strata: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Resamples X and y, separately for every value of strata when given.
+        Groups with too few minority rows for SMOTE are kept unchanged.
+        """
+        try:
+            X = np.asarray(X, dtype=self.dtype)
+            y = np.asarray(y)
+            groups = self._get_groups(strata, len(y))
+            seeds = check_random_state(self.random_state).randint(np.iinfo(np.int32).max, size=len(groups))
+            logging.info(f"Resampling {len(y)} rows in {len(groups)} group(s)")
+
+            resampled_X, resampled_y = [], []
+            for group, seed in zip(groups, seeds):
+                X_group, y_group = (X, y) if len(groups) == 1 else (X[group], y[group])
+                if self._can_resample(y_group):
+                    X_group, y_group = self._make_sampler(seed).fit_resample(X_group, y_group)
+                else:
+                    logging.info(f"Kept a group of {len(y_group)} rows unchanged, too few minority rows to resample")
+                resampled_X.append(X_group)
+                resampled_y.append(y_group)
+
+            if len(groups) == 1:
+                return resampled_X[0], resampled_y[0]
+            return np.concatenate(resampled_X), np.concatenate(resampled_y)
+        except Exception as e:
+            raise MyException(e, sys) from e
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from pandas import DataFrame
+
+from src.constants import MODEL_CACHE_DIR, MODEL_CACHE_MAX_FILES, MODEL_CACHE_MAX_IN_MEMORY
+from src.entity.estimator import MyModel
+from src.entity.packed_model import load_model_file
+from src.exception import MyException
+from src.logger import logging
+
+
+class Proj1Estimator:
+    """
+    This class is used to save and retrieve our model from the s3 bucket and to do prediction.
+
+    Downloaded models are cached on disk, one file per object version (ETag or VersionId), and the
+    deserialized MyModel objects are kept in a small in-memory LRU, so reloading a known version costs
+    neither a download nor a dill.load. A background refresher can poll the bucket for a new version and
+    swap the served model atomically: a prediction reads the current model once and finishes on it.
+    With a manifest path, the version of the model is read from the manifest written by ModelPusher, so a
+    poll never sees a model whose push has not completed.
+    """
+
+    def __init__(self, bucket_name: str, model_path: str, storage=None, cache_dir: str = MODEL_CACHE_DIR,
+                 max_cached_files: int = MODEL_CACHE_MAX_FILES, max_models_in_memory: int = MODEL_CACHE_MAX_IN_MEMORY,
+                 manifest_path: Optional[str] = None):
+        """
+        :param bucket_name: Your model bucket name
+        :param model_path: Location of your model in bucket
+        :param storage: SimpleStorageService by default, or any object with the same interface such as LocalStorageService
+        :param cache_dir: directory of the local model files
+        :param max_cached_files: number of model files kept in cache_dir
+        :param max_models_in_memory: number of deserialized models kept in memory
+        :param manifest_path: location of the manifest of the model registry in the bucket, the model object
+                              is checked directly when it is not set or holds no entry for model_path
+        """
+        self.bucket_name = bucket_name
+        self.model_path = model_path
+        if storage is None:
+            # boto3 is only imported when the model is served from S3
+            from src.cloud_storage.aws_storage import SimpleStorageService
+            storage = SimpleStorageService()
+        self.s3 = storage
+        self.cache_dir = cache_dir
+        self.max_cached_files = max_cached_files
+        self.max_models_in_memory = max_models_in_memory
+        self.manifest_path = manifest_path
+        self._models: "OrderedDict[str, MyModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        # (version, model) pair of the served model, replaced as a whole so readers never see a mix
+        self._current: tuple = (None, None)
+        self._refresher: Optional[threading.Thread] = None
+        self._stop_refresher = threading.Event()
+
+    @property
+    def loaded_model(self) -> Optional[MyModel]:
+        return self._current[1]
+
+    @property
+    def loaded_version(self) -> Optional[str]:
+        return self._current[0]
+
+    def is_model_present(self, model_path: str) -> bool:
+        try:
+            return self.s3.s3_key_path_available(bucket_name=self.bucket_name, s3_key=model_path)
+        except MyException as e:
+            logging.info(e)
+            return False
+
+    def read_manifest(self) -> Optional[dict]:
+        """
+        Returns the manifest of the model registry, None when there is none
+        """
+        content = self.s3.read_object(bucket_name=self.bucket_name, s3_key=self.manifest_path)
+        return None if content is None else json.loads(content)
+
+    def get_model_version(self) -> Optional[str]:
+        """
+        Returns the version token of the model object in the bucket, None if there is no model
+        """
+        if self.manifest_path is not None:
+            entry = (self.read_manifest() or {}).get("objects", {}).get(self.model_path)
+            if entry is not None:
+                return entry["version"]
+        return self.s3.get_object_version(bucket_name=self.bucket_name, s3_key=self.model_path)
+
+    def _cache_file_path(self, version: str) -> str:
+        digest = hashlib.sha256(f"{self.bucket_name}/{self.model_path}@{version}".encode()).hexdigest()[:32]
+        # The extension of the bucket object is kept, it tells a packed model from a pickled one
+        return os.path.join(self.cache_dir, digest + os.path.splitext(self.model_path)[1])
+
+    def _prune_cache_dir(self) -> None:
+        """
+        Removes the least recently used model files beyond max_cached_files
+        """
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if not name.endswith(".tmp")]
+        for file_path in sorted(files, key=os.path.getmtime)[:-self.max_cached_files]:
+            os.remove(file_path)
+            logging.info(f"Removed cached model file {file_path}")
+
+    def load_model(self, version: Optional[str] = None):
+        """
+        Load the model of a version (the current one by default): from memory, else from the local cache,
+        else downloaded from the bucket into the local cache
+        :return: MyModel, or PackedModel when the bucket object is a packed model file
+        """
+        try:
+            version = version or self.get_model_version()
+            if version is None:
+                raise Exception(f"Model s3://{self.bucket_name}/{self.model_path} is not available")
+
+            with self._lock:
+                if version in self._models:
+                    self._models.move_to_end(version)
+                    return self._models[version]
+
+            cache_file_path = self._cache_file_path(version)
+            if os.path.exists(cache_file_path):
+                logging.info(f"Loading model version {version} from the local cache {cache_file_path}")
+                os.utime(cache_file_path)
+            else:
+                self.s3.download_file(bucket_name=self.bucket_name, s3_key=self.model_path,
+                                      file_path=cache_file_path, version=version)
+                self._prune_cache_dir()
+            model = load_model_file(file_path=cache_file_path)
+
+            with self._lock:
+                self._models[version] = model
+                self._models.move_to_end(version)
+                while len(self._models) > self.max_models_in_memory:
+                    self._models.popitem(last=False)
+            return model
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def refresh(self) -> bool:
+        """
+        Loads the current model version of the bucket if it is not the served one and swaps it in.
+        Returns True when the served model changed.
+        """
+        try:
+            version = self.get_model_version()
+            if version is None or version == self.loaded_version:
+                return False
+            # The new model is fully loaded before the swap, predictions keep using the old one meanwhile
+            model = self.load_model(version)
+            self._current = (version, model)
+            logging.info(f"Serving model version {version} of s3://{self.bucket_name}/{self.model_path}")
+            return True
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def _refresh_loop(self, interval: float) -> None:
+        while not self._stop_refresher.wait(interval):
+            try:
+                self.refresh()
+            except Exception:
+                # A failed refresh keeps serving the current model and is retried on the next tick
+                logging.exception("Model refresh failed")
+
+    def start_refresher(self, interval: float) -> None:
+        """
+        Starts a daemon thread checking the bucket for a new model version every interval seconds
+        """
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stop_refresher.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(interval,), name="model-refresher", daemon=True)
+        self._refresher.start()
+        logging.info(f"Model refresher started, checking every {interval}s")
+
+    def stop_refresher(self) -> None:
+        self._stop_refresher.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+
+    def save_model(self, from_file: str, remove: bool = False) -> None:
+        """
+        Save the model to the model_path
+        :param from_file: Your local system model path
+        :param remove: By default it is false that mean you will have your model locally available in your system folder
+        :return:
+        """
+        try:
+            self.s3.upload_file(from_file, to_filename=self.model_path, bucket_name=self.bucket_name, remove=remove)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def predict(self, dataframe: DataFrame):
+        """
+        :param dataframe:
+        :return:
+        """
+        try:
+            if self.loaded_model is None:
+                self.refresh()
+            model = self.loaded_model
+            return model.predict(dataframe=dataframe)
+        except Exception as e:
+            raise MyException(e, sys) from e
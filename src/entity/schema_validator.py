@@ -0,0 +1,136 @@
+import sys
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.exception import MyException
+
+class SchemaValidator:
+    """
+    Validation engine compiled from schema.yaml.
+
+    Checks the dtypes, the allowed categories, the numeric bounds and the null ratios of every schema
+    column with vectorized operations. The counters accumulate across calls of `update`, so a dataset
+    can be validated in one pass over a DataFrame or chunk by chunk while it is streamed.
+    """
+
+    def __init__(self, schema_config: dict):
+        """
+        :param schema_config: parsed content of schema.yaml
+        """
+        try:
+            self.expected_dtypes = {name: dtype for column in schema_config["columns"] for name, dtype in column.items()}
+            self.required_columns = schema_config["numerical_columns"] + schema_config["categorical_columns"]
+            self.allowed_categories = {column: set(values) for column, values in
+                                       schema_config.get("allowed_categories", {}).items()}
+            self.numeric_bounds = schema_config.get("numeric_bounds", {})
+            self.max_null_ratio = schema_config.get("max_null_ratio", 1.0)
+            self.reset()
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def reset(self) -> None:
+        """
+        Clears the accumulated counters
+        """
+        self._rows = 0
+        self._stats = {}
+
+    @staticmethod
+    def _is_dtype_valid(series: pd.Series, expected_dtype: str) -> bool:
+        """
+        Checks a column against the dtype declared in the schema, whatever its width. Integer columns that
+        were read as float because of missing values are valid as long as every present value is integral.
+        """
+        if expected_dtype == "category":
+            return (isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(series.dtype)
+                    or pd.api.types.is_object_dtype(series.dtype))
+        if pd.api.types.is_bool_dtype(series.dtype) or not pd.api.types.is_numeric_dtype(series.dtype):
+            return False
+        if expected_dtype.startswith(("int", "uint")) and not pd.api.types.is_integer_dtype(series.dtype):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values[~np.isnan(values)]
+            return bool(np.all(values == np.floor(values)))
+        return True
+
+    def update(self, dataframe: DataFrame) -> None:
+        """
+        Accumulates the validation counters of one DataFrame or chunk
+        """
+        try:
+            self._rows += len(dataframe)
+            for column, expected_dtype in self.expected_dtypes.items():
+                if column not in dataframe.columns:
+                    continue
+                series = dataframe[column]
+                stats = self._stats.setdefault(column, {"dtype": str(series.dtype), "dtype_valid": True, "nulls": 0,
+                                                        "invalid_categories": 0, "below_min": 0, "above_max": 0,
+                                                        "min": None, "max": None})
+                stats["dtype_valid"] = stats["dtype_valid"] and self._is_dtype_valid(series, expected_dtype)
+                nulls = series.isna()
+                stats["nulls"] += int(nulls.sum())
+
+                if column in self.allowed_categories:
+                    invalid = ~series.isin(self.allowed_categories[column]) & ~nulls
+                    stats["invalid_categories"] += int(invalid.sum())
+
+                if column in self.numeric_bounds and pd.api.types.is_numeric_dtype(series.dtype) \
+                        and not pd.api.types.is_bool_dtype(series.dtype):
+                    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+                    bounds = self.numeric_bounds[column]
+                    stats["below_min"] += int(np.count_nonzero(values < bounds["min"]))
+                    stats["above_max"] += int(np.count_nonzero(values > bounds["max"]))
+                    if len(values) > int(nulls.sum()):
+                        chunk_min, chunk_max = float(np.nanmin(values)), float(np.nanmax(values))
+                        stats["min"] = chunk_min if stats["min"] is None else min(stats["min"], chunk_min)
+                        stats["max"] = chunk_max if stats["max"] is None else max(stats["max"], chunk_max)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def report(self) -> dict:
+        """
+        Builds the validation report of everything accumulated since the last reset.
+        The report holds the per-column statistics, the list of errors and the overall status.
+        """
+        try:
+            errors = []
+            missing_columns = [column for column in self.required_columns if column not in self._stats]
+            if missing_columns:
+                errors.append(f"Missing columns: {missing_columns}")
+
+            columns = {}
+            for column, stats in self._stats.items():
+                null_ratio = stats["nulls"] / self._rows if self._rows else 0.0
+                columns[column] = {**stats, "expected_dtype": self.expected_dtypes[column], "null_ratio": round(null_ratio, 6)}
+                if not stats["dtype_valid"]:
+                    errors.append(f"Column '{column}' has dtype {stats['dtype']}, expected {self.expected_dtypes[column]}")
+                if null_ratio > self.max_null_ratio:
+                    errors.append(f"Column '{column}' has a null ratio of {null_ratio:.4f} above {self.max_null_ratio}")
+                if stats["invalid_categories"]:
+                    errors.append(f"Column '{column}' has {stats['invalid_categories']} values outside the allowed categories")
+                if stats["below_min"] or stats["above_max"]:
+                    errors.append(f"Column '{column}' has {stats['below_min'] + stats['above_max']} values outside "
+                                  f"[{self.numeric_bounds[column]['min']}, {self.numeric_bounds[column]['max']}]")
+
+            return {"validation_status": not errors, "rows": self._rows, "errors": errors, "columns": columns}
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def validate(self, dataframe: DataFrame) -> dict:
+        """
+        Validates a complete DataFrame in a single pass and returns its report
+        """
+        self.reset()
+        self.update(dataframe)
+        return self.report()
+
+    def validate_chunks(self, chunks: Iterable[DataFrame]) -> dict:
+        """
+        Validates a stream of DataFrame chunks and returns the report of the whole stream
+        """
+        self.reset()
+        for chunk in chunks:
+            self.update(chunk)
+        return self.report()
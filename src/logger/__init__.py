@@ -1,6 +1,14 @@
+import atexit
+import copy
+import json
 import logging
+import multiprocessing
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import threading
+import time
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from from_root import from_root
 from datetime import datetime
 
@@ -10,24 +18,157 @@ LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
 MAX_LOG_SIZE = 5*1024*1024  # 5 MB
 BACKUP_COUNT = 3  # Number of backup log files to retain
 
-# Construct the log file path
+# "sync" writes records on the logging thread, "queue" hands them to a listener thread
+LOG_MODE = os.getenv("LOG_MODE", "sync")
+# "text" or "json", one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Records below WARNING from the same line of code allowed per interval, 0 for no limit
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "0"))
+LOG_RATE_LIMIT_INTERVAL = float(os.getenv("LOG_RATE_LIMIT_INTERVAL", "1.0"))
+# Fraction of the records below WARNING kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Construct the log file path, the directory and the file are created with the first record
 log_dir_path = os.path.join(from_root(), LOG_DIR)
-os.makedirs(log_dir_path, exist_ok=True)
 log_file_path = os.path.join(log_dir_path, LOG_FILE)
 
-def configure_logger():
+# Attributes of every LogRecord, the others were given with extra= and are added to the JSON records
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))) | {"message", "asctime",
+                                                                                             "rate_limit_kept"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object with its time, level, logger, process, thread and message, plus the
+    fields given with extra= and the traceback of an exception
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "process": record.process, "thread": record.threadName, "message": record.getMessage()}
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler opening its file, and creating its directory, when the first record is written
+    """
+
+    def __init__(self, filename: str, maxBytes: int = 0, backupCount: int = 0):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Keeps a sample_rate fraction of the records below level, then at most rate of them per interval seconds
+    for every line of code logging them. The first record let through after some were dropped carries their
+    count in its "suppressed" attribute. Records at level and above always pass.
+    """
+
+    def __init__(self, rate: int = 0, interval: float = 1.0, sample_rate: float = 1.0, level: int = logging.WARNING):
+        super().__init__()
+        self.rate = rate
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.level = level
+        self._lock = threading.Lock()
+        # (pathname, lineno) -> [window start, records in the window, records suppressed]
+        self._windows = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Handlers sharing the filter get the decision taken for the record by the first of them, so a record
+        # is written by all of them or by none, and counts once in its window
+        kept = getattr(record, "rate_limit_kept", None)
+        if kept is None:
+            kept = record.rate_limit_kept = self._keep(record)
+        return kept
+
+    def _keep(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.level:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.setdefault((record.pathname, record.lineno), [now, 0, 0])
+            if now - window[0] >= self.interval:
+                window[0], window[1] = now, 0
+            if window[1] >= self.rate:
+                window[2] += 1
+                return False
+            window[1] += 1
+            suppressed, window[2] = window[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class LocalQueueHandler(QueueHandler):
+    """
+    QueueHandler for a listener in the same process: the message and the traceback are rendered on the logging
+    thread, since the arguments and frames may change afterwards, and the rest of the formatting is left to the
+    handlers of the listener
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# Handlers and listener installed by configure_logger, replaced when it runs again
+_handlers = []
+_listener = None
+
+
+def _stop_listener() -> None:
+    # Writes the records left in the queue, then closes the handlers of the listener
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def configure_logger(mode: str = LOG_MODE, log_format: str = LOG_FORMAT, file_path: str = log_file_path):
     """
     Configures logging with a rotating file handler and a console handler.
+    In queue mode, records are put on a queue by the logging thread and written by a listener thread, so
+    logging in a hot path costs no I/O. Filtering happens before the queue, on the logging thread.
     """
+    global _listener
     # Creates a custom logger
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)
+    _stop_listener()
+    for handler in _handlers:
+        logger.removeHandler(handler)
+        handler.close()
+    _handlers.clear()
 
     # Define the formatter
-    formatter = logging.Formatter("[%(asctime)s ] %(name)s - %(levelname)s - %(message)s")
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("[%(asctime)s ] %(name)s - %(levelname)s - %(message)s")
 
     # File handler with rotation
-    file_handler = RotatingFileHandler(log_file_path, maxBytes=MAX_LOG_SIZE, backupCount=BACKUP_COUNT)
+    file_handler = LazyRotatingFileHandler(file_path, maxBytes=MAX_LOG_SIZE, backupCount=BACKUP_COUNT)
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging.DEBUG)
 
@@ -36,10 +177,38 @@ def configure_logger():
     console_handler.setFormatter(formatter)
     console_handler.setLevel(logging.INFO)
 
-    # Add both the handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # One filter for all the handlers, so a record is kept or dropped everywhere at once
+    rate_limit_filter = RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_LIMIT_INTERVAL, LOG_SAMPLE_RATE)
+    if mode == "queue":
+        queue_handler = LocalQueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(rate_limit_filter)
+        _listener = QueueListener(queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        _handlers.append(queue_handler)
+    else:
+        for handler in (file_handler, console_handler):
+            handler.addFilter(rate_limit_filter)
+            _handlers.append(handler)
+
+    # Add the handlers to logger
+    for handler in _handlers:
+        logger.addHandler(handler)
+
+
+def _process_log_file_path() -> str:
+    # Every process rotates its own file, two processes never rename the same file
+    return os.path.join(log_dir_path, f"{os.path.splitext(LOG_FILE)[0]}_{os.getpid()}.log")
+
+
+def _configure_forked_child() -> None:
+    # The listener thread of the parent does not exist in the child, its queue is left to the parent
+    global _listener
+    _listener = None
+    configure_logger(file_path=_process_log_file_path())
 
-# Configure the logger
-configure_logger()
 
+# Configure the logger, spawned worker processes log to a file of their own
+configure_logger(file_path=log_file_path if multiprocessing.parent_process() is None else _process_log_file_path())
+atexit.register(_stop_listener)
+# A forked child inherits the handlers but not the listener thread, it starts its own on its own file
+os.register_at_fork(after_in_child=_configure_forked_child)
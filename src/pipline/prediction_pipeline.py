@@ -0,0 +1,207 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from src.constants import ARTIFACT_DIR
+from src.entity.config_entity import VehiclePredictorConfig
+from src.entity.estimator import MyModel, TargetValueMapping
+from src.entity.packed_model import load_model_file
+from src.entity.s3_estimator import Proj1Estimator
+from src.exception import MyException
+from src.logger import logging
+from src.utils.main_utils import find_latest_model_file_path
+
+
+class VehicleDataClassifier:
+    def __init__(self, prediction_pipeline_config: VehiclePredictorConfig = VehiclePredictorConfig()) -> None:
+        """
+        :param prediction_pipeline_config: Configuration for prediction the value
+        """
+        try:
+            self.prediction_pipeline_config = prediction_pipeline_config
+            self.target_value_mapping = TargetValueMapping().reverse_mapping()
+            self.estimator: Optional[Proj1Estimator] = None
+            self._model: Optional[MyModel] = None
+
+            if prediction_pipeline_config.model_bucket_name:
+                # Served from the model registry and swapped in place whenever a new version is pushed
+                self.estimator = Proj1Estimator(bucket_name=prediction_pipeline_config.model_bucket_name,
+                                                model_path=prediction_pipeline_config.s3_model_key_path,
+                                                manifest_path=prediction_pipeline_config.s3_manifest_key_path)
+                self.estimator.refresh()
+                if self.estimator.loaded_model is None:
+                    raise Exception(f"No model found at s3://{self.estimator.bucket_name}/{self.estimator.model_path}")
+                self.estimator.start_refresher(prediction_pipeline_config.model_refresh_interval)
+                self.model_file_path = f"s3://{self.estimator.bucket_name}/{self.estimator.model_path}"
+            else:
+                self.model_file_path = prediction_pipeline_config.model_file_path or self.get_latest_model_file_path()
+                self._model = load_model_file(file_path=self.model_file_path)
+            logging.info(f"Loaded model {self.model} from {self.model_file_path}")
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    @property
+    def model(self) -> MyModel:
+        return self.estimator.loaded_model if self.estimator is not None else self._model
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return self.estimator.loaded_version if self.estimator is not None else None
+
+    def close(self) -> None:
+        """
+        Stops the model refresher
+        """
+        if self.estimator is not None:
+            self.estimator.stop_refresher()
+
+    @staticmethod
+    def get_latest_model_file_path() -> str:
+        """
+        Returns the model file of the most recent training run under the artifact directory
+        """
+        model_file_path = find_latest_model_file_path()
+        if model_file_path is None:
+            raise Exception(f"No trained model found under {ARTIFACT_DIR}")
+        return model_file_path
+
+    def predict(self, records: List[dict]) -> List[str]:
+        """
+        Scores a batch of raw records in a single vectorized pass through the model's fast path
+        and maps the predictions back to their target labels
+        """
+        try:
+            # The model is read once, so a batch is scored by a single model even while it is being swapped
+            model = self.model
+            predictions = model.predict_records(records)
+            return [self.target_value_mapping[int(prediction)] for prediction in predictions]
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+class MicroBatchPredictor:
+    """
+    Gathers concurrent prediction requests into micro-batches.
+
+    Every request is queued with a future. A collector task takes the first waiting request, then keeps
+    collecting until the batch holds max_batch_size records or max_batch_delay_ms has passed, and scores
+    the batch on a thread pool so the event loop is never blocked by the model. Batches are collected
+    while earlier ones are still scored, up to the number of workers.
+    """
+
+    def __init__(self, classifier: VehicleDataClassifier, max_batch_size: int, max_batch_delay_ms: float, workers: int):
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay_ms / 1000
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending_get: Optional[asyncio.Future] = None
+        # Keeps references to the running batches, the event loop only holds weak references to tasks
+        self._batches: set = set()
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="predictor")
+        self._collector = asyncio.create_task(self._collect_batches())
+        logging.info(f"Micro-batching started: max_batch_size={self.max_batch_size}, "
+                     f"max_batch_delay={self.max_batch_delay * 1000}ms, workers={self.workers}")
+
+    async def stop(self) -> None:
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+        if self._pending_get is not None:
+            if self._pending_get.done() and not self._pending_get.cancelled():
+                self._fail_requests([self._pending_get.result()])
+            self._pending_get.cancel()
+            self._pending_get = None
+        # Requests still queued would otherwise wait forever on their futures
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._fail_requests([self._queue.get_nowait()])
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        logging.info("Micro-batching stopped")
+
+    async def predict(self, record: dict) -> str:
+        """
+        Queues one record and waits for its prediction
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future))
+        return await future
+
+    async def predict_batch(self, records: List[dict]) -> List[str]:
+        """
+        Scores a batch the client already built on the thread pool, without going through the queue
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.classifier.predict, records)
+
+    async def _next_request(self, timeout: Optional[float] = None) -> Optional[tuple]:
+        """
+        Returns the next queued request, or None once the timeout expires. A get that times out is kept
+        pending for the next call instead of being cancelled, so no request is ever lost.
+        """
+        if self._pending_get is None:
+            if not self._queue.empty():
+                return self._queue.get_nowait()
+            self._pending_get = asyncio.ensure_future(self._queue.get())
+        done, _ = await asyncio.wait({self._pending_get}, timeout=timeout)
+        if not done:
+            return None
+        request, self._pending_get = self._pending_get.result(), None
+        return request
+
+    async def _collect_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                await self._slots.acquire()
+                batch = [await self._next_request()]
+                deadline = loop.time() + self.max_batch_delay
+                while len(batch) < self.max_batch_size:
+                    # Past the deadline requests that are already queued still join the batch
+                    request = await self._next_request(max(deadline - loop.time(), 0))
+                    if request is None:
+                        break
+                    batch.append(request)
+                task = asyncio.create_task(self._score_batch(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+                batch = []
+        except asyncio.CancelledError:
+            # The batch being collected when the predictor stops is never scored
+            self._fail_requests(batch)
+            raise
+
+    @staticmethod
+    def _fail_requests(requests: list) -> None:
+        for _, future in requests:
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batching stopped before the request was scored"))
+
+    async def _score_batch(self, batch: list) -> None:
+        try:
+            records = [record for record, _ in batch]
+            predictions = await asyncio.get_running_loop().run_in_executor(self._executor, self.classifier.predict, records)
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+        except Exception as e:
+            logging.exception("Exception occurred while scoring a micro-batch")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
@@ -0,0 +1,156 @@
+import dataclasses
+import functools
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Optional
+
+from src.exception import MyException
+from src.logger import logging
+from src.utils.main_utils import load_object, save_object
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@functools.lru_cache(maxsize=None)
+def get_code_version() -> str:
+    """
+    Returns a digest of every Python source file of the src package: any code change invalidates the cache
+    """
+    digest = hashlib.sha256()
+    for file_path in sorted(glob.glob(os.path.join(SOURCE_DIR, "**", "*.py"), recursive=True)):
+        digest.update(os.path.relpath(file_path, SOURCE_DIR).encode())
+        with open(file_path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    Content-addressed cache of the artifacts of the training pipeline stages.
+
+    A stage is keyed by the sha256 of its inputs and of the code version, the inputs of a stage including the
+    keys of the stages it reads from, so a change anywhere invalidates everything downstream of it. The index
+    maps every key to the pickled artifact and to the artifact directory holding its files, and keeps the last use
+    of every artifact directory. Entries are recorded once the files of the run are written, and the artifact
+    directories used least recently are deleted beyond max_artifact_dirs, with their entries. Directories of runs
+    that never used the cache are left alone.
+    """
+
+    def __init__(self, cache_dir: str, artifact_dir: str, max_artifact_dirs: int):
+        """
+        :param cache_dir: directory of the index and the pickled artifacts
+        :param artifact_dir: artifact directory of the running pipeline, never evicted
+        :param max_artifact_dirs: artifact directories kept, the running one included
+        """
+        self.cache_dir = cache_dir
+        self.artifact_dir = artifact_dir
+        self.max_artifact_dirs = max_artifact_dirs
+        self.index_file_path = os.path.join(cache_dir, "index.json")
+
+    def _read_index(self) -> dict:
+        if not os.path.exists(self.index_file_path):
+            return {"entries": {}, "artifact_dirs": {}}
+        with open(self.index_file_path) as file:
+            return json.load(file)
+
+    def _write_index(self, index: dict) -> None:
+        # Replaced in one step so a pipeline that stops halfway never leaves a truncated index
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_file_path = f"{self.index_file_path}.{os.getpid()}.tmp"
+        with open(temporary_file_path, "w") as file:
+            json.dump(index, file, indent=4)
+        os.replace(temporary_file_path, self.index_file_path)
+
+    def get_config_inputs(self, config) -> dict:
+        """
+        Returns the fields of a config dataclass that are inputs of its stage, leaving out the output paths
+        inside the artifact directory of the running pipeline
+        """
+        return {name: value for name, value in dataclasses.asdict(config).items()
+                if not (isinstance(value, str) and value.startswith(self.artifact_dir))}
+
+    @staticmethod
+    def get_key(stage_name: str, inputs: dict) -> str:
+        """
+        Returns the cache key of a stage given its inputs, which must be JSON serializable
+        """
+        content = json.dumps({"stage": stage_name, "code_version": get_code_version(), "inputs": inputs},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def load(self, stage_name: str, key: str) -> Optional[object]:
+        """
+        Returns the artifact cached for the key, None on a miss or when its artifact directory is gone
+        """
+        try:
+            index = self._read_index()
+            entry = index["entries"].get(key)
+            if entry is None or not os.path.isdir(entry["artifact_dir"]) or not os.path.exists(entry["artifact_file_path"]):
+                logging.info(f"Stage cache miss for {stage_name} ({key[:12]})")
+                return None
+            artifact = load_object(entry["artifact_file_path"])
+            index["artifact_dirs"][entry["artifact_dir"]] = time.time()
+            self._write_index(index)
+            logging.info(f"Stage cache hit for {stage_name} ({key[:12]}), reusing the artifact of {entry['artifact_dir']}")
+            return artifact
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def save(self, stage_name: str, key: str, artifact: object) -> None:
+        """
+        Records the artifact of a stage of the running pipeline. The in-memory copies it hands over are
+        dropped, the next stages read the artifact files instead.
+        """
+        try:
+            cached_fields = {field.name: None for field in dataclasses.fields(artifact)
+                             if not field.compare and not field.metadata.get("stage_cache")}
+            artifact_file_path = os.path.join(self.cache_dir, stage_name, f"{key}.pkl")
+            save_object(artifact_file_path, dataclasses.replace(artifact, **cached_fields))
+            index = self._read_index()
+            index["entries"][key] = {"stage": stage_name, "artifact_dir": self.artifact_dir,
+                                     "artifact_file_path": artifact_file_path}
+            index["artifact_dirs"][self.artifact_dir] = time.time()
+            self._write_index(index)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def touch(self) -> None:
+        """
+        Marks the artifact directory of the running pipeline as used, so it is evicted like the others
+        even when every stage was a cache hit
+        """
+        try:
+            if os.path.isdir(self.artifact_dir):
+                index = self._read_index()
+                index["artifact_dirs"][self.artifact_dir] = time.time()
+                self._write_index(index)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def evict(self) -> None:
+        """
+        Deletes the artifact directories used least recently beyond max_artifact_dirs with their entries
+        """
+        try:
+            index = self._read_index()
+            last_used = dict(index["artifact_dirs"])
+            if os.path.isdir(self.artifact_dir):
+                last_used[self.artifact_dir] = float("inf")
+            kept = set(sorted(last_used, key=last_used.get, reverse=True)[:max(1, self.max_artifact_dirs)])
+
+            for artifact_dir in set(last_used) - kept:
+                logging.info(f"Stage cache evicting the artifact directory {artifact_dir}")
+                shutil.rmtree(artifact_dir, ignore_errors=True)
+                index["artifact_dirs"].pop(artifact_dir, None)
+            for key, entry in list(index["entries"].items()):
+                if entry["artifact_dir"] not in kept:
+                    if os.path.exists(entry["artifact_file_path"]):
+                        os.remove(entry["artifact_file_path"])
+                    del index["entries"][key]
+            self._write_index(index)
+        except Exception as e:
+            raise MyException(e, sys) from e
@@ -0,0 +1,139 @@
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.exception import MyException
+from src.logger import logging
+
+@dataclass
+class Task:
+    name: str
+    func: Callable
+    # Tasks whose results are passed to func, in this order
+    inputs: tuple = ()
+
+
+class TaskScheduler:
+    """
+    Runs a DAG of tasks on a thread pool, every task starting as soon as the tasks it takes inputs from are done.
+
+    Tasks are added after their inputs, so the graph can not have cycles. The result of a task is released once
+    every task reading it has started, unless it is one of the requested outputs. The start and end of every task
+    are recorded for a Gantt-style timeline with the critical path: the chain of dependent tasks with the largest
+    total duration, which bounds the wall time of the run whatever the number of workers.
+    """
+
+    def __init__(self, max_workers: int):
+        """
+        :param max_workers: tasks running at the same time
+        """
+        self.max_workers = max(1, max_workers)
+        self.tasks = {}
+        self.timeline = []
+        self.makespan = 0.0
+
+    def add_task(self, name: str, func: Callable, inputs: tuple = ()) -> None:
+        if name in self.tasks:
+            raise ValueError(f"Task '{name}' is already scheduled")
+        unknown = [input_name for input_name in inputs if input_name not in self.tasks]
+        if unknown:
+            raise ValueError(f"Task '{name}' takes inputs from unscheduled tasks {unknown}")
+        self.tasks[name] = Task(name=name, func=func, inputs=tuple(inputs))
+
+    def _run_task(self, task: Task, args: list, start_time: float) -> object:
+        start = time.perf_counter()
+        try:
+            return task.func(*args)
+        finally:
+            end = time.perf_counter()
+            self.timeline.append({"task": task.name, "inputs": list(task.inputs), "thread": threading.current_thread().name,
+                                  "start_s": round(start - start_time, 4), "end_s": round(end - start_time, 4),
+                                  "duration_s": round(end - start, 4)})
+
+    def run(self, outputs: Optional[list] = None) -> dict:
+        """
+        Runs every task and returns the results of the output tasks, of all tasks when outputs is None.
+        The first failing task stops the run: the tasks not started yet are cancelled and its exception is raised.
+        """
+        try:
+            outputs = set(self.tasks if outputs is None else outputs)
+            consumers = {name: sum(name in task.inputs for task in self.tasks.values()) for name in self.tasks}
+            waiting = dict(self.tasks)
+            results, running = {}, {}
+            self.timeline = []
+            start_time = time.perf_counter()
+
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline-task") as executor:
+                while waiting or running:
+                    for name, task in list(waiting.items()):
+                        if all(input_name in results for input_name in task.inputs):
+                            args = [results[input_name] for input_name in task.inputs]
+                            running[executor.submit(self._run_task, task, args, start_time)] = name
+                            del waiting[name]
+                            for input_name in task.inputs:
+                                consumers[input_name] -= 1
+                                if consumers[input_name] == 0 and input_name not in outputs:
+                                    del results[input_name]
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        if future.exception() is not None:
+                            for pending in running:
+                                pending.cancel()
+                            logging.error(f"Task '{name}' failed, stopping the pipeline")
+                            raise future.exception()
+                        results[name] = future.result()
+                        if consumers[name] == 0 and name not in outputs:
+                            del results[name]
+
+            self.makespan = time.perf_counter() - start_time
+            self.timeline.sort(key=lambda entry: entry["start_s"])
+            logging.info(f"Ran {len(self.tasks)} tasks in {self.makespan:.3f}s, "
+                         f"critical path: {' -> '.join(self.get_critical_path()[0])}")
+            return results
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def get_critical_path(self) -> tuple:
+        """
+        Returns the names of the tasks on the critical path of the last run and its duration in seconds
+        """
+        durations = {entry["task"]: entry["duration_s"] for entry in self.timeline}
+        path_durations, previous = {}, {}
+        # Tasks are stored in insertion order, which is a topological order
+        for name, task in self.tasks.items():
+            if name not in durations:
+                continue
+            inputs = [input_name for input_name in task.inputs if input_name in path_durations]
+            previous[name] = max(inputs, key=path_durations.get) if inputs else None
+            path_durations[name] = durations[name] + (path_durations[previous[name]] if inputs else 0.0)
+        if not path_durations:
+            return [], 0.0
+        name = max(path_durations, key=path_durations.get)
+        duration = path_durations[name]
+        path = []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1], round(duration, 4)
+
+    def save_timeline(self, file_path: str) -> None:
+        """
+        Saves the timeline of the last run as JSON: one entry per task with its start and end in seconds
+        from the start of the run, the critical path and the wall time
+        """
+        try:
+            critical_path, critical_path_s = self.get_critical_path()
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w") as file:
+                json.dump({"max_workers": self.max_workers, "makespan_s": round(self.makespan, 4),
+                           "critical_path": critical_path, "critical_path_s": critical_path_s,
+                           "tasks": self.timeline}, file, indent=4)
+        except Exception as e:
+            raise MyException(e, sys) from e
@@ -1,19 +1,42 @@
+import os
 import sys
+from typing import Optional
 from src.exception import MyException
 from src.logger import logging
+from src.utils.main_utils import wait_for_artifact_writes, find_latest_model_file_path, get_file_digest, read_yaml_file
 
 from src.components.data_ingestion import DataIngestion
 from src.components.data_validation import DataValidation
 from src.components.data_transformation import DataTransformation
 from src.components.model_trainer import ModelTrainer
+from src.components.model_evaluation import ModelEvaluation
+from src.components.model_pusher import ModelPusher
+from src.data_access.proj1_data import Vehicle_Data
+from src.pipline.stage_cache import StageCache
+from src.pipline.task_scheduler import TaskScheduler
+from src.utils.profiling import (profiled, reset_metrics, get_metrics, save_metrics, load_metrics, compare_metrics,
+                                 find_previous_metrics_file_path, start_profiler, stop_profiler)
 
 
+from src.constants import MODEL_TRAINER_REFERENCE_SKETCH_NAME, SCHEMA_FILE_PATH
 from src.entity.config_entity import(DataIngestionConfig, 
-                                     DataValidationConfig, DataTransformationConfig, ModelTrainerConfig)
+                                     DataValidationConfig, DataTransformationConfig, ModelTrainerConfig,
+                                     ModelEvaluationConfig, ModelPusherConfig, training_pipeline_config)
 
 from src.entity.artifact_entity import(DataIngestionArtifact, 
                                        DataValidationArtifact, 
-                                       DataTransformationArtifact, ModelTrainerArtifact)
+                                       DataTransformationArtifact, ModelTrainerArtifact, ModelEvaluationArtifact,
+                                       ModelPusherArtifact)
+
+# Sections of schema.yaml read by every stage, a change to any other section does not invalidate the stage
+STAGE_SCHEMA_SECTIONS = {
+    "data_ingestion": ["columns", "allowed_categories"],
+    "data_validation": ["columns", "numerical_columns", "categorical_columns", "allowed_categories",
+                        "numeric_bounds", "max_null_ratio", "drift_numerical_columns", "drift_categorical_columns"],
+    "data_transformation": ["columns", "categorical_columns", "drop_columns", "num_features", "mm_columns",
+                            "feature_dtype", "gender_mapping", "dummy_columns", "rename_columns", "allowed_categories"],
+    "model_trainer": [],
+}
 
 class TrainPipeline:
 
@@ -22,8 +45,180 @@ class TrainPipeline:
         self.data_validation_config = DataValidationConfig()
         self.data_transformation_config = DataTransformationConfig()
         self.model_trainer_config = ModelTrainerConfig()
+        self.model_evaluation_config = ModelEvaluationConfig()
+        self.model_pusher_config = ModelPusherConfig()
+        if training_pipeline_config.incremental_training:
+            self.configure_incremental_training()
+        self.stage_cache = None
+        if training_pipeline_config.stage_cache:
+            self.stage_cache = StageCache(cache_dir=training_pipeline_config.stage_cache_dir,
+                                          artifact_dir=training_pipeline_config.artifact_dir,
+                                          max_artifact_dirs=training_pipeline_config.stage_cache_max_artifact_dirs)
+
+    def configure_incremental_training(self) -> None:
+        """
+        Points the stages at the latest trained model: the training data is checked for drift against its reference
+        sketch, and the transformation and the trainer warm-start it
+        """
+        previous_model_file_path = find_latest_model_file_path(exclude_artifact_dir=training_pipeline_config.artifact_dir)
+        if previous_model_file_path is None:
+            logging.info("No previous model found, the incremental run trains from scratch")
+            return
+        logging.info(f"Incremental training from the previous model {previous_model_file_path}")
+        self.data_validation_config.baseline_drift_reference_file_path = os.path.join(
+            os.path.dirname(previous_model_file_path), MODEL_TRAINER_REFERENCE_SKETCH_NAME)
+        self.data_transformation_config.previous_model_file_path = previous_model_file_path
+        self.model_trainer_config.previous_model_file_path = previous_model_file_path
 
+    def get_stage_inputs(self, stage_name: str, config, upstream_keys: list) -> dict:
+        """
+        Returns the inputs a stage is keyed by in the stage cache: the keys of the stages it reads from,
+        its config and the sections of schema.yaml it reads
+        """
+        schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
+        return {"upstream": upstream_keys,
+                "config": self.stage_cache.get_config_inputs(config),
+                "schema": {section: schema_config.get(section) for section in STAGE_SCHEMA_SECTIONS[stage_name]}}
 
+    def get_stage_keys(self) -> dict:
+        """
+        Returns the stage cache key of every stage. The keys only depend on the data fingerprint, the configs and
+        the input files, so they are known before any stage runs.
+        """
+        # Documents inserted or deleted since a previous run change the fingerprint, updates in place do not
+        data_fingerprint = Vehicle_Data().get_collection_fingerprint(self.data_ingestion_config.collection_name)
+        keys = {}
+        keys["data_ingestion"] = self.stage_cache.get_key("data_ingestion", {
+            **self.get_stage_inputs("data_ingestion", self.data_ingestion_config, []),
+            "data_fingerprint": data_fingerprint})
+        keys["data_validation"] = self.stage_cache.get_key("data_validation", {
+            **self.get_stage_inputs("data_validation", self.data_validation_config, [keys["data_ingestion"]]),
+            "baseline_drift_reference": get_file_digest(self.data_validation_config.baseline_drift_reference_file_path)})
+        keys["data_transformation"] = self.stage_cache.get_key("data_transformation", {
+            **self.get_stage_inputs("data_transformation", self.data_transformation_config,
+                                    [keys["data_ingestion"], keys["data_validation"]]),
+            "model_config": get_file_digest(self.data_transformation_config.model_config_file_path),
+            "previous_model": get_file_digest(self.data_transformation_config.previous_model_file_path)})
+        keys["model_trainer"] = self.stage_cache.get_key("model_trainer", {
+            **self.get_stage_inputs("model_trainer", self.model_trainer_config,
+                                    [keys["data_transformation"], keys["data_validation"]]),
+            "model_config": get_file_digest(self.model_trainer_config.model_config_file_path),
+            "previous_model": get_file_digest(self.model_trainer_config.previous_model_file_path)})
+        return keys
+
+    def add_data_validation_tasks(self, scheduler: TaskScheduler) -> None:
+        """
+        Validates the train and test splits concurrently, then detects drift and saves the report
+        """
+        def validate_split(data_ingestion_artifact: DataIngestionArtifact, split: str, split_name: str) -> tuple:
+            data_validation = DataValidation(data_ingestion_artifact=data_ingestion_artifact,
+                                             data_validation_config=self.data_validation_config)
+            dataframe = data_validation.load_split(split)
+            return dataframe, data_validation.validate_split(dataframe, split_name)
+
+        def complete_data_validation(data_ingestion_artifact: DataIngestionArtifact, train: tuple, test: tuple):
+            data_validation = DataValidation(data_ingestion_artifact=data_ingestion_artifact,
+                                             data_validation_config=self.data_validation_config)
+            return data_validation.complete_data_validation(train[0], test[0], train_result=train[1], test_result=test[1])
+
+        scheduler.add_task("validate_train", profiled("data_validation.validate_train")(
+                               lambda artifact: validate_split(artifact, "train", "training")),
+                           inputs=("data_ingestion",))
+        scheduler.add_task("validate_test", profiled("data_validation.validate_test")(
+                               lambda artifact: validate_split(artifact, "test", "test")),
+                           inputs=("data_ingestion",))
+        scheduler.add_task("data_validation", profiled("data_validation.complete")(complete_data_validation),
+                           inputs=("data_ingestion", "validate_train", "validate_test"))
+
+    def add_data_transformation_tasks(self, scheduler: TaskScheduler) -> None:
+        """
+        Fits the preprocessor on the training split, then resamples the training split while the test split is
+        transformed and resampled
+        """
+        def data_transformation(data_ingestion_artifact: DataIngestionArtifact,
+                                data_validation_artifact: DataValidationArtifact) -> DataTransformation:
+            return DataTransformation(data_ingestion_artifact=data_ingestion_artifact,
+                                      data_transformation_config=self.data_transformation_config,
+                                      data_validation_artifact=data_validation_artifact)
+
+        def resample_history(ingestion, validation, prepared):
+            if prepared.history is None:
+                return None
+            return data_transformation(ingestion, validation).resample_split(prepared.history,
+                                                                             "training data of the previous model")
+
+        stage_inputs = ("data_ingestion", "data_validation")
+        scheduler.add_task("prepare_transformation", profiled("data_transformation.prepare")(
+                               lambda ingestion, validation: data_transformation(ingestion, validation).prepare_data_transformation()),
+                           inputs=stage_inputs)
+        scheduler.add_task("resample_train", profiled("data_transformation.resample_train")(
+                               lambda ingestion, validation, prepared: data_transformation(ingestion, validation).resample_split(
+                                   prepared.train, "training data")),
+                           inputs=stage_inputs + ("prepare_transformation",))
+        scheduler.add_task("resample_history", resample_history, inputs=stage_inputs + ("prepare_transformation",))
+        scheduler.add_task("transform_test", profiled("data_transformation.transform_test")(
+                               lambda ingestion, validation, prepared: data_transformation(ingestion, validation).transform_and_resample(
+                                   prepared.preprocessor, prepared.test_df, "testing data")),
+                           inputs=stage_inputs + ("prepare_transformation",))
+        scheduler.add_task("data_transformation", profiled("data_transformation.complete")(
+                               lambda ingestion, validation, prepared, train_arr, history_train_arr, test_arr:
+                                   data_transformation(ingestion, validation).complete_data_transformation(
+                                       prepared, train_arr, test_arr, history_train_arr)),
+                           inputs=stage_inputs + ("prepare_transformation", "resample_train", "resample_history",
+                                                  "transform_test"))
+
+    def get_task_scheduler(self, cached_artifacts: dict) -> TaskScheduler:
+        """
+        Builds the DAG of the pipeline. A stage found in the stage cache is a single task returning its artifact,
+        the other stages are split into tasks that run as soon as their inputs are ready.
+        """
+        scheduler = TaskScheduler(max_workers=training_pipeline_config.max_workers)
+        stages = {"data_ingestion": lambda: scheduler.add_task("data_ingestion", self.start_data_ingestion),
+                  "data_validation": lambda: self.add_data_validation_tasks(scheduler),
+                  "data_transformation": lambda: self.add_data_transformation_tasks(scheduler),
+                  "model_trainer": lambda: scheduler.add_task(
+                      "model_trainer",
+                      lambda transformation, validation: self.start_model_trainer(
+                          data_transformation_artifact=transformation, data_validation_artifact=validation),
+                      inputs=("data_transformation", "data_validation"))}
+        for stage_name, add_stage_tasks in stages.items():
+            if stage_name in cached_artifacts:
+                scheduler.add_task(stage_name, lambda artifact=cached_artifacts[stage_name]: artifact)
+            else:
+                add_stage_tasks()
+        # Artifact files handed over in memory are written in the background while the next tasks run
+        scheduler.add_task("artifact_writes", lambda artifact: wait_for_artifact_writes(), inputs=("model_trainer",))
+        # The production model can change between runs with the same inputs, so the evaluation is never cached
+        scheduler.add_task("model_evaluation",
+                           lambda ingestion, trainer, writes: self.start_model_evaluation(
+                               data_ingestion_artifact=ingestion, model_trainer_artifact=trainer),
+                           inputs=("data_ingestion", "model_trainer", "artifact_writes"))
+        scheduler.add_task("model_pusher",
+                           lambda evaluation, trainer, transformation: self.start_model_pusher(
+                               model_evaluation_artifact=evaluation, model_trainer_artifact=trainer,
+                               data_transformation_artifact=transformation),
+                           inputs=("model_evaluation", "model_trainer", "data_transformation"))
+        return scheduler
+
+    def save_run_metrics(self, scheduler: TaskScheduler, cached_stages: list) -> None:
+        """
+        Saves the metrics of the run to metrics.json, with the regressions against the metrics of the previous run
+        """
+        critical_path, critical_path_s = scheduler.get_critical_path()
+        metrics = get_metrics(timestamp=training_pipeline_config.timestamp, cached_stages=cached_stages,
+                              makespan_s=round(scheduler.makespan, 4), critical_path=critical_path,
+                              critical_path_s=critical_path_s)
+        baseline_file_path = find_previous_metrics_file_path(exclude_artifact_dir=training_pipeline_config.artifact_dir)
+        if baseline_file_path is not None:
+            metrics["baseline"] = baseline_file_path
+            metrics["regressions"] = compare_metrics(metrics, load_metrics(baseline_file_path),
+                                                     tolerance=training_pipeline_config.regression_tolerance)
+            for regression in metrics["regressions"]:
+                logging.warning(f"Performance regression against {baseline_file_path}: {regression}")
+        save_metrics(training_pipeline_config.metrics_file_path, metrics)
+        logging.info(f"Saved the run metrics to {training_pipeline_config.metrics_file_path}")
+
+    @profiled("data_ingestion")
     def start_data_ingestion(self) -> DataIngestionArtifact:
         """
         This method of TrainPipeline class is responsible for starting data ingestion component
@@ -40,6 +235,7 @@ class TrainPipeline:
             raise MyException(e, sys) from e
     
 
+    @profiled("data_validation")
     def start_data_validation(self, data_ingestion_artifact:DataIngestionArtifact) -> DataValidationArtifact:
         """
         This method of TrainPipeline class is responsible for starting data validation component
@@ -57,6 +253,7 @@ class TrainPipeline:
             raise MyException(e, sys) from e
         
     
+    @profiled("data_transformation")
     def start_data_transformation(self, data_ingestion_artifact: DataIngestionArtifact, data_validation_artifact: DataValidationArtifact) -> DataTransformationArtifact:
         """
         This method of TrainPipeline class is responsible for starting data transformation component
@@ -70,13 +267,16 @@ class TrainPipeline:
         except Exception as e:
             raise MyException(e, sys)
         
-    def start_model_trainer(self, data_transformation_artifact: DataTransformationArtifact) -> ModelTrainerArtifact:
+    @profiled("model_trainer")
+    def start_model_trainer(self, data_transformation_artifact: DataTransformationArtifact,
+                            data_validation_artifact: Optional[DataValidationArtifact] = None) -> ModelTrainerArtifact:
         """
         This method of TrainPipeline class is responsible for starting model training
         """
         try:
             model_trainer = ModelTrainer(data_transformation_artifact=data_transformation_artifact,
-                                         model_trainer_config=self.model_trainer_config
+                                         model_trainer_config=self.model_trainer_config,
+                                         data_validation_artifact=data_validation_artifact
                                          )
             model_trainer_artifact = model_trainer.initiate_model_trainer()
             return model_trainer_artifact
@@ -85,15 +285,75 @@ class TrainPipeline:
             raise MyException(e, sys)
         
 
+    @profiled("model_evaluation")
+    def start_model_evaluation(self, data_ingestion_artifact: DataIngestionArtifact,
+                               model_trainer_artifact: ModelTrainerArtifact) -> ModelEvaluationArtifact:
+        """
+        This method of TrainPipeline class is responsible for starting model evaluation
+        """
+        try:
+            model_evaluation = ModelEvaluation(model_eval_config=self.model_evaluation_config,
+                                               data_ingestion_artifact=data_ingestion_artifact,
+                                               model_trainer_artifact=model_trainer_artifact)
+            model_evaluation_artifact = model_evaluation.initiate_model_evaluation()
+            return model_evaluation_artifact
+        except Exception as e:
+            raise MyException(e, sys)
+
+    @profiled("model_pusher")
+    def start_model_pusher(self, model_evaluation_artifact: ModelEvaluationArtifact,
+                           model_trainer_artifact: Optional[ModelTrainerArtifact] = None,
+                           data_transformation_artifact: Optional[DataTransformationArtifact] = None
+                           ) -> Optional[ModelPusherArtifact]:
+        """
+        This method of TrainPipeline class is responsible for pushing the accepted model to the model registry
+        """
+        try:
+            if not model_evaluation_artifact.is_model_accepted:
+                logging.info("Trained model is not accepted, it is not pushed")
+                return None
+            model_pusher = ModelPusher(model_evaluation_artifact=model_evaluation_artifact,
+                                       model_pusher_config=self.model_pusher_config,
+                                       model_trainer_artifact=model_trainer_artifact,
+                                       data_transformation_artifact=data_transformation_artifact)
+            model_pusher_artifact = model_pusher.initiate_model_pusher()
+            return model_pusher_artifact
+        except Exception as e:
+            raise MyException(e, sys)
+
     def run_pipeline(self,) -> None:
         """
         This method of TrainPipeline class is responsible for running complete pipeline
         """
         try:
-            data_ingestion_artifact = self.start_data_ingestion()
-            data_validation_artifact = self.start_data_validation(data_ingestion_artifact=data_ingestion_artifact)
-            data_transformation_artifact = self.start_data_transformation(data_ingestion_artifact=data_ingestion_artifact, data_validation_artifact=data_validation_artifact)
-            model_trainer_artifact = self.start_model_trainer(data_transformation_artifact=data_transformation_artifact)
+            reset_metrics()
+            if training_pipeline_config.profile:
+                start_profiler()
+
+            stage_keys, cached_artifacts = {}, {}
+            if self.stage_cache is not None:
+                stage_keys = self.get_stage_keys()
+                for stage_name, key in stage_keys.items():
+                    artifact = self.stage_cache.load(stage_name, key)
+                    if artifact is not None:
+                        cached_artifacts[stage_name] = artifact
+
+            scheduler = self.get_task_scheduler(cached_artifacts)
+            artifacts = scheduler.run(outputs=list(STAGE_SCHEMA_SECTIONS) + ["model_evaluation", "model_pusher"])
+            scheduler.save_timeline(training_pipeline_config.timeline_file_path)
+            logging.info(f"Saved the pipeline timeline to {training_pipeline_config.timeline_file_path}")
+
+            if self.stage_cache is not None:
+                for stage_name, key in stage_keys.items():
+                    if stage_name not in cached_artifacts:
+                        self.stage_cache.save(stage_name, key, artifacts[stage_name])
+
+            if training_pipeline_config.profile:
+                stop_profiler(training_pipeline_config.profile_file_path)
+            self.save_run_metrics(scheduler, cached_stages=list(cached_artifacts))
 
+            if self.stage_cache is not None:
+                self.stage_cache.touch()
+                self.stage_cache.evict()
         except Exception as e:
             raise MyException(e, sys)
\ No newline at end of file
@@ -1,13 +1,29 @@
+import glob
+import hashlib
 import os
 import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
-import dill
-import yaml
+import pandas as pd
+from typing import Optional
 from pandas import DataFrame
+from src.constants import ARTIFACT_DIR, MODEL_TRAINER_DIR_NAME, MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_FILE_NAME
 from src.exception import MyException
 from src.logger import logging
+from src.utils.profiling import profile_span
+
+# Background writer for artifact files and the writes it has not finished yet
+_artifact_writer: Optional[ThreadPoolExecutor] = None
+_pending_artifact_writes: list = []
+_artifact_writer_lock = threading.Lock()
+
+# Dtypes of schema.yaml without a width hint
+SCHEMA_DTYPE_ALIASES = {"int": "int64", "float": "float64"}
 
 def read_yaml_file(file_path:str) -> dict:
+    # yaml and dill are imported on first use, serving a packed model needs neither
+    import yaml
     try:
         with open(file_path, "rb") as  yaml_file:
             return yaml.safe_load(yaml_file)
@@ -15,13 +31,14 @@ def read_yaml_file(file_path:str) -> dict:
         raise MyException(e,sys) from e
     
 def write_yaml_file(file_path:str, content: object, replace:bool=False) -> None:
+    import yaml
     try:
         if replace:
             if os.path.exists(file_path):
                 os.remove(file_path)
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "wb") as file:
-            yaml.dump(content,file)
+        with open(file_path, "w") as file:
+            yaml.dump(content, file, sort_keys=False)
     except Exception as e:
         raise MyException(e, sys) from e
     
@@ -31,6 +48,7 @@ def load_object(file_path: str) -> object:
     file_path: str location of file to load
     return: Model/Obj
     """
+    import dill
     try:
         with open(file_path, "rb") as file_obj:
             obj = dill.load(file_obj)
@@ -65,6 +83,7 @@ def load_numpy_array_data(file_path: str) -> np.array:
         raise MyException(e, sys) from e
 
 def save_object(file_path: str, obj: object) -> None:
+    import dill
     logging.info("Entered the save_object method of utils")
 
     try:
@@ -75,4 +94,222 @@ def save_object(file_path: str, obj: object) -> None:
         logging.info("Exited the save_object method of utils")
 
     except Exception as e:
-        raise MyException(e, sys) from e
\ No newline at end of file
+        raise MyException(e, sys) from e
+
+def find_latest_model_file_path(exclude_artifact_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Returns the model file of the most recent training run under the artifact directory, None when there is none
+    exclude_artifact_dir: artifact directory of a run to ignore, e.g. the running one
+    """
+    model_file_paths = glob.glob(os.path.join(ARTIFACT_DIR, "*", MODEL_TRAINER_DIR_NAME,
+                                              MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_FILE_NAME))
+    if exclude_artifact_dir is not None:
+        excluded = os.path.abspath(exclude_artifact_dir) + os.sep
+        model_file_paths = [path for path in model_file_paths if not os.path.abspath(path).startswith(excluded)]
+    return max(model_file_paths, key=os.path.getmtime) if model_file_paths else None
+
+def get_row_hashes(dataframe: DataFrame) -> np.ndarray:
+    """
+    Returns a 64-bit hash of the content of every row, independent of the index.
+    float32 columns are hashed as float64, so the hashes do not depend on the width of the stored floats.
+    """
+    float32_columns = [column for column, dtype in dataframe.dtypes.items() if dtype == np.float32]
+    if float32_columns:
+        dataframe = dataframe.astype({column: np.float64 for column in float32_columns})
+    return pd.util.hash_pandas_object(dataframe, index=False).to_numpy()
+
+def get_file_digest(file_path: Optional[str], block_size: int = 2**20) -> Optional[str]:
+    """
+    Returns the sha256 hex digest of the content of a file, None when there is no such file
+    """
+    if file_path is None or not os.path.exists(file_path):
+        return None
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_file_format(file_path: str) -> str:
+    """
+    Returns the dataframe file format (csv, parquet or feather) given by the file extension
+    """
+    file_format = os.path.splitext(file_path)[1].lstrip(".").lower()
+    if file_format not in ("csv", "parquet", "feather"):
+        raise ValueError(f"Unsupported dataframe file format: '{file_format}'")
+    return file_format
+
+def get_category_columns(schema_config: dict) -> list:
+    """
+    Returns the columns declared with the 'category' dtype in schema.yaml
+    """
+    return [name for column in schema_config["columns"] for name, dtype in column.items() if dtype == "category"]
+
+def get_schema_dtypes(schema_config: dict) -> dict:
+    """
+    Returns the columns of schema.yaml mapped to their dtype: 'category' for the categorical columns and the
+    numpy dtype of the width hint (int8, float32, ...) for the others. 'int' and 'float' without a width are
+    int64 and float64, unknown dtypes are kept as Python objects.
+    """
+    dtypes = {}
+    for column in schema_config["columns"]:
+        for name, dtype in column.items():
+            if dtype == "category":
+                dtypes[name] = dtype
+                continue
+            try:
+                dtypes[name] = np.dtype(SCHEMA_DTYPE_ALIASES.get(dtype, dtype))
+            except TypeError:
+                dtypes[name] = np.dtype(object)
+    return dtypes
+
+def cast_to_schema_dtype(series: pd.Series, dtype, categories: Optional[list] = None) -> pd.Series:
+    """
+    Casts a column to its dtype from get_schema_dtypes and returns the series itself when there is nothing to cast.
+    Categoricals get the given categories first and the other values present after them, so chunks cast
+    separately share their codes. Integer columns holding missing values become float32 (float64 for the
+    integers wider than 16 bits, which float32 does not hold exactly) and integers out of the range of the
+    declared width, like non-numeric columns, are left as they are for the validation to report.
+    """
+    if dtype == "category":
+        categories = list(categories or [])
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            if list(series.cat.categories[:len(categories)]) == categories:
+                return series
+            present = series.cat.categories
+        else:
+            present = series.dropna().unique()
+        extra = sorted(set(present) - set(categories), key=str)
+        return series.astype(pd.CategoricalDtype(categories + extra))
+
+    if series.dtype == dtype or dtype == object or not pd.api.types.is_numeric_dtype(series.dtype) \
+            or pd.api.types.is_bool_dtype(series.dtype):
+        return series
+    if dtype.kind == "f":
+        return series.astype(dtype)
+    if pd.api.types.is_integer_dtype(series.dtype):
+        limits = np.iinfo(dtype)
+        if len(series) and (series.min() < limits.min or series.max() > limits.max):
+            return series
+        return series.astype(dtype)
+    float_dtype = np.dtype(np.float32 if dtype.itemsize <= 2 else np.float64)
+    return series.astype(float_dtype) if float_dtype.itemsize < series.dtype.itemsize else series
+
+def apply_schema_dtypes(dataframe: DataFrame, schema_config: dict) -> DataFrame:
+    """
+    Casts the columns of schema.yaml that are present in the dataframe to their schema dtypes, the category
+    columns to pandas categoricals starting with their allowed categories
+    """
+    try:
+        allowed_categories = schema_config.get("allowed_categories", {})
+        for column, dtype in get_schema_dtypes(schema_config).items():
+            if column in dataframe.columns:
+                series = cast_to_schema_dtype(dataframe[column], dtype, allowed_categories.get(column))
+                if series is not dataframe[column]:
+                    dataframe[column] = series
+        return dataframe
+    except Exception as e:
+        raise MyException(e, sys) from e
+
+def _concat_column(pieces: list) -> pd.Series:
+    dtypes = [piece.dtype for piece in pieces]
+    if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes) and any(dtype != dtypes[0] for dtype in dtypes):
+        categories = list(dict.fromkeys(category for dtype in dtypes for category in dtype.categories))
+        pieces = [piece.cat.set_categories(categories) for piece in pieces]
+    return pd.concat(pieces, ignore_index=True)
+
+def concat_dataframes(dataframes: list, release: bool = False) -> DataFrame:
+    """
+    Concatenates dataframes with a new index like pd.concat, keeping a categorical column categorical when
+    the dataframes hold different categories of it (pd.concat falls back to object then).
+    The result is built column by column. With release the list is emptied, so every column of the inputs that
+    has a block of its own is freed once it is concatenated: the peak stays near the size of the result instead
+    of twice it.
+    """
+    columns = list(dict.fromkeys(column for dataframe in dataframes for column in dataframe.columns))
+    pieces = {column: [dataframe[column] if column in dataframe.columns else pd.Series(np.nan, index=dataframe.index)
+                       for dataframe in dataframes] for column in columns}
+    if release:
+        dataframes.clear()
+    return DataFrame({column: _concat_column(pieces.pop(column)) for column in columns}, copy=False)
+
+def save_dataframe(file_path: str, dataframe: DataFrame) -> None:
+    """
+    Saves dataframe in the format given by the file extension
+    file_path: str location of file to save
+    dataframe: DataFrame data to save
+    """
+    try:
+        file_format = get_file_format(file_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with profile_span("save_dataframe", rows=len(dataframe), file=os.path.basename(file_path)):
+            if file_format == "parquet":
+                dataframe.to_parquet(file_path, index=False)
+            elif file_format == "feather":
+                dataframe.reset_index(drop=True).to_feather(file_path)
+            else:
+                dataframe.to_csv(file_path, index=False, header=True)
+    except Exception as e:
+        raise MyException(e, sys) from e
+
+def load_dataframe(file_path: str, columns: Optional[list] = None) -> DataFrame:
+    """
+    Loads dataframe from a file, or from a directory of part files, in the format given by the extension
+    file_path: str location of file or directory to load
+    columns: optional list of columns to read, columns missing from the file are ignored
+    return: DataFrame with the columns in file order
+    """
+    try:
+        with profile_span("load_dataframe", file=os.path.basename(file_path)) as span:
+            dataframe = _read_dataframe(file_path, columns=columns)
+            span["rows"] = len(dataframe)
+        return dataframe
+    except Exception as e:
+        raise MyException(e, sys) from e
+
+def _read_dataframe(file_path: str, columns: Optional[list] = None) -> DataFrame:
+    if os.path.isdir(file_path):
+        parts = [os.path.join(file_path, name) for name in sorted(os.listdir(file_path))]
+        return concat_dataframes([_read_dataframe(part, columns=columns) for part in parts])
+
+    file_format = get_file_format(file_path)
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        if columns is not None:
+            columns = [name for name in pq.read_schema(file_path).names if name in columns]
+        return pd.read_parquet(file_path, columns=columns)
+    if file_format == "feather":
+        import pyarrow as pa
+        if columns is not None:
+            columns = [name for name in pa.ipc.open_file(pa.memory_map(file_path)).schema.names if name in columns]
+        return pd.read_feather(file_path, columns=columns)
+    return pd.read_csv(file_path, usecols=(lambda name: name in columns) if columns is not None else None)
+
+def write_artifact_async(func, *args, **kwargs) -> Future:
+    """
+    Submits an artifact write (e.g. save_dataframe, save_object) to the background writer thread
+    func: callable doing the write
+    return: Future of the write
+    """
+    global _artifact_writer
+    with _artifact_writer_lock:
+        if _artifact_writer is None:
+            _artifact_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-writer")
+        future = _artifact_writer.submit(func, *args, **kwargs)
+        _pending_artifact_writes.append(future)
+    return future
+
+def wait_for_artifact_writes() -> None:
+    """
+    Blocks until every submitted artifact write has finished and raises the first failure
+    """
+    with _artifact_writer_lock:
+        pending = list(_pending_artifact_writes)
+        _pending_artifact_writes.clear()
+    errors = [future.exception() for future in pending]
+    errors = [error for error in errors if error is not None]
+    try:
+        if errors:
+            raise errors[0]
+    except Exception as e:
+        raise MyException(e, sys) from e
@@ -0,0 +1,217 @@
+"""
+profiling.py
+
+Instrumentation of the training pipeline: timed spans with the peak resident memory of the process and row
+counters, collected for the whole run and saved as metrics.json in the artifact directory, an optional cProfile
+dump of the threads running spans, and the comparison of the metrics of two runs to flag regressions.
+
+Usage:
+------
+    with profile_span("SMOTEENN resampling of the training data", rows=len(y)) as span:
+        X, y = sampler.fit_resample(X, y)
+        span["rows_out"] = len(y)
+
+    @profiled("data_ingestion")
+    def start_data_ingestion(self): ...
+"""
+
+import cProfile
+import functools
+import glob
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from src.constants import ARTIFACT_DIR, PIPELINE_METRICS_FILE_NAME
+from src.logger import logging
+
+# Spans of the current run, shared by all threads
+_spans: list = []
+_spans_lock = threading.Lock()
+_run_start: float = time.perf_counter()
+# The peak RSS is reset when a span starts while no other span runs, so the peak of overlapping spans
+# is the peak since the first of them started: an upper bound of their own peak
+_active_spans: int = 0
+# cProfile profilers of the threads running spans, when profiling is enabled
+_profilers: Optional[list] = None
+_thread_state = threading.local()
+
+
+def reset_peak_rss() -> None:
+    """
+    Resets the peak resident set size of the process to its current size, on Linux only
+    """
+    # Linux resets VmHWM when "5" is written to clear_refs
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+def get_peak_rss() -> int:
+    """
+    Returns the peak resident set size of the process in bytes, 0 when the platform does not report it
+    """
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return 0
+
+def reset_metrics() -> None:
+    """
+    Clears the spans collected so far, at the start of a run
+    """
+    global _run_start
+    with _spans_lock:
+        _spans.clear()
+        _run_start = time.perf_counter()
+
+@contextmanager
+def profile_span(name: str, **counters):
+    """
+    Times the enclosed step and records its wall time, the peak RSS of the process during the step and the
+    given counters (rows, ...). The yielded dict takes counters known at the end of the step.
+    name: name of the step in the metrics and the log message
+    """
+    global _active_spans
+    span = dict(counters)
+    with _spans_lock:
+        if _active_spans == 0:
+            reset_peak_rss()
+        _active_spans += 1
+
+    # Spans nested in a span of the same thread are covered by its profiler
+    depth = getattr(_thread_state, "depth", 0)
+    profiler = cProfile.Profile() if _profilers is not None and depth == 0 else None
+    _thread_state.depth = depth + 1
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield span
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        end = time.perf_counter()
+        _thread_state.depth = depth
+        peak_rss = get_peak_rss()
+        with _spans_lock:
+            _active_spans -= 1
+            _spans.append({"name": name, "thread": threading.current_thread().name,
+                           "start_s": round(start - _run_start, 4), "wall_s": round(end - start, 4),
+                           "peak_rss_mb": round(peak_rss / 2**20, 1), **span})
+            if profiler is not None and _profilers is not None:
+                _profilers.append(profiler)
+        logging.info(f"{name} took {end - start:.3f}s, peak RSS {peak_rss / 2**20:.1f} MB"
+                     + "".join(f", {key} {value}" for key, value in span.items()))
+
+def profiled(name: str):
+    """
+    Decorator recording every call of the function as a span
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def start_profiler() -> None:
+    """
+    Profiles the spans started from now on with cProfile, one profiler per thread running a top-level span
+    """
+    global _profilers
+    with _spans_lock:
+        _profilers = []
+
+def stop_profiler(file_path: str) -> None:
+    """
+    Stops profiling and dumps the merged statistics of all profiled spans, readable with pstats or snakeviz
+    """
+    global _profilers
+    with _spans_lock:
+        profilers, _profilers = _profilers, None
+    if not profilers:
+        logging.info("No span was profiled, the profile is not saved")
+        return
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    stats = pstats.Stats(profilers[0])
+    for profiler in profilers[1:]:
+        stats.add(profiler)
+    stats.dump_stats(file_path)
+    logging.info(f"Saved the profile of {len(profilers)} spans to {file_path}")
+
+def get_metrics(**run_info) -> dict:
+    """
+    Returns the given run information with the spans of the run and their summary by name: calls, total wall
+    time, largest peak RSS and the totals of the counters
+    """
+    with _spans_lock:
+        spans = list(_spans)
+    summary = {}
+    for span in spans:
+        entry = summary.setdefault(span["name"], {"calls": 0, "wall_s": 0.0, "peak_rss_mb": 0.0})
+        entry["calls"] += 1
+        entry["wall_s"] = round(entry["wall_s"] + span["wall_s"], 4)
+        entry["peak_rss_mb"] = max(entry["peak_rss_mb"], span["peak_rss_mb"])
+        for key, value in span.items():
+            if (key not in ("name", "thread", "start_s", "wall_s", "peak_rss_mb") and isinstance(value, (int, float))
+                    and not isinstance(value, bool)):
+                entry[key] = entry.get(key, 0) + value
+    return {**run_info, "spans": sorted(spans, key=lambda span: span["start_s"]), "summary": summary}
+
+def save_metrics(file_path: str, metrics: dict) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as file:
+        json.dump(metrics, file, indent=4, default=str)
+
+def load_metrics(file_path: str) -> dict:
+    with open(file_path) as file:
+        return json.load(file)
+
+def find_previous_metrics_file_path(exclude_artifact_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Returns the metrics file of the most recent run under the artifact directory, None when there is none
+    exclude_artifact_dir: artifact directory of a run to ignore, e.g. the running one
+    """
+    file_paths = glob.glob(os.path.join(ARTIFACT_DIR, "*", PIPELINE_METRICS_FILE_NAME))
+    if exclude_artifact_dir is not None:
+        excluded = os.path.abspath(exclude_artifact_dir) + os.sep
+        file_paths = [path for path in file_paths if not os.path.abspath(path).startswith(excluded)]
+    return max(file_paths, key=os.path.getmtime) if file_paths else None
+
+def compare_metrics(current: dict, baseline: dict, tolerance: float = 0.25, min_wall_s: float = 0.1) -> list:
+    """
+    Returns the regressions of a run against a baseline run: the steps run by both whose total wall time or
+    peak RSS grew by more than tolerance (a fraction of the baseline). Steps faster than min_wall_s in both
+    runs are ignored, their timings are mostly noise.
+    """
+    regressions = []
+    for name, entry in current.get("summary", {}).items():
+        baseline_entry = baseline.get("summary", {}).get(name)
+        if baseline_entry is None:
+            continue
+        for metric in ("wall_s", "peak_rss_mb"):
+            before, after = baseline_entry[metric], entry[metric]
+            if metric == "wall_s" and max(before, after) < min_wall_s:
+                continue
+            if before > 0 and (after - before) / before > tolerance:
+                regressions.append({"name": name, "metric": metric, "baseline": before, "current": after,
+                                    "change": round((after - before) / before, 3)})
+    return regressions